@@ -1,8 +1,17 @@
-from fastapi import APIRouter, HTTPException
-from app.models.schemas import ChatRequest, ChatResponse, ApiResponse
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from app.models.schemas import BatchChatRequest, ChatRequest, ChatResponse, ApiResponse
 from app.services.chat_service import ChatService
+from app.services.prompts import USE_CASE_FAQ, classify_use_case
+from app.core import capture
+from app.core.admission import AdmissionController, AdmissionRejected, PRIORITY_BATCH, PRIORITY_HIGH, PRIORITY_NORMAL
+from app.core.auth import require_service_key
 from app.core.config import settings
+from oei_live.deadline import Deadline
+import hashlib
+import json
 import logging
+from typing import List
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -10,11 +19,68 @@ logger = logging.getLogger(__name__)
 # Initialize chat service
 chat_service = ChatService()
 
+admission = AdmissionController(
+    max_in_flight=settings.admission_max_in_flight,
+    max_queue=settings.admission_max_queue,
+    queue_timeout=settings.admission_queue_timeout_sec,
+    client_rate=settings.admission_client_rate,
+    client_burst=settings.admission_client_burst,
+)
+
+def _client_ip(http_request: Request) -> str:
+    """Address of the client as seen by the outermost trusted proxy.
+
+    Proxies append the address they received the request from, so with N trusted
+    hops the Nth entry from the right is the last one nobody could have forged.
+    """
+    peer = http_request.client.host if http_request.client else "unknown"
+    hops = settings.trusted_proxy_hops
+    if hops <= 0:
+        return peer
+    forwarded = [part.strip() for part in http_request.headers.get("x-forwarded-for", "").split(",") if part.strip()]
+    return forwarded[-hops] if len(forwarded) >= hops else peer
+
+def _client_keys(request: ChatRequest, http_request: Request) -> List[str]:
+    """Rate-limit by IP, and additionally by session when the client sends one."""
+    keys = [f"ip:{_client_ip(http_request)}"]
+    if request.session_id:
+        keys.append(f"session:{request.session_id}")
+    return keys
+
+def _session_id(request: ChatRequest, http_request: Request) -> str:
+    """The client's session id, or a stable stand-in built from the peer address and the first user turn."""
+    if request.session_id:
+        return request.session_id
+    first = next((msg.content for msg in request.chat_history if msg.role == "user"), request.message)
+    return "anon:" + hashlib.sha1(f"{_client_ip(http_request)}\n{first}".encode("utf-8")).hexdigest()[:16]
+
+def _rate_limit_keys(request: ChatRequest, http_request: Request) -> List[str]:
+    """No per-client limit for replayed captures: the replayer sends every user's traffic from one address."""
+    return [] if capture.in_replay() else _client_keys(request, http_request)
+
+def _priority(request: ChatRequest) -> int:
+    """Short FAQ questions are cheap, so they jump ahead of course searches."""
+    is_short = len(request.message) <= settings.admission_short_message_chars
+    return PRIORITY_HIGH if is_short and classify_use_case(request.message) == USE_CASE_FAQ else PRIORITY_NORMAL
+
 @router.post("/message", response_model=ApiResponse)
-async def send_message(request: ChatRequest):
+async def send_message(request: ChatRequest, http_request: Request):
     """
     Send a message to the AI chatbot and get a response.
     """
+    # The deadline starts on arrival, so time spent queued counts against it
+    deadline = Deadline(settings.chat_deadline_sec)
+    try:
+        async with admission.admit(_rate_limit_keys(request, http_request), _priority(request)):
+            return await _process_message(request, deadline, _session_id(request, http_request))
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.reason,
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+async def _process_message(request: ChatRequest, deadline: Deadline, session_id: str) -> ApiResponse:
     try:
         if not settings.openai_api_key:
             raise HTTPException(
@@ -28,10 +94,14 @@ async def send_message(request: ChatRequest):
             for msg in request.chat_history
         ]
         
+        capture.record_request(request.message, chat_history, session_id)
+
         # Get response from chat service
         response = await chat_service.get_response(
             message=request.message,
-            chat_history=chat_history
+            chat_history=chat_history,
+            deadline=deadline,
+            session_id=session_id
         )
         
         return ApiResponse(
@@ -46,6 +116,45 @@ async def send_message(request: ChatRequest):
             error=f"Failed to process message: {str(e)}"
         )
 
+@router.post("/batch")
+async def send_batch(request: BatchChatRequest, authorization: str = Header("")):
+    """
+    Answer many independent conversations for offline evaluation.
+
+    Only available with BATCH_ENABLED and the service key as bearer token. Every
+    item takes an admission slot (behind interactive traffic), so a batch
+    shares capacity with /chat/message instead of running next to it.
+    Results are streamed as NDJSON, one line per item in completion order;
+    each line carries the item's `index` and `id`.
+    """
+    if not settings.batch_enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    require_service_key(authorization)
+    if not settings.openai_api_key:
+        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+    if len(request.items) > settings.batch_max_items:
+        raise HTTPException(status_code=413, detail=f"At most {settings.batch_max_items} items per batch")
+
+    items = [
+        {
+            "id": item.id,
+            "message": item.message,
+            "chat_history": [
+                {"role": msg.role, "content": msg.content, "timestamp": msg.timestamp}
+                for msg in item.chat_history
+            ],
+        }
+        for item in request.items
+    ]
+
+    async def stream():
+        # Batch items skip the per-client rate limit but not the concurrency limit
+        slot = lambda: admission.admit((), PRIORITY_BATCH, settings.batch_queue_timeout_sec)
+        async for result in chat_service.get_responses_batch(items, max_workers=settings.batch_max_workers, slot=slot):
+            yield json.dumps(result, ensure_ascii=False, default=str) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
 @router.get("/health")
 async def chat_health():
     """
@@ -0,0 +1,46 @@
+import asyncio
+import logging
+
+from fastapi import APIRouter, Header, HTTPException
+
+from app.api.chat import chat_service
+from app.core.auth import require_service_key
+from app.models.schemas import ApiResponse, DigestSyncRequest
+from app.services.digest_service import resolve_location
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+@router.post("/digests", response_model=ApiResponse)
+async def sync_digests(request: DigestSyncRequest = DigestSyncRequest(), authorization: str = Header("")):
+    """
+    Rebuild per-location digests and FAQ answers.
+
+    Only locations whose course data changed since the stored version are
+    rebuilt unless `force` is set.
+    """
+    require_service_key(authorization)
+    result = await asyncio.to_thread(chat_service.digests.sync, request.location_ids, request.force)
+    return ApiResponse(success=not result["failed"], data=result)
+
+
+@router.get("/digests", response_model=ApiResponse)
+async def list_digests():
+    """
+    Current digest of every location.
+    """
+    rows = await asyncio.to_thread(chat_service.digests.all)
+    return ApiResponse(success=True, data=rows)
+
+
+@router.get("/digests/{location}", response_model=ApiResponse)
+async def get_digest(location: str):
+    """
+    Current digest and materialized FAQ answers of one location (city name or id).
+    """
+    location_id = resolve_location(location)
+    row = await asyncio.to_thread(chat_service.digests.get, location_id) if location_id is not None else None
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"No digest for location '{location}'")
+    return ApiResponse(success=True, data=row)
@@ -0,0 +1,193 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Sequence, Tuple, Union
+
+from app.core.metrics import metrics
+
+PRIORITY_HIGH = 0  # short FAQ-style messages
+PRIORITY_NORMAL = 1
+PRIORITY_BATCH = 2  # offline batch items, only run when no interactive request is waiting
+
+# Work started by the admitted request that may outlive it (see hold_slot_until)
+_held_work: ContextVar[Optional[List[asyncio.Future]]] = ContextVar("admission_held_work", default=None)
+
+
+def hold_slot_until(future: asyncio.Future) -> None:
+    """Keeps the current request's admission slot until `future` finishes, even after the request returns.
+
+    Used for agent threads that keep running after the request gave up on them,
+    so max_in_flight still bounds the work actually running.
+    """
+    held = _held_work.get()
+    if held is not None:
+        held.append(future)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed; maps to a 429/503 with Retry-After."""
+
+    def __init__(self, status_code: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else 60.0
+
+    def take(self) -> Tuple[bool, float]:
+        """Takes one token. Returns (allowed, seconds until a token is available)."""
+        wait = self.wait_time()
+        if not wait:
+            self.tokens -= 1
+            return True, 0.0
+        return False, wait
+
+
+class AdmissionController:
+    """
+    Bounds concurrent work in the API layer.
+
+    At most `max_in_flight` requests run at once; up to `max_queue` more wait in
+    a priority queue (FAQ traffic first, FIFO within a priority) for at most
+    `queue_timeout` seconds. Each client key (peer IP, session, ...) also gets a
+    token bucket, and a request must fit into the buckets of all its keys. Anything over
+    those limits is rejected immediately instead of piling up behind slow
+    dependencies.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 8,
+        max_queue: int = 32,
+        queue_timeout: float = 5.0,
+        client_rate: float = 0.5,
+        client_burst: float = 5.0,
+        max_clients: int = 10000,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.max_clients = max_clients
+        self.in_flight = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._service_time = 1.0  # EWMA of seconds per request, used for Retry-After
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, fut in self._waiters if not fut.done())
+
+    def _bucket(self, client_key: str) -> TokenBucket:
+        bucket = self._buckets.get(client_key)
+        if bucket is None:
+            bucket = self._buckets[client_key] = TokenBucket(self.client_rate, self.client_burst)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client_key)
+        return bucket
+
+    def _check_rate(self, client_keys: Sequence[str]) -> None:
+        # Only charge the buckets once every one of them has room, so a rejected
+        # request does not use up the allowance of its other keys
+        buckets = [self._bucket(key) for key in dict.fromkeys(client_keys)]
+        wait = max((bucket.wait_time() for bucket in buckets), default=0.0)
+        if wait:
+            metrics.incr("admission_rejected", reason="rate_limited")
+            raise AdmissionRejected(429, "Too many requests", wait)
+        for bucket in buckets:
+            bucket.take()
+
+    def _estimated_wait(self) -> float:
+        return self._service_time * (self.queue_depth + 1) / max(1, self.max_in_flight)
+
+    def _publish(self) -> None:
+        metrics.set_gauge("admission_in_flight", self.in_flight)
+        metrics.set_gauge("admission_queue_depth", self.queue_depth)
+
+    async def acquire(self, client_keys: Union[str, Sequence[str]], priority: int = PRIORITY_NORMAL,
+                      queue_timeout: Optional[float] = None) -> None:
+        self._check_rate([client_keys] if isinstance(client_keys, str) else client_keys)
+        queued_at = time.monotonic()
+        if self.in_flight < self.max_in_flight and not self.queue_depth:
+            self.in_flight += 1
+            metrics.observe("admission_queue_wait_ms", 0.0)
+            self._publish()
+            return
+        if self.queue_depth >= self.max_queue:
+            metrics.incr("admission_rejected", reason="queue_full")
+            raise AdmissionRejected(503, "Server is busy", self._estimated_wait())
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        self._publish()
+        try:
+            # The slot is handed over by release(), so in_flight is already counted for us
+            await asyncio.wait_for(asyncio.shield(fut), timeout=queue_timeout or self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if fut.done() and not fut.cancelled():
+                self.release()  # granted just as we gave up
+            else:
+                fut.cancel()
+            self._publish()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            metrics.incr("admission_rejected", reason="queue_timeout")
+            raise AdmissionRejected(503, "Server is busy", self._estimated_wait())
+        finally:
+            metrics.observe("admission_queue_wait_ms", (time.monotonic() - queued_at) * 1000.0)
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)
+                self._publish()
+                return
+        self.in_flight -= 1
+        self._publish()
+
+    @asynccontextmanager
+    async def admit(self, client_keys: Union[str, Sequence[str]], priority: int = PRIORITY_NORMAL,
+                    queue_timeout: Optional[float] = None):
+        await self.acquire(client_keys, priority, queue_timeout)
+        started = time.monotonic()
+        held: List[asyncio.Future] = []
+        token = _held_work.set(held)
+        try:
+            yield
+        finally:
+            _held_work.reset(token)
+            elapsed = time.monotonic() - started
+            self._service_time = 0.8 * self._service_time + 0.2 * elapsed
+            metrics.observe("chat_request_ms", elapsed * 1000.0)
+            pending = [fut for fut in held if not fut.done()]
+            if pending:
+                metrics.incr("admission_slots_held")
+                asyncio.gather(*pending, return_exceptions=True).add_done_callback(lambda _: self.release())
+            else:
+                self.release()
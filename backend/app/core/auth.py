@@ -0,0 +1,9 @@
+from fastapi import HTTPException
+
+from app.core.config import settings
+
+
+def require_service_key(authorization: str) -> None:
+    """Internal callers (the daily-course-sync Edge Function, batch evaluation jobs) authenticate with the Supabase service key."""
+    if not settings.supabase_service_key or authorization != f"Bearer {settings.supabase_service_key}":
+        raise HTTPException(status_code=401, detail="Invalid service key")
@@ -0,0 +1,220 @@
+"""
+Opt-in traffic capture for /chat/message and tool-output replay.
+
+Captured requests are anonymized and written as JSON lines to rotating files,
+one file set per worker process (`chat_capture.<pid>.jsonl`), so uvicorn workers
+never rotate each other's files. Records are handed to a QueueListener thread,
+and the middleware never waits on disk I/O.
+When the backend runs with REPLAY_CAPTURE_FILES set, requests carrying an
+`X-Replay-Record` header get the tool outputs recorded for that request instead
+of calling Supabase/the webshop, so replay_traffic.py can drive real traffic
+shapes against a local backend (see app/services/replay_llm.py for the model).
+"""
+import atexit
+import glob
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import time
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+REPLAY_HEADER = "x-replay-record"
+
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_PHONE_RE = re.compile(r"\+?\d[\d\s().-]{6,}\d")
+
+_current_record: ContextVar[Optional[Dict[str, Any]]] = ContextVar("capture_record", default=None)
+_replay_steps: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("replay_steps", default=None)
+# All recorded tool calls of the replayed request; _replay_steps is consumed as tools run
+_replay_calls: ContextVar[List[Dict[str, Any]]] = ContextVar("replay_calls", default=[])
+
+_capture_logger: Optional[logging.Logger] = None
+_capture_listener: Optional[QueueListener] = None
+_replay_records: Optional[Dict[str, Dict[str, Any]]] = None
+_warned_no_salt = False
+
+
+def anonymize(text: str) -> str:
+    text = _EMAIL_RE.sub("<email>", text or "")
+    return _PHONE_RE.sub("<phone>", text)
+
+
+def capture_active() -> bool:
+    """True if capture is enabled and a salt is set; without one, IP pseudonyms could be reversed by brute force."""
+    global _warned_no_salt
+    if not settings.capture_enabled:
+        return False
+    if not settings.capture_salt:
+        if not _warned_no_salt:
+            logger.error("CAPTURE_ENABLED is set but CAPTURE_SALT is empty; traffic capture stays off")
+            _warned_no_salt = True
+        return False
+    return True
+
+
+def pseudonym(value: str) -> str:
+    """Stable, salted pseudonym for session ids and client IPs."""
+    if not settings.capture_salt:
+        raise RuntimeError("CAPTURE_SALT is required for pseudonyms")
+    return hashlib.sha256(f"{settings.capture_salt}:{value}".encode("utf-8")).hexdigest()[:16]
+
+
+def _get_capture_logger() -> logging.Logger:
+    """Logger whose records a background thread appends to this process's own capture files."""
+    global _capture_logger, _capture_listener
+    if _capture_logger is None:
+        directory = Path(settings.capture_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+        handler = RotatingFileHandler(
+            directory / f"chat_capture.{os.getpid()}.jsonl",
+            maxBytes=settings.capture_max_bytes,
+            backupCount=settings.capture_backup_count,
+            encoding="utf-8",
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        _capture_listener = QueueListener(records, handler)
+        _capture_listener.start()
+        atexit.register(stop_capture)
+        capture_logger = logging.getLogger("oei.capture")
+        capture_logger.setLevel(logging.INFO)
+        capture_logger.propagate = False
+        capture_logger.addHandler(QueueHandler(records))
+        _capture_logger = capture_logger
+    return _capture_logger
+
+
+def stop_capture() -> None:
+    """Writes out queued records and closes the capture file (shutdown, tests)."""
+    global _capture_logger, _capture_listener
+    if _capture_listener is None:
+        return
+    _capture_listener.stop()
+    for handler in list(_capture_listener.handlers):
+        handler.close()
+    if _capture_logger is not None:
+        for handler in list(_capture_logger.handlers):
+            _capture_logger.removeHandler(handler)
+    _capture_logger = _capture_listener = None
+
+
+def _load_replay_records() -> Dict[str, Dict[str, Any]]:
+    global _replay_records
+    if _replay_records is None:
+        records: Dict[str, Dict[str, Any]] = {}
+        for path in sorted(glob.glob(settings.replay_capture_files)):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        records[record["id"]] = record
+        logger.info(f"Loaded {len(records)} recorded requests for tool replay")
+        _replay_records = records
+    return _replay_records
+
+
+async def capture_middleware(request, call_next):
+    """Times /chat/message requests and writes their capture record once the response is ready."""
+    if request.url.path != "/chat/message" or request.method != "POST":
+        return await call_next(request)
+
+    replay_token = calls_token = None
+    replay_id = request.headers.get(REPLAY_HEADER)
+    if replay_id and settings.replay_capture_files:
+        recorded = _load_replay_records().get(replay_id)
+        calls = list(recorded.get("tool_calls", [])) if recorded else []
+        replay_token = _replay_steps.set(list(calls))
+        calls_token = _replay_calls.set(calls)
+
+    record: Optional[Dict[str, Any]] = None
+    record_token = None
+    if capture_active():
+        client = request.client.host if request.client else "unknown"
+        record = {"id": uuid.uuid4().hex, "ts": time.time(), "client": pseudonym(client), "tool_calls": []}
+        record_token = _current_record.set(record)
+
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        if replay_token is not None:
+            _replay_steps.reset(replay_token)
+            _replay_calls.reset(calls_token)
+        if record_token is not None:
+            _current_record.reset(record_token)
+
+    if record is not None:
+        record["status"] = response.status_code
+        record["duration_ms"] = round((time.perf_counter() - started) * 1000.0, 1)
+        try:
+            _get_capture_logger().info(json.dumps(record, ensure_ascii=False, default=str))
+        except Exception as e:
+            logger.warning(f"Failed to write capture record: {e}")
+    return response
+
+
+def record_request(message: str, chat_history: List[Dict[str, Any]], session_id: Optional[str]) -> None:
+    """Fills in the request; `session_id` is the one the service runs under (the `anon:` stand-in
+    for clients without one), so anonymous conversations from one address stay apart."""
+    record = _current_record.get()
+    if record is None:
+        return
+    record["session"] = pseudonym(session_id) if session_id else None
+    record["turn"] = sum(1 for m in chat_history if m.get("role") == "user")
+    record["message"] = anonymize(message)
+    record["chat_history"] = [
+        {"role": m.get("role"), "content": anonymize(m.get("content", "")), "timestamp": m.get("timestamp", "")}
+        for m in chat_history
+    ]
+
+
+def _anonymize_value(value: Any) -> Any:
+    if isinstance(value, str):
+        return anonymize(value)
+    if isinstance(value, dict):
+        return {k: _anonymize_value(v) for k, v in value.items()}
+    return value
+
+
+def record_tool_calls(intermediate_steps: List[Any]) -> None:
+    """Stores (tool, input, output) for each agent step of the current request."""
+    record = _current_record.get()
+    if record is None:
+        return
+    for action, observation in intermediate_steps or []:
+        record["tool_calls"].append({
+            "tool": getattr(action, "tool", ""),
+            "tool_input": _anonymize_value(getattr(action, "tool_input", None)),
+            "output": observation,
+        })
+
+
+def in_replay() -> bool:
+    return _replay_steps.get() is not None
+
+
+def recorded_tool_calls() -> List[Dict[str, Any]]:
+    """Every recorded tool call of the replayed request, in order (empty outside replays)."""
+    return _replay_calls.get()
+
+
+def replayed_tool_output(tool_name: str) -> Optional[Any]:
+    """Next recorded output of `tool_name` for the replayed request, or None if there is none left."""
+    steps = _replay_steps.get()
+    if steps is None:
+        return None
+    for i, step in enumerate(steps):
+        if step.get("tool") == tool_name:
+            return steps.pop(i).get("output")
+    return None
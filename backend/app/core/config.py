@@ -9,10 +9,84 @@ class Settings(BaseSettings):
     # Supabase
     supabase_url: str = os.getenv("SUPABASE_URL", "")
     supabase_service_key: str = os.getenv("SUPABASE_SERVICE_KEY", "")
+    # match_documents_compact searches the halfvec column and returns the stored embeddings
+    # MMR needs (supabase/migrations/002); plain match_documents returns neither
+    supabase_query_name: str = os.getenv("SUPABASE_QUERY_NAME", "match_documents_compact")
     
     # OEI Live API
     oei_api_base_url: str = "https://servuswebshop.oesterreichinstitut.com/api"
     user_agent: str = "OEI-Chatbot/1.0"
+
+    # Retrieval pipeline
+    retrieval_k: int = int(os.getenv("RETRIEVAL_K", "5"))
+    retrieval_fetch_k: int = int(os.getenv("RETRIEVAL_FETCH_K", "40"))
+    retrieval_mmr_lambda: float = float(os.getenv("RETRIEVAL_MMR_LAMBDA", "0.5"))
+    retrieval_reranker_model: str = os.getenv("RETRIEVAL_RERANKER_MODEL", "")  # e.g. cross-encoder/ms-marco-MiniLM-L-6-v2
+    retrieval_rerank_top_n: int = int(os.getenv("RETRIEVAL_RERANK_TOP_N", "10"))
+    retrieval_rerank_batch_size: int = int(os.getenv("RETRIEVAL_RERANK_BATCH_SIZE", "16"))
+    retrieval_budget_ms: float = float(os.getenv("RETRIEVAL_BUDGET_MS", "150"))
+    # Re-embed candidates over the network for MMR when the match function returns no
+    # embeddings (plain match_documents); off by default, similarity order is kept instead
+    retrieval_embed_missing: bool = os.getenv("RETRIEVAL_EMBED_MISSING", "False").lower() == "true"
+    retrieval_multi_query: bool = os.getenv("RETRIEVAL_MULTI_QUERY", "False").lower() == "true"
+    retrieval_max_sub_queries: int = int(os.getenv("RETRIEVAL_MAX_SUB_QUERIES", "4"))
+
+    # Admission control for /chat/message
+    admission_max_in_flight: int = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "8"))
+    admission_max_queue: int = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+    admission_queue_timeout_sec: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SEC", "5"))
+    admission_client_rate: float = float(os.getenv("ADMISSION_CLIENT_RATE", "0.5"))  # requests/sec per client
+    admission_client_burst: float = float(os.getenv("ADMISSION_CLIENT_BURST", "5"))
+    admission_short_message_chars: int = int(os.getenv("ADMISSION_SHORT_MESSAGE_CHARS", "200"))
+    # Reverse proxies in front of the app that append to X-Forwarded-For (e.g. 1 on Render);
+    # 0 keys rate limits on the TCP peer address and ignores the header
+    trusted_proxy_hops: int = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+
+    # Deadlines (seconds) for a single /chat/message request
+    chat_deadline_sec: float = float(os.getenv("CHAT_DEADLINE_SEC", "25"))
+    # Threads for blocking agent runs; runs that overshoot their deadline keep theirs until they stop
+    agent_max_workers: int = int(os.getenv("AGENT_MAX_WORKERS", "16"))
+    llm_timeout_sec: float = float(os.getenv("LLM_TIMEOUT_SEC", "20"))
+    supabase_timeout_sec: float = float(os.getenv("SUPABASE_TIMEOUT_SEC", "5"))
+    retrieval_min_budget_sec: float = float(os.getenv("RETRIEVAL_MIN_BUDGET_SEC", "3"))
+
+    # Batch chat endpoint (off by default; needs the service key as bearer token when on)
+    batch_enabled: bool = os.getenv("BATCH_ENABLED", "False").lower() == "true"
+    batch_max_items: int = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+    batch_max_workers: int = int(os.getenv("BATCH_MAX_WORKERS", "8"))
+    # How long one batch item may wait for an admission slot behind interactive traffic
+    batch_queue_timeout_sec: float = float(os.getenv("BATCH_QUEUE_TIMEOUT_SEC", "300"))
+
+    # Availability delta poller (free places / course status)
+    availability_poll_enabled: bool = os.getenv("AVAILABILITY_POLL_ENABLED", "False").lower() == "true"
+    availability_poll_min_interval_sec: float = float(os.getenv("AVAILABILITY_POLL_MIN_INTERVAL_SEC", "60"))
+    availability_poll_max_interval_sec: float = float(os.getenv("AVAILABILITY_POLL_MAX_INTERVAL_SEC", "1800"))
+
+    # Traffic capture / replay
+    capture_enabled: bool = os.getenv("CAPTURE_ENABLED", "False").lower() == "true"
+    capture_dir: str = os.getenv("CAPTURE_DIR", "captures")
+    capture_max_bytes: int = int(os.getenv("CAPTURE_MAX_BYTES", str(10 * 1024 * 1024)))
+    capture_backup_count: int = int(os.getenv("CAPTURE_BACKUP_COUNT", "10"))
+    capture_salt: str = os.getenv("CAPTURE_SALT", "")
+    replay_capture_files: str = os.getenv("REPLAY_CAPTURE_FILES", "")  # glob of capture files to serve tool outputs from
+    # Replace the chat model with app/services/replay_llm.py (local replays only), with this much latency per call
+    replay_stub_llm: bool = os.getenv("REPLAY_STUB_LLM", "False").lower() == "true"
+    replay_stub_llm_latency_ms: float = float(os.getenv("REPLAY_STUB_LLM_LATENCY_MS", "0"))
+
+    # Location digests (precomputed at sync time, see app/services/digest_service.py)
+    digest_max_pages: int = int(os.getenv("DIGEST_MAX_PAGES", "20"))
+    digest_next_starts: int = int(os.getenv("DIGEST_NEXT_STARTS", "5"))
+    digest_faq_top_n: int = int(os.getenv("DIGEST_FAQ_TOP_N", "6"))
+    # Older versions beyond this many per location are deleted after each write
+    digest_keep_versions: int = int(os.getenv("DIGEST_KEEP_VERSIONS", "10"))
+    # After a failed read of the stored digests, wait this long before asking Supabase again
+    digest_load_retry_sec: float = float(os.getenv("DIGEST_LOAD_RETRY_SEC", "60"))
+
+    # Memory instrumentation / per-worker budget (see app/core/memory.py)
+    memory_debug_enabled: bool = os.getenv("MEMORY_DEBUG_ENABLED", "False").lower() == "true"
+    memory_trace_frames: int = int(os.getenv("MEMORY_TRACE_FRAMES", "1"))
+    memory_budget_mb: int = int(os.getenv("MEMORY_BUDGET_MB", "0"))  # 0 disables the budget check
+    memory_check_interval_sec: float = float(os.getenv("MEMORY_CHECK_INTERVAL_SEC", "30"))
     
     # App settings
     app_name: str = "OEI Chatbot API"
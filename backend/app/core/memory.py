@@ -0,0 +1,181 @@
+"""
+Per-worker memory instrumentation and budgeting.
+
+With MEMORY_DEBUG_ENABLED=true tracemalloc is started at boot and
+GET /debug/memory reports the worker's RSS, the modules holding the most
+traced memory and the byte size of the in-process caches. With
+MEMORY_BUDGET_MB set, a background check drops the largest caches of a worker
+whose caches together went over budget, instead of letting it grow until the
+container is OOM-killed.
+"""
+import asyncio
+import gc
+import logging
+import os
+import sys
+import tracemalloc
+from array import array
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_BACKEND_DIR = str(Path(__file__).resolve().parent.parent.parent)
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def deep_sizeof(obj: Any, seen: Optional[set] = None) -> int:
+    """Bytes held by `obj` and everything it references; shared objects are counted once per `seen`."""
+    seen = set() if seen is None else seen
+    stack = [obj]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, (str, bytes, int, float, bool, array)) or item is None:
+            continue
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif hasattr(item, "__dict__"):
+            stack.append(vars(item))
+    return total
+
+
+def _module_of(filename: str) -> str:
+    """Rough module name for a source file: the top-level package for libraries, package.module for our code."""
+    path = filename.replace("\\", "/")
+    marker = "site-packages/"
+    if marker in path:
+        return path.split(marker, 1)[1].split("/")[0].removesuffix(".py")
+    if path.startswith(_BACKEND_DIR):
+        parts = Path(path[len(_BACKEND_DIR):].lstrip("/")).with_suffix("").parts
+        return ".".join(parts[:2])
+    return path if path.startswith("<") else Path(path).stem
+
+
+def start_tracing() -> None:
+    if settings.memory_debug_enabled and not tracemalloc.is_tracing():
+        tracemalloc.start(settings.memory_trace_frames)
+        logger.info("tracemalloc started")
+
+
+def top_allocators(limit: int = 15) -> List[Dict[str, Any]]:
+    if not tracemalloc.is_tracing():
+        return []
+    by_module: Dict[str, List[int]] = {}
+    for stat in tracemalloc.take_snapshot().statistics("filename"):
+        totals = by_module.setdefault(_module_of(stat.traceback[0].filename), [0, 0])
+        totals[0] += stat.size
+        totals[1] += stat.count
+    ranked = sorted(by_module.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+    return [{"module": name, "size_bytes": size, "blocks": count} for name, (size, count) in ranked]
+
+
+def _sizeof_live(obj: Any, seen: set, attempts: int = 3) -> int:
+    """deep_sizeof of a cache other threads may be writing to; retried if it changes size mid-walk.
+
+    Each attempt walks with a copy of `seen`, so a walk that was cut short does
+    not leave half the cache marked as already counted for the next attempt.
+    """
+    for _ in range(attempts):
+        walked = set(seen)
+        try:
+            size = deep_sizeof(obj, walked)
+        except RuntimeError:
+            continue
+        seen |= walked
+        return size
+    return 0
+
+
+def memory_report(caches: Dict[str, Any], limit: int = 15) -> Dict[str, Any]:
+    """RSS, top allocating modules and the size of each named cache."""
+    seen: set = set()  # values shared between caches are only counted for the first one
+    report: Dict[str, Any] = {
+        "pid": os.getpid(),
+        "rss_bytes": rss_bytes(),
+        "budget_bytes": settings.memory_budget_mb * 1024 * 1024 or None,
+        "caches": {
+            name: {"entries": len(cache), "bytes": _sizeof_live(cache, seen)}
+            for name, cache in caches.items()
+        },
+        "tracemalloc": None,
+    }
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        report["tracemalloc"] = {"current_bytes": current, "peak_bytes": peak, "top_modules": top_allocators(limit)}
+    return report
+
+
+class MemoryBudget:
+    """Drops registered caches, largest first, when together they hold more than `budget_bytes`.
+
+    It measures the caches themselves rather than RSS: CPython seldom hands
+    freed memory back to the OS, so RSS stays up after a release and an RSS
+    trigger would fire on every check. Caches are dropped until their total is
+    back under `low_water` of the budget.
+    """
+
+    def __init__(self, budget_bytes: int, low_water: float = 0.8) -> None:
+        self.budget_bytes = budget_bytes
+        self.low_water = low_water
+        self._caches: Dict[str, Tuple[Any, Callable[[], None]]] = {}
+
+    def register(self, name: str, cache: Any, release: Callable[[], None]) -> None:
+        self._caches[name] = (cache, release)
+
+    def sizes(self) -> Dict[str, int]:
+        seen: set = set()  # values shared between caches are only counted for the first one
+        return {name: _sizeof_live(cache, seen) for name, (cache, _) in self._caches.items()}
+
+    def check(self) -> bool:
+        metrics.set_gauge("rss_bytes", rss_bytes())
+        if not self.budget_bytes:
+            return False
+        sizes = self.sizes()
+        total = sum(sizes.values())
+        metrics.set_gauge("cache_bytes", total)
+        if total <= self.budget_bytes:
+            return False
+        logger.warning(f"Caches hold {total / 2**20:.0f} MB, over the {self.budget_bytes / 2**20:.0f} MB budget")
+        target = self.budget_bytes * self.low_water
+        for name, size in sorted(sizes.items(), key=lambda item: item[1], reverse=True):
+            if total <= target:
+                break
+            try:
+                self._caches[name][1]()
+                total -= size
+                logger.warning(f"Dropped the {name} cache ({size / 2**20:.1f} MB)")
+            except Exception as e:
+                logger.warning(f"Releasing {name} failed: {e}")
+        gc.collect()
+        metrics.incr("memory_budget_exceeded")
+        return True
+
+    async def run(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            # Walking the caches takes a while for large ones; keep it off the event loop
+            await asyncio.to_thread(self.check)
+
+
+memory_budget = MemoryBudget(settings.memory_budget_mb * 1024 * 1024)
@@ -11,6 +11,19 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     chat_history: List[ChatMessage] = []
+    session_id: Optional[str] = None
+
+class BatchChatItem(BaseModel):
+    id: Optional[str] = None
+    message: str
+    chat_history: List[ChatMessage] = []
+
+class BatchChatRequest(BaseModel):
+    items: List[BatchChatItem]
+
+class DigestSyncRequest(BaseModel):
+    location_ids: Optional[List[int]] = None
+    force: bool = False
 
 class ChatResponse(BaseModel):
     message: str
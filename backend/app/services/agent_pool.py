@@ -0,0 +1,140 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+from langchain.agents import AgentExecutor, create_tool_calling_agent
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+from app.core.metrics import metrics
+from app.services.prompts import build_system_prompt, pool_size
+from oei_live.deadline import Deadline, DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+
+def extract_prompt_usage(response: LLMResult) -> Tuple[int, int]:
+    """Returns (prompt_tokens, cached_prompt_tokens) from an LLM result.
+
+    Reads `usage_metadata` on the generated message first and falls back to the
+    raw OpenAI `token_usage` block in `llm_output`.
+    """
+    prompt_tokens = cached_tokens = 0
+    found = False
+    for generations in response.generations or []:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if not usage:
+                continue
+            found = True
+            prompt_tokens += usage.get("input_tokens", 0) or 0
+            details = usage.get("input_token_details") or {}
+            cached_tokens += details.get("cache_read", 0) or 0
+    if found:
+        return prompt_tokens, cached_tokens
+
+    token_usage = (response.llm_output or {}).get("token_usage") or {}
+    details = token_usage.get("prompt_tokens_details") or {}
+    return token_usage.get("prompt_tokens", 0) or 0, details.get("cached_tokens", 0) or 0
+
+
+class PromptCacheStats(BaseCallbackHandler):
+    """Records prompt/cached token counts per pool key and keeps the running cache hit ratio."""
+
+    def __init__(self, language: str, use_case: str):
+        self.labels = {"language": language, "use_case": use_case}
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        prompt_tokens, cached_tokens = extract_prompt_usage(response)
+        if not prompt_tokens:
+            return
+        metrics.incr("llm_prompt_tokens", prompt_tokens, **self.labels)
+        metrics.incr("llm_cached_prompt_tokens", cached_tokens, **self.labels)
+        total = metrics.counter("llm_prompt_tokens", **self.labels)
+        cached = metrics.counter("llm_cached_prompt_tokens", **self.labels)
+        metrics.set_gauge("llm_prompt_cache_ratio", cached / total if total else 0.0, **self.labels)
+
+
+class DeadlineCallback(BaseCallbackHandler):
+    """Stops an agent run at its next LLM or tool call once the request deadline has passed.
+
+    A thread running the agent cannot be interrupted from outside, so this is
+    how a run that already timed out for the caller winds down early.
+    """
+
+    raise_error = True
+
+    def __init__(self, deadline: Deadline):
+        self.deadline = deadline
+
+    def _check(self) -> None:
+        if self.deadline.expired():
+            raise DeadlineExceeded(f"deadline of {self.deadline.budget:.1f}s exceeded")
+
+    def on_llm_start(self, serialized: Any, prompts: Any, **kwargs: Any) -> None:
+        self._check()
+
+    def on_tool_start(self, serialized: Any, input_str: str, **kwargs: Any) -> None:
+        self._check()
+
+
+class AgentPool:
+    """
+    Holds one precompiled prompt template and agent executor per (language, use case).
+
+    Each entry renders a byte-identical system prompt, and the tool list is shared
+    and ordered the same way, so requests in a bucket share the longest possible
+    static prefix. Entries are created lazily and evicted least-recently-used;
+    by default the pool has room for every possible key.
+    """
+
+    def __init__(self, llm, tools: List, max_size: Optional[int] = None, max_execution_time: Optional[float] = None):
+        self.llm = llm
+        self.tools = tools
+        self.max_size = max_size or pool_size()
+        self.max_execution_time = max_execution_time
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[AgentExecutor, PromptCacheStats]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def build_prompt(language: str, use_case: str) -> ChatPromptTemplate:
+        return ChatPromptTemplate.from_messages([
+            ("system", build_system_prompt(language, use_case)),
+            MessagesPlaceholder(variable_name="chat_history"),
+            ("human", "{input}"),
+            MessagesPlaceholder(variable_name="agent_scratchpad"),
+        ])
+
+    def _build_executor(self, prompt: ChatPromptTemplate) -> AgentExecutor:
+        agent = create_tool_calling_agent(self.llm, self.tools, prompt)
+        # We enable return_intermediate_steps to capture the tool's raw output.
+        return AgentExecutor(
+            agent=agent,
+            tools=self.tools,
+            verbose=True,
+            return_intermediate_steps=True,
+            max_execution_time=self.max_execution_time,
+        )
+
+    def get(self, language: str, use_case: str) -> Tuple[AgentExecutor, PromptCacheStats]:
+        key = (language, use_case)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        executor = self._build_executor(self.build_prompt(language, use_case))
+        entry = (executor, PromptCacheStats(language, use_case))
+        with self._lock:
+            entry = self._entries.setdefault(key, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                evicted, _ = self._entries.popitem(last=False)
+                logger.info(f"Evicted agent for {evicted} from pool")
+        return entry
+
+    def keys(self) -> List[Tuple[str, str]]:
+        with self._lock:
+            return list(self._entries)
@@ -0,0 +1,67 @@
+import logging
+from typing import List, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from oei_live import tools as live_tools
+from oei_live.availability import AvailabilityChange, AvailabilityPoller
+from oei_live.locations import ID_TO_CITY
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentsPatcher:
+    """Writes availability deltas into the live rows of the documents table without re-embedding."""
+
+    def __init__(self, supabase_client, table_name: str = "documents"):
+        self.client = supabase_client
+        self.table_name = table_name
+
+    def __call__(self, changes: List[AvailabilityChange]) -> None:
+        for change in changes:
+            rows = (
+                self.client.table(self.table_name)
+                .select("id, metadata")
+                .eq("source_type", "live")
+                .eq("course_id", change.course_id)
+                .eq("location_id", change.location_id)
+                .execute()
+                .data
+            ) or []
+            for row in rows:
+                metadata = dict(row.get("metadata") or {})
+                update = {}
+                if "free_places_count" in change.changes:
+                    metadata["free_places"] = change.new_value("free_places_count")
+                if "status_text" in change.changes:
+                    metadata["status_text"] = change.new_value("status_text")
+                if "status" in change.changes:
+                    metadata["status"] = change.new_value("status")
+                    update["course_status"] = change.new_value("status")
+                update["metadata"] = metadata
+                self.client.table(self.table_name).update(update).eq("id", row["id"]).execute()
+
+
+def start_availability_poller(chat_service) -> Optional[AvailabilityPoller]:
+    """Starts the background poller and wires its change events to the catalog, documents and caches."""
+    if not settings.availability_poll_enabled:
+        return None
+    # Shares the live tools' client, so polled pages refresh the same cache the tools read
+    poller = AvailabilityPoller(
+        live_tools._client,
+        location_ids=sorted(ID_TO_CITY),
+        min_interval=settings.availability_poll_min_interval_sec,
+        max_interval=settings.availability_poll_max_interval_sec,
+    )
+    poller.subscribe(live_tools.apply_availability_changes)
+    # course_detail_live must not serve the old free places from the detail cache or a prefetch
+    poller.subscribe(live_tools.evict_changed_details)
+    if chat_service.supabase_client is not None:
+        poller.subscribe(DocumentsPatcher(chat_service.supabase_client))
+    poller.subscribe(lambda changes: chat_service.invalidate_caches())
+    # Free-place totals live in the digests too; rebuild only the locations that moved
+    poller.subscribe(lambda changes: chat_service.digests.sync({c.location_id for c in changes}))
+    poller.subscribe(lambda changes: metrics.incr("availability_changes", len(changes)))
+    poller.start()
+    logger.info(f"Availability poller started for {len(poller.location_ids)} locations")
+    return poller
@@ -1,46 +1,89 @@
+import asyncio
 import os
 import sys
 import json
 import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from contextvars import ContextVar, copy_context
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import AsyncContextManager, AsyncIterator, Callable, List, Dict, Any, Optional
 
 # Add parent directory to path for oei_live imports
 parent_dir = Path(__file__).parent.parent.parent.parent
 sys.path.append(str(parent_dir))
 
 # LangChain Imports
-from langchain.agents import AgentExecutor, create_tool_calling_agent
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import AIMessage, HumanMessage
 from langchain_community.vectorstores import SupabaseVectorStore
-from langchain_core.tools import tool
+from langchain_core.tools import BaseTool, StructuredTool, tool
 
 # Supabase Imports
 from supabase.client import Client, create_client
+from supabase.lib.client_options import ClientOptions
+
+from app.core import capture
+from app.core.admission import hold_slot_until
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.agent_pool import AgentPool, DeadlineCallback
+from app.services.digest_service import DigestService
+from app.services.prompts import DEFAULT_LANGUAGE, USE_CASE_COURSE_FINDER, conversation_key
+from app.services.replay_llm import ReplayChatModel
+from app.services.retrieval import RetrievalPipeline
+from oei_live.client import TTLCache
+from oei_live.locations import LOCATION_CURRENCY_MAPPING
+from oei_live.deadline import Deadline, DeadlineExceeded, current_deadline, deadline_scope
+from oei_live.prefetch import current_session
+from oei_live import tools as live_tools
+from oei_live.tools import prefetch_course_details
 
 # Standard Library Imports
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Hardcoded currency mapping based on Supabase analysis
-LOCATION_CURRENCY_MAPPING = {
-    "Bosnia and Herzegovina": "КМ",
-    "Czechia": "Kč", 
-    "Hungary": "Ft",
-    "Italy": "€",
-    "Poland": "zł",
-    "Serbia": "RSD",
-    "Slovakia": "€",
-}
+
+EMPTY_RETRIEVAL = json.dumps({'ai_content': '', 'courses_data': []})
+
+# Per-request scratch space the retrieval tool fills in, so a timed-out agent
+# run can still return whatever courses were found.
+_request_state: ContextVar[Optional[Dict[str, Any]]] = ContextVar("chat_request_state", default=None)
+
+# Batch mode: (query, query embedding, candidates) fetched ahead of the agent run
+_prefetched_retrieval: ContextVar[Optional[tuple]] = ContextVar("chat_prefetched_retrieval", default=None)
+
+def _replayable(live_tool: BaseTool) -> BaseTool:
+    """Wraps a live webshop tool so replayed traffic gets the recorded output instead of calling the webshop."""
+    def run(**kwargs: Any) -> Any:
+        if capture.in_replay():
+            return capture.replayed_tool_output(live_tool.name) or ""
+        return live_tool.invoke(kwargs)
+
+    return StructuredTool.from_function(
+        func=run,
+        name=live_tool.name,
+        description=live_tool.description,
+        args_schema=live_tool.args_schema,
+    )
+
 
 class ChatService:
     def __init__(self):
         """Initializes the ChatService and its components."""
         self.agent_executor = None
+        self.agent_pool = None
         self.vector_store = None
+        self.retrieval = None
+        self.supabase_client = None
+        # Last good retrieval output per query, served stale when the deadline is short
+        self._retrieval_cache = TTLCache(ttl_sec=600, max_items=512)
+        # Per-location digests are built from the live API, so they work even without Supabase
+        self.digests = DigestService(live_tools._client)
+        # Dedicated threads for agent runs, so overrunning runs can't starve the default executor
+        self._agent_threads = ThreadPoolExecutor(max_workers=settings.agent_max_workers, thread_name_prefix="agent")
         self._initialize_services()
     
     def _initialize_services(self):
@@ -55,37 +98,44 @@ class ChatService:
                 logger.error("Missing required environment variables for OpenAI or Supabase.")
                 return
 
-            llm = ChatOpenAI(model="gpt-4o", temperature=0.1) # Slightly increased temp for more natural conversation
-            embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-            supabase_client = create_client(supabase_url, supabase_key)
+            if settings.replay_stub_llm and settings.replay_capture_files:
+                logger.warning("REPLAY_STUB_LLM is set: the agent replays recorded tool calls instead of calling OpenAI")
+                llm = ReplayChatModel(latency=settings.replay_stub_llm_latency_ms / 1000.0)
+            else:
+                llm = ChatOpenAI(model="gpt-4o", temperature=0.1, timeout=settings.llm_timeout_sec, max_retries=1) # Slightly increased temp for more natural conversation
+            embeddings = OpenAIEmbeddings(model="text-embedding-3-small", timeout=settings.llm_timeout_sec, max_retries=1)
+            self.supabase_client = supabase_client = create_client(
+                supabase_url,
+                supabase_key,
+                options=ClientOptions(postgrest_client_timeout=settings.supabase_timeout_sec),
+            )
+            self.digests.supabase_client = supabase_client
             self.vector_store = SupabaseVectorStore(
                 client=supabase_client,
                 embedding=embeddings,
                 table_name="documents",
-                query_name="match_documents",
+                query_name=settings.supabase_query_name,
+            )
+            self.retrieval = RetrievalPipeline(
+                vector_store=self.vector_store,
+                embeddings=embeddings,
+                k=settings.retrieval_k,
+                fetch_k=settings.retrieval_fetch_k,
+                lambda_mult=settings.retrieval_mmr_lambda,
+                reranker_model=settings.retrieval_reranker_model,
+                rerank_top_n=settings.retrieval_rerank_top_n,
+                rerank_batch_size=settings.retrieval_rerank_batch_size,
+                budget_ms=settings.retrieval_budget_ms,
+                max_sub_queries=settings.retrieval_max_sub_queries,
+                embed_missing=settings.retrieval_embed_missing,
             )
-
-            # --- REVISED System Prompt Definition ---
-            # This prompt is much simpler. It tells the agent its only job is to have a conversation.
-            prompt_template = ChatPromptTemplate.from_messages([
-                ("system",
-                    "You are a friendly and helpful AI course advisor for the Österreich Institut(Here is the full list of cities where we are currently located: Vienna, Austria Budapest, Hungary Belgrade, Serbia Bratislava, Slovakia Brno, Czech Republic Rome, Italy Sarajevo, Bosnia and Herzegovina Moscow, Russia Warsaw, Poland Krakow, Poland Wroclaw, Poland). Ask questions that follow along with the conversation flow, talk in the user language, mirror the user, if querry is not clear. The user messages stylistic, is the tone-of-voice you should apply too"
-                    "Usercase1: (finding the best fiting course): Ask questions, to find out the correct 1:(location + offline/online) 2: (when has the user started learning german); 3: (at what date should the course start and what time of day). Assist the user in finding the best course for their need Once you have sufficent information perform, retrival search. You will be given a JSON list of courses retrieved from a database that are relevant to the user's query. "
-                    "Usercase2: (FAQ & general information): Your ONLY goal provide the relevant information, always use retrival tool search, to answer the user's query."
-                    "Naturally mention one or more of the courses from the list, referecing why this course is relevant to the user's query."
-                    "Your output MUST be a natural language text message. Never lie or make up information, avoid any assumptions, if you are unsure about the information, say provide contact details or relevant webpages instead."
-                
-                ),
-                MessagesPlaceholder(variable_name="chat_history"),
-                ("human", "{input}"),
-                MessagesPlaceholder(variable_name="agent_scratchpad"),
-            ])
 
             # --- Tool and Agent Creation ---
+            # Prompts are precompiled per (language, use case); the static system prompt
+            # always comes first so provider-side prompt caching can reuse the prefix.
             tools = self._create_tools()
-            agent = create_tool_calling_agent(llm, tools, prompt_template)
-            # We enable return_intermediate_steps to capture the tool's raw output.
-            self.agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True, return_intermediate_steps=True)
+            self.agent_pool = AgentPool(llm, tools, max_execution_time=settings.chat_deadline_sec)
+            self.agent_executor, _ = self.agent_pool.get(DEFAULT_LANGUAGE, USE_CASE_COURSE_FINDER)
             
             logger.info("Chat service initialized successfully")
             
@@ -103,7 +153,35 @@ class ChatService:
             Returns a JSON string with both content for AI and structured data for carousel.
             """
             logger.info(f"Retrieving courses for query: {query}")
-            retrieved_docs = self.vector_store.similarity_search(query, k=5)
+            if capture.in_replay():
+                # Replayed traffic gets the recorded output instead of hitting Supabase/OpenAI embeddings
+                replayed = capture.replayed_tool_output("retrieve_course_information") or EMPTY_RETRIEVAL
+                self._record_retrieval(replayed)
+                return replayed
+            cache_key = " ".join(query.lower().split())
+            deadline = current_deadline()
+            if deadline is not None and deadline.remaining() < settings.retrieval_min_budget_sec:
+                logger.warning("Not enough time left for retrieval, serving cached results")
+                metrics.incr("chat_degraded", reason="retrieval_skipped")
+                return self._stale_retrieval(cache_key)
+            try:
+                # Over-fetch, diversify and dedupe by course_id so the carousel shows no repeats
+                prefetched = _prefetched_retrieval.get()
+                if prefetched is not None:
+                    # Only valid for the first retrieval, and only if the agent searched for the message as is
+                    _prefetched_retrieval.set(None)
+                if prefetched is not None and " ".join(prefetched[0].lower().split()) == cache_key:
+                    retrieved_docs = self.retrieval.rank(*prefetched)
+                elif settings.retrieval_multi_query:
+                    retrieved_docs = self.retrieval.multi_search(query)
+                else:
+                    retrieved_docs = self.retrieval.search(query)
+            except Exception as e:
+                if deadline is None:
+                    raise
+                logger.warning(f"Retrieval failed under deadline, serving cached results: {e}")
+                metrics.incr("chat_degraded", reason="retrieval_failed")
+                return self._stale_retrieval(cache_key)
                 
             # Separate content for AI and structured data for carousel
             ai_content_parts = []
@@ -167,9 +245,94 @@ class ChatService:
                 'courses_data': courses_details
             }
             
-            return json.dumps(result, ensure_ascii=False)
-        
-        return [retrieve_course_information]
+            prefetch_course_details(courses_details)
+            output = json.dumps(result, ensure_ascii=False)
+            self._retrieval_cache.set(cache_key, output, {})
+            self._record_retrieval(output)
+            return output
+
+        @tool
+        def get_location_overview(location: str, question: str = "") -> str:
+            """
+            Returns a precomputed overview of one location (city name or location id): levels, formats,
+            price range, next course starts, free places and short ready-made answers.
+            Use it for general questions about what a city offers; use retrieve_course_information
+            to find or recommend specific courses.
+            """
+            if capture.in_replay():
+                return capture.replayed_tool_output("get_location_overview") or ""
+            overview = self.digests.context_for(location, question)
+            metrics.incr("digest_lookups", result="hit" if overview else "miss")
+            if overview is None:
+                return f"No overview is available for '{location}'. Use retrieve_course_information instead."
+            return overview
+
+        return [
+            retrieve_course_information,
+            get_location_overview,
+            _replayable(live_tools.find_courses_by_schedule),
+            _replayable(live_tools.course_detail_live),
+        ]
+
+    def invalidate_caches(self) -> None:
+        """Drops cached retrieval outputs, e.g. after free places or course status changed."""
+        self._retrieval_cache.store.clear()
+
+    def _record_retrieval(self, output: str) -> None:
+        """Keeps the latest tool output on the request so a timed-out run can still use it."""
+        state = _request_state.get()
+        if state is not None:
+            state["tool_output"] = output
+
+    def _stale_retrieval(self, cache_key: str) -> str:
+        cached = self._retrieval_cache.get(cache_key, allow_stale=True)
+        output = cached[0] if cached else EMPTY_RETRIEVAL
+        self._record_retrieval(output)
+        return output
+
+    async def _run_agent(self, agent_executor, inputs: Dict[str, Any], callbacks: List, deadline: Deadline) -> Dict[str, Any]:
+        """Runs the blocking agent on the agent threads and waits for it until the deadline.
+
+        The thread cannot be stopped from here, so on timeout it is left to wind
+        down on its own: DeadlineCallback ends it at its next LLM or tool call, its
+        iteration limit is the remaining budget, and it keeps the request's
+        admission slot until it is done.
+        """
+        # Copy so the pooled executor's limit stays untouched
+        agent_executor = agent_executor.model_copy(update={"max_execution_time": deadline.remaining()})
+        # The copied context carries the deadline and request state into the thread
+        context = copy_context()
+
+        def run() -> Dict[str, Any]:
+            deadline.timeout()  # may have waited for a free thread past the deadline
+            return agent_executor.invoke(inputs, config={"callbacks": callbacks})
+
+        future = asyncio.wrap_future(self._agent_threads.submit(context.run, run))
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())  # outcome of abandoned runs is not needed
+        hold_slot_until(future)
+        try:
+            # shield: a timeout must not cancel the future the admission slot is waiting on
+            return await asyncio.wait_for(asyncio.shield(future), timeout=deadline.timeout())
+        except asyncio.TimeoutError:
+            metrics.incr("agent_runs_abandoned")
+            raise
+
+    def _degraded_response(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Short answer built from whatever the request collected before running out of time."""
+        tool_data = json.loads(state.get("tool_output") or EMPTY_RETRIEVAL)
+        courses = tool_data.get("courses_data", [])
+        if courses:
+            message = ("Sorry, this is taking longer than usual. Here are the courses that best match "
+                       "your question so far - ask me about any of them for more details.")
+        else:
+            message = ("Sorry, I couldn't put an answer together in time. Please try again in a moment "
+                       "or contact your nearest Österreich Institut directly.")
+        return {
+            "message": message,
+            "courses": courses,
+            "ai_content": tool_data.get("ai_content", ""),
+            "degraded": True,
+        }
 
     def _get_currency_symbol(self, metadata: dict) -> str:
         """Get currency symbol using hardcoded mapping based on country name"""
@@ -201,13 +364,22 @@ class ChatService:
         # Fallback to the full content if no "Description:" found
         return content.strip() if content.strip() else "Course description will be available soon. This course is designed to provide comprehensive language learning experience."
 
-    async def get_response(self, message: str, chat_history: List[Dict[str, str]]) -> Dict[str, Any]:
+    async def get_response(self, message: str, chat_history: List[Dict[str, str]], deadline: Optional[Deadline] = None,
+                           session_id: Optional[str] = None) -> Dict[str, Any]:
         """
         Gets a response from the AI agent using the correct and efficient RAG workflow.
+
+        Every stage (agent, retrieval, live API calls) shares `deadline`; when it runs
+        out a shorter answer is returned instead of waiting on a slow dependency.
         """
-        if not self.agent_executor:
+        if not self.agent_pool:
             raise Exception("Chat service is not properly initialized.")
 
+        deadline = deadline or Deadline(settings.chat_deadline_sec)
+        state: Dict[str, Any] = {}
+        state_token = _request_state.set(state)
+        # Prefetches are cancelled per session; anonymous requests each get their own
+        session_token = current_session.set(session_id or uuid.uuid4().hex)
         try:
             history_messages = [
                 HumanMessage(content=msg["content"]) if msg["role"] == "user" 
@@ -215,18 +387,34 @@ class ChatService:
                 for msg in chat_history
             ]
 
-            # STEP 1: Invoke the agent. It will decide to call the tool on its own.
-            result = self.agent_executor.invoke({
-                "input": message,
-                "chat_history": history_messages,
-            })
+            # STEP 1: Invoke the pooled agent for this conversation. It will decide to call the tool on its own.
+            language, use_case = conversation_key(message, chat_history)
+            agent_executor, cache_stats = self.agent_pool.get(language, use_case)
+            try:
+                with deadline_scope(deadline):
+                    result = await self._run_agent(
+                        agent_executor,
+                        {"input": message, "chat_history": history_messages},
+                        [cache_stats, DeadlineCallback(deadline)],
+                        deadline,
+                    )
+            except (asyncio.TimeoutError, DeadlineExceeded):
+                logger.warning(f"Agent did not finish within {deadline.budget:.1f}s, returning a degraded answer")
+                metrics.incr("chat_degraded", reason="deadline")
+                return self._degraded_response(state)
             
+            capture.record_tool_calls(result.get("intermediate_steps"))
+
             # STEP 2: Extract the structured data and AI content from the tool's output.
             all_retrieved_courses = []
             ai_content = ""
-            if "intermediate_steps" in result and result["intermediate_steps"]:
+            retrieval_steps = [
+                observation for action, observation in result.get("intermediate_steps") or []
+                if getattr(action, "tool", "") == "retrieve_course_information"
+            ]
+            if retrieval_steps:
                 # The 'observation' is the direct JSON string output from our tool
-                tool_output_json = result["intermediate_steps"][0][1]
+                tool_output_json = retrieval_steps[0]
                 try:
                     tool_data = json.loads(tool_output_json)
                     all_retrieved_courses = tool_data.get("courses_data", [])
@@ -247,7 +435,55 @@ class ChatService:
         except Exception as e:
             logger.error(f"Error getting response: {e}", exc_info=True)
             raise Exception(f"Failed to get response: {e}")
+        finally:
+            _request_state.reset(state_token)
+            current_session.reset(session_token)
     
+    async def get_responses_batch(self, items: List[Dict[str, Any]], max_workers: int = 8,
+                                  slot: Optional[Callable[[], AsyncContextManager]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Answers many independent conversations, yielding each result as soon as it finishes.
+
+        All messages are embedded in one batched embeddings call and their vector
+        lookups run concurrently before any agent starts; each agent run then uses
+        its prefetched candidates for its first retrieval if it searches for the
+        message itself. Agent runs are bounded to `max_workers` at a time, and each
+        one runs inside `slot()` (admission control) when given.
+        """
+        if not self.agent_pool:
+            raise Exception("Chat service is not properly initialized.")
+
+        semaphore = asyncio.Semaphore(max_workers)
+        messages = [item["message"] for item in items]
+        vectors = await asyncio.to_thread(self.retrieval.embeddings.embed_documents, messages) if messages else []
+
+        async def lookup(vector):
+            async with semaphore:
+                return await asyncio.to_thread(self.retrieval.fetch_candidates, vector)
+
+        candidates = await asyncio.gather(*(lookup(v) for v in vectors), return_exceptions=True)
+
+        async def run(index: int, item: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                found = candidates[index]
+                if not isinstance(found, BaseException):
+                    _prefetched_retrieval.set((messages[index], vectors[index], found))
+                try:
+                    async with (slot or nullcontext)():
+                        data = await self.get_response(item["message"], item.get("chat_history", []))
+                    return {"index": index, "id": item.get("id"), "success": True, "data": data}
+                except Exception as e:
+                    return {"index": index, "id": item.get("id"), "success": False, "error": str(e)}
+
+        # Each task gets its own context, so the prefetched candidates never leak between items
+        tasks = [asyncio.create_task(run(i, item)) for i, item in enumerate(items)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            for task in tasks:
+                task.cancel()
+
     async def health_check(self) -> bool:
         """Check if the service is healthy."""
         try:
@@ -0,0 +1,189 @@
+"""
+Precomputed per-location catalog digests.
+
+At sync time every location's course summaries are condensed into a small
+digest (level ladder, formats, price range, next starts, free places) plus
+ready-made answers for the recurring FAQ intents. Digests are versioned in the
+`location_digests` table (see supabase/migrations/003) and only rebuilt for
+locations whose source data changed, detected by a hash of the raw summaries.
+Only the latest DIGEST_KEEP_VERSIONS versions per location are kept.
+The chat agent reads them through a tool instead of running a vector search and
+summarizing raw chunks for overview questions.
+"""
+import json
+import logging
+import threading
+import time
+import unicodedata
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from oei_live.client import CourseAPIClient
+from oei_live.digest import build_location_digest, match_faq_intents, materialize_faq_answers, source_hash
+from oei_live.locations import ID_TO_CITY
+from oei_live.parsing import SUMMARY_FIELDS
+
+logger = logging.getLogger(__name__)
+
+
+def _fold(text: str) -> str:
+    """Lowercase without diacritics, so "Wrocław" matches "Wroclaw"."""
+    text = text.strip().lower().replace("ł", "l")
+    return "".join(ch for ch in unicodedata.normalize("NFKD", text) if not unicodedata.combining(ch))
+
+
+_CITY_ALIASES = {_fold(city.name): city.id for city in ID_TO_CITY.values()}
+_CITY_ALIASES.update({"roma": 6, "warszawa": 8, "beograd": 1, "wien": 9})
+
+
+def resolve_location(location: Any) -> Optional[int]:
+    """Location id from an id or a city name."""
+    text = str(location or "").strip()
+    if text.isdigit():
+        return int(text) if int(text) in ID_TO_CITY else None
+    return _CITY_ALIASES.get(_fold(text))
+
+
+class DigestService:
+    """Builds, stores and serves the current digest per location."""
+
+    def __init__(self, client: CourseAPIClient, supabase_client=None, table_name: str = "location_digests"):
+        self.client = client
+        self.supabase_client = supabase_client
+        self.table_name = table_name
+        self._current: Dict[int, Dict[str, Any]] = {}
+        self._loaded = False
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self) -> None:
+        """Reads the latest stored version per location once (from the `_latest` view).
+
+        After a failed read, callers get what is in memory until
+        `digest_load_retry_sec` has passed instead of each one waiting on Supabase.
+        """
+        if self._loaded or self.supabase_client is None or time.monotonic() < self._retry_at:
+            return
+        try:
+            rows = (
+                self.supabase_client.table(f"{self.table_name}_latest")
+                .select("*")
+                .execute()
+                .data
+            ) or []
+        except Exception as e:
+            self._retry_at = time.monotonic() + settings.digest_load_retry_sec
+            metrics.incr("digest_load_failures")
+            logger.warning(f"Could not load location digests, retrying in {settings.digest_load_retry_sec:.0f}s: {e}")
+            return
+        for row in rows:
+            self._current.setdefault(int(row["location_id"]), row)
+        self._loaded = True
+        logger.info(f"Loaded digests for {len(self._current)} locations")
+
+    def get(self, location_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._load()
+            return self._current.get(int(location_id))
+
+    def all(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._load()
+            return [self._current[loc] for loc in sorted(self._current)]
+
+    def missing(self) -> List[int]:
+        """Known locations that have no digest yet."""
+        with self._lock:
+            self._load()
+            return [loc for loc in sorted(ID_TO_CITY) if loc not in self._current]
+
+    def sync_missing_in_background(self) -> Optional[threading.Thread]:
+        """Builds digests for locations without one, e.g. on a fresh database, off the request path."""
+        missing = self.missing()
+        if not missing:
+            return None
+        logger.info(f"Building missing digests for locations {missing}")
+        thread = threading.Thread(target=self.sync, args=(missing,), daemon=True, name="digest-backfill")
+        thread.start()
+        return thread
+
+    def sync(self, location_ids: Optional[Iterable[int]] = None, force: bool = False) -> Dict[str, List[int]]:
+        """Rebuilds digests for locations whose course summaries changed since the stored version."""
+        result: Dict[str, List[int]] = {"updated": [], "unchanged": [], "failed": []}
+        for loc in sorted(int(x) for x in (location_ids if location_ids is not None else ID_TO_CITY)):
+            try:
+                courses = list(self.client.iter_courses(settings.digest_max_pages, location_id=loc, fields=SUMMARY_FIELDS))
+            except Exception as e:
+                logger.warning(f"Digest sync: fetching location {loc} failed: {e}")
+                result["failed"].append(loc)
+                continue
+            digest_hash = source_hash(courses)
+            current = self.get(loc)
+            # Next starts are relative to today, so a digest from an earlier day is stale too
+            unchanged = (current is not None and current.get("source_hash") == digest_hash
+                         and current["digest"].get("built_for") == date.today().isoformat())
+            if unchanged and not force:
+                result["unchanged"].append(loc)
+                continue
+            digest = build_location_digest(loc, courses, next_starts=settings.digest_next_starts)
+            row = {
+                "location_id": loc,
+                "version": (current["version"] + 1) if current else 1,
+                "source_hash": digest_hash,
+                "digest": digest,
+                "faq_answers": materialize_faq_answers(digest, settings.digest_faq_top_n),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            }
+            if not self._store(row):
+                # Still served from memory, but a blank hash makes the next sync retry the write
+                row = dict(row, source_hash="")
+            with self._lock:
+                self._current[loc] = row
+            result["updated"].append(loc)
+        metrics.incr("digest_rebuilds", len(result["updated"]))
+        logger.info(f"Digest sync: {len(result['updated'])} updated, {len(result['unchanged'])} unchanged, "
+                    f"{len(result['failed'])} failed")
+        return result
+
+    def _store(self, row: Dict[str, Any]) -> bool:
+        if self.supabase_client is None:
+            return True
+        try:
+            self.supabase_client.table(self.table_name).insert(row).execute()
+        except Exception as e:
+            logger.warning(f"Could not store digest v{row['version']} for location {row['location_id']}: {e}")
+            return False
+        self._prune(row["location_id"], row["version"])
+        return True
+
+    def _prune(self, location_id: int, version: int) -> None:
+        """Deletes versions older than the last `digest_keep_versions` of a location."""
+        oldest_kept = version - max(1, settings.digest_keep_versions) + 1
+        if oldest_kept <= 1:
+            return
+        try:
+            (
+                self.supabase_client.table(self.table_name)
+                .delete()
+                .eq("location_id", location_id)
+                .lt("version", oldest_kept)
+                .execute()
+            )
+        except Exception as e:
+            logger.warning(f"Could not prune old digests of location {location_id}: {e}")
+
+    def context_for(self, location: Any, question: str = "") -> Optional[str]:
+        """Small JSON context for the agent: the digest plus the answers matching the question."""
+        location_id = resolve_location(location)
+        row = self.get(location_id) if location_id is not None else None
+        if row is None:
+            return None
+        answers = row.get("faq_answers") or {}
+        intents = [i for i in match_faq_intents(question) if i in answers] or list(answers)
+        return json.dumps({
+            "digest": row["digest"],
+            "answers": {i: answers[i] for i in intents},
+            "version": row["version"],
+        }, ensure_ascii=False)
@@ -0,0 +1,161 @@
+"""
+Static prompt building blocks.
+
+Everything in here is deterministic so the rendered system prompt for a given
+(language, use case) is byte-identical across requests. The system prompt is
+always the first message, which keeps the cacheable prefix as long as possible
+for provider-side prompt caching.
+"""
+import re
+from typing import Dict, List, Optional
+
+from oei_live.locations import COUNTRIES
+
+USE_CASE_COURSE_FINDER = "course_finder"
+USE_CASE_FAQ = "faq"
+# Conversations that have not said yet what they want ("Hi!") get a prompt covering both
+USE_CASE_GENERAL = "general"
+
+LANGUAGE_NAMES = {
+    "en": "English",
+    "de": "German",
+    "pl": "Polish",
+    "cs": "Czech",
+    "sk": "Slovak",
+    "hu": "Hungarian",
+    "it": "Italian",
+    "sr": "Serbian/Bosnian",
+    "ru": "Russian",
+}
+DEFAULT_LANGUAGE = "default"
+
+
+def _location_list() -> str:
+    # Sorted so the rendered prompt never depends on dict ordering
+    cities = sorted(
+        f"{city.name}, {country.name}"
+        for country in COUNTRIES.values()
+        for city in country.cities
+    )
+    return "; ".join(cities)
+
+
+BASE_SYSTEM_PROMPT = (
+    "You are a friendly and helpful AI course advisor for the Österreich Institut. "
+    f"Here is the full list of cities where we are currently located: {_location_list()}. "
+    "Ask questions that follow along with the conversation flow, talk in the user language, mirror the user, if querry is not clear. "
+    "The user messages stylistic, is the tone-of-voice you should apply too. "
+    "Naturally mention one or more of the courses from the list, referecing why this course is relevant to the user's query. "
+    "Your output MUST be a natural language text message. Never lie or make up information, avoid any assumptions, "
+    "if you are unsure about the information, say provide contact details or relevant webpages instead."
+)
+
+USE_CASE_PROMPTS = {
+    USE_CASE_COURSE_FINDER: (
+        "Usercase (finding the best fiting course): Ask questions, to find out the correct 1:(location + offline/online) "
+        "2: (when has the user started learning german); 3: (at what date should the course start and what time of day). "
+        "Assist the user in finding the best course for their need Once you have sufficent information perform, retrival search. "
+        "You will be given a JSON list of courses retrieved from a database that are relevant to the user's query."
+    ),
+    USE_CASE_FAQ: (
+        "Usercase (FAQ & general information): Your ONLY goal provide the relevant information, "
+        "always use retrival tool search, to answer the user's query. "
+        "For general questions about one city (which courses, levels, prices, next start dates), "
+        "use the location overview tool first."
+    ),
+    USE_CASE_GENERAL: (
+        "Usercase (not clear yet): Find out whether the user wants to find a fitting course or has a general question. "
+        "To find a course, ask for 1:(location + offline/online) 2:(when the user started learning german) "
+        "3:(course start date and time of day), then perform the retrival search. "
+        "For general questions always use retrival tool search; for questions about one city "
+        "(which courses, levels, prices, next start dates) use the location overview tool first."
+    ),
+}
+
+_COURSE_FINDER_RE = re.compile(
+    r"\b(course|courses|class|classes|kurs|kurse|kursy|kurz|kurzy|corso|corsi|tanfolyam|"
+    r"level|niveau|poziom|[abc][12](?:\.\d)?|beginner|anfänger|evening|morning|afternoon|weekend|"
+    r"online|intensive|start|starting|enrol|enroll|book|learn|learning|lernen|study|studieren|"
+    r"uczyć|nauczyć|imparare|tanulni|naučit|učit)\b",
+    re.IGNORECASE,
+)
+
+_FAQ_RE = re.compile(
+    r"\b(placement|einstufungstest|test|exam|prüfung|egzamin|certificate|zertifikat|certyfikat|"
+    r"price|prices|cost|costs|fee|fees|preis|kosten|cena|payment|pay|invoice|rechnung|refund|cancel|"
+    r"storno|discount|rabatt|contact|kontakt|email|e-mail|phone|telefon|address|adresse|"
+    r"opening hours|öffnungszeiten|holidays?|ferien)\b",
+    re.IGNORECASE,
+)
+
+_LANGUAGE_CHARS = [
+    ("sr", re.compile(r"[ђћљњџј]")),
+    ("ru", re.compile(r"[а-яё]", re.IGNORECASE)),
+    ("cs", re.compile(r"[řůě]", re.IGNORECASE)),
+    ("hu", re.compile(r"[őű]", re.IGNORECASE)),
+    ("pl", re.compile(r"[łąęśźżń]", re.IGNORECASE)),
+    ("sk", re.compile(r"[ľĺŕô]", re.IGNORECASE)),
+    ("sr", re.compile(r"[đć]", re.IGNORECASE)),
+    ("de", re.compile(r"[äöüß]", re.IGNORECASE)),
+]
+
+_LANGUAGE_WORDS = {
+    "en": {"the", "and", "i", "you", "what", "is", "do", "course", "courses", "want", "how"},
+    "de": {"ich", "und", "der", "die", "das", "ist", "nicht", "kurs", "möchte", "wie", "gibt"},
+    "it": {"il", "della", "sono", "vorrei", "corso", "corsi", "che", "per", "come", "un"},
+    "pl": {"jest", "chcę", "nie", "jak", "kurs", "czy", "się"},
+    "cs": {"je", "chci", "jak", "kurz", "kurzy", "prosím"},
+    "hu": {"és", "hogy", "nem", "tanfolyam", "szeretnék", "van"},
+}
+
+
+def detect_language(text: str) -> str:
+    """Cheap script/stopword heuristic; falls back to DEFAULT_LANGUAGE."""
+    if not text:
+        return DEFAULT_LANGUAGE
+    for code, pattern in _LANGUAGE_CHARS:
+        if pattern.search(text):
+            return code
+    words = set(re.findall(r"\w+", text.lower()))
+    best, hits = DEFAULT_LANGUAGE, 0
+    for code, vocab in _LANGUAGE_WORDS.items():
+        count = len(words & vocab)
+        if count > hits:
+            best, hits = code, count
+    return best
+
+
+def classify_use_case(text: str) -> str:
+    """Routes a message to the course finder or FAQ prompt, or to the general one when it says neither."""
+    if _COURSE_FINDER_RE.search(text or ""):
+        return USE_CASE_COURSE_FINDER
+    if _FAQ_RE.search(text or ""):
+        return USE_CASE_FAQ
+    return USE_CASE_GENERAL
+
+
+def conversation_key(message: str, chat_history: Optional[List[Dict[str, str]]] = None) -> tuple:
+    """(language, use_case) for a conversation.
+
+    The language comes from the first user turn. The use case is the first clear
+    one among the user turns so far, so a conversation that opens with "Hi!"
+    stays on the general prompt until the user says what they want and then
+    keeps that prompt (and its cached prefix) for the rest of the conversation.
+    """
+    turns = [m["content"] for m in chat_history or [] if m.get("role") == "user"] + [message]
+    use_case = next((uc for uc in map(classify_use_case, turns) if uc != USE_CASE_GENERAL), USE_CASE_GENERAL)
+    return detect_language(turns[0]), use_case
+
+
+def pool_size() -> int:
+    """Number of distinct (language, use case) keys conversation_key can return."""
+    return (len(LANGUAGE_NAMES) + 1) * len(USE_CASE_PROMPTS)
+
+
+def build_system_prompt(language: str, use_case: str) -> str:
+    parts = [BASE_SYSTEM_PROMPT, USE_CASE_PROMPTS.get(use_case, USE_CASE_PROMPTS[USE_CASE_COURSE_FINDER])]
+    if language in LANGUAGE_NAMES:
+        parts.append(
+            f"The conversation started in {LANGUAGE_NAMES[language]}; keep answering in it unless the user switches language."
+        )
+    return " ".join(parts)
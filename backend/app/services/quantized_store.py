@@ -0,0 +1,117 @@
+"""
+Compact local storage for embedding matrices.
+
+Vectors are stored as float16 or as int8 with one float32 scale per row, in
+plain .npy files that are memory-mapped on load, so several workers can share
+the same pages and nothing is copied into the Python heap. For 10k chunks of
+`text-embedding-3-small` (1536 dims) that is ~61 MB as float32, ~31 MB as
+float16 and ~15 MB as int8.
+
+This is a library module: the chat service does not build or load a store
+(retrieval goes through Supabase, see match_documents_compact for the
+half-precision search there). Offline jobs and evaluation scripts can build
+one with `from_float(...).save(dir)` and search it with `load(dir)`.
+"""
+import json
+from pathlib import Path
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+SUPPORTED_DTYPES = ("int8", "float16")
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8 quantization. Returns (codes, scales)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class QuantizedEmbeddingStore:
+    """Brute-force inner-product search over quantized vectors with optional full-precision rescoring."""
+
+    def __init__(self, vectors: np.ndarray, ids: Sequence[Any], scales: Optional[np.ndarray] = None,
+                 full_precision: Optional[np.ndarray] = None):
+        self.vectors = vectors
+        self.scales = scales
+        self.ids = list(ids)
+        self.full_precision = full_precision
+
+    @classmethod
+    def from_float(cls, vectors: np.ndarray, ids: Sequence[Any], dtype: str = "int8",
+                   keep_full_precision: bool = False) -> "QuantizedEmbeddingStore":
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"dtype must be one of {SUPPORTED_DTYPES}, got {dtype!r}")
+        vectors = np.asarray(vectors, dtype=np.float32)
+        full = vectors if keep_full_precision else None
+        if dtype == "int8":
+            codes, scales = quantize_int8(vectors)
+            return cls(codes, ids, scales=scales, full_precision=full)
+        return cls(vectors.astype(np.float16), ids, full_precision=full)
+
+    @property
+    def dtype(self) -> str:
+        return str(self.vectors.dtype)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes used by the compact representation (excluding the optional full-precision copy)."""
+        return int(self.vectors.nbytes + (self.scales.nbytes if self.scales is not None else 0))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def save(self, directory: str) -> None:
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "vectors.npy", self.vectors)
+        if self.scales is not None:
+            np.save(path / "scales.npy", self.scales)
+        if self.full_precision is not None:
+            np.save(path / "full.npy", np.asarray(self.full_precision, dtype=np.float32))
+        (path / "ids.json").write_text(json.dumps(self.ids))
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "QuantizedEmbeddingStore":
+        path = Path(directory)
+        mode = "r" if mmap else None
+        vectors = np.load(path / "vectors.npy", mmap_mode=mode)
+        scales = np.load(path / "scales.npy") if (path / "scales.npy").exists() else None
+        full = np.load(path / "full.npy", mmap_mode=mode) if (path / "full.npy").exists() else None
+        ids = json.loads((path / "ids.json").read_text())
+        return cls(vectors, ids, scales=scales, full_precision=full)
+
+    def _scores(self, query: np.ndarray, block_rows: int = 8192) -> np.ndarray:
+        # Dequantize block by block so a memory-mapped matrix never materializes as float32
+        scores = np.empty(len(self.vectors), dtype=np.float32)
+        for start in range(0, len(self.vectors), block_rows):
+            block = np.asarray(self.vectors[start:start + block_rows], dtype=np.float32)
+            scores[start:start + block_rows] = block @ query
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def search(self, query: Sequence[float], k: int = 10, rescore_candidates: int = 0) -> List[Tuple[Any, float]]:
+        """Top-k (id, score) by inner product.
+
+        With `rescore_candidates` > k and a full-precision copy available, the
+        top candidates from the compact scan are re-scored at full precision.
+        """
+        if not len(self.vectors) or k <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        scores = self._scores(query)
+        pool = min(len(scores), max(k, rescore_candidates))
+        top = np.argpartition(-scores, pool - 1)[:pool]
+
+        if rescore_candidates > k and self.full_precision is not None:
+            rows = np.sort(top)
+            scores_top = np.asarray(self.full_precision[rows], dtype=np.float32) @ query
+            order = np.argsort(-scores_top)[:k]
+            return [(self.ids[rows[i]], float(scores_top[i])) for i in order]
+
+        top = top[np.argsort(-scores[top])][:k]
+        return [(self.ids[i], float(scores[i])) for i in top]
@@ -0,0 +1,54 @@
+"""
+Stand-in chat model for replaying captured traffic without calling OpenAI.
+
+With REPLAY_STUB_LLM=true (next to REPLAY_CAPTURE_FILES on a local backend),
+the agent's model is replaced by ReplayChatModel. For a replayed request it
+asks for the recorded tool calls one after another, so the tools (which return
+their recorded outputs) and everything around them run as they did, and then
+answers with a fixed text. Replayed latencies then show the backend's own
+overhead plus REPLAY_STUB_LLM_LATENCY_MS per model call, not OpenAI's.
+"""
+import time
+import uuid
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from app.core import capture
+
+REPLAYED_ANSWER = "[replayed answer]"
+
+
+class ReplayChatModel(BaseChatModel):
+    """Replays the recorded tool calls of the current request, then gives a fixed answer."""
+
+    latency: float = 0.0  # seconds per call, to approximate the real model
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay-stub"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ReplayChatModel":
+        return self
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                  **kwargs: Any) -> ChatResult:
+        if self.latency > 0:
+            time.sleep(self.latency)
+        # Tool results since the user's message tell how many recorded calls were already made
+        done = 0
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                break
+            done += isinstance(message, ToolMessage)
+        calls = capture.recorded_tool_calls()
+        if done < len(calls):
+            call = calls[done]
+            args = call.get("tool_input") if isinstance(call.get("tool_input"), dict) else {}
+            message = AIMessage(content="", tool_calls=[{"name": call.get("tool", ""), "args": args,
+                                                         "id": f"replay-{uuid.uuid4().hex[:8]}"}])
+        else:
+            message = AIMessage(content=REPLAYED_ANSWER)
+        return ChatResult(generations=[ChatGeneration(message=message)])
@@ -0,0 +1,281 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.metrics import metrics
+from oei_live.deadline import remaining_time
+
+logger = logging.getLogger(__name__)
+
+# A single worker keeps the cross-encoder off the request thread without
+# loading several copies of the model.
+_rerank_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reranker")
+# Concurrent match_documents RPCs for multi-query retrieval
+_lookup_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="vector-lookup")
+
+# Sentence boundaries, plus a run of "and/also/plus ..." ("and also") when it opens a new question
+_SPLIT_RE = re.compile(
+    r"[?!;]+|\.\s+|,?\s+(?:(?:and|also|plus|und|auch|oraz|a także|e|i|és)\s+)+"
+    r"(?=(?:do|does|did|is|are|can|could|what|how|when|where|which|who|gibt|habt|wie|was|wann|czy|jak|kdy|jaké|van|mi)\b)",
+    re.IGNORECASE,
+)
+_MIN_SUB_QUERY_WORDS = 2
+# Below this much request time, candidates without embeddings are not embedded for MMR
+_MIN_EMBED_BUDGET_SEC = 1.0
+
+
+def decompose_query(query: str, max_parts: int = 4) -> List[str]:
+    """Rule-based split of a mixed-intent question into sub-queries.
+
+    The original question is kept first so its own intent is never lost.
+    Returns just [query] when there is nothing to split.
+    """
+    parts = [p.strip(" ,.") for p in _SPLIT_RE.split(query or "")]
+    parts = [p for p in parts if len(p.split()) >= _MIN_SUB_QUERY_WORDS]
+    if len(parts) < 2:
+        return [query]
+    return [query] + parts[:max_parts - 1]
+
+
+def mmr_select(query_vec: np.ndarray, doc_vecs: np.ndarray, k: int, lambda_mult: float = 0.5) -> List[int]:
+    """Greedy maximal-marginal-relevance selection. Returns indices into doc_vecs."""
+    n = doc_vecs.shape[0]
+    if n == 0 or k <= 0:
+        return []
+    k = min(k, n)
+
+    docs = doc_vecs / np.maximum(np.linalg.norm(doc_vecs, axis=1, keepdims=True), 1e-12)
+    query = query_vec / max(float(np.linalg.norm(query_vec)), 1e-12)
+    relevance = docs @ query
+    pairwise = docs @ docs.T
+
+    selected = [int(np.argmax(relevance))]
+    # Highest similarity of every candidate to anything already selected
+    max_sim = pairwise[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_sim
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_sim, pairwise[best], out=max_sim)
+    return selected
+
+
+def dedupe_key(doc: Any) -> str:
+    """Live course chunks collapse on course_id, everything else on content hash."""
+    metadata = getattr(doc, "metadata", {}) or {}
+    course_id = metadata.get("course_id")
+    if course_id is not None:
+        return f"course:{course_id}"
+    content = getattr(doc, "page_content", "") or metadata.get("content", "")
+    return "chunk:" + hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def interleave_unique(ranked_lists: Sequence[Sequence[Any]], k: int) -> List[Any]:
+    """Round-robin over ranked lists, skipping duplicates, so every sub-query is represented."""
+    seen = set()
+    out: List[Any] = []
+    for rank in range(max((len(r) for r in ranked_lists), default=0)):
+        for ranked in ranked_lists:
+            if rank < len(ranked):
+                key = dedupe_key(ranked[rank])
+                if key not in seen:
+                    seen.add(key)
+                    out.append(ranked[rank])
+                    if len(out) == k:
+                        return out
+    return out
+
+
+def dedupe_candidates(candidates: Sequence[Tuple[Any, float, np.ndarray]]) -> List[Tuple[Any, float, np.ndarray]]:
+    """Keep the best scoring candidate per dedupe key, preserving score order."""
+    best = {}
+    for cand in candidates:
+        key = dedupe_key(cand[0])
+        if key not in best or cand[1] > best[key][1]:
+            best[key] = cand
+    return sorted(best.values(), key=lambda c: c[1], reverse=True)
+
+
+class RetrievalPipeline:
+    """Over-fetches from the vector store, diversifies with MMR and optionally re-ranks."""
+
+    def __init__(
+        self,
+        vector_store,
+        embeddings,
+        k: int = 5,
+        fetch_k: int = 40,
+        lambda_mult: float = 0.5,
+        reranker_model: str = "",
+        rerank_top_n: int = 10,
+        rerank_batch_size: int = 16,
+        budget_ms: float = 150.0,
+        max_sub_queries: int = 4,
+        embed_missing: bool = False,
+        embedding_cache_size: int = 512,
+    ):
+        self.vector_store = vector_store
+        self.embeddings = embeddings
+        self.k = k
+        self.fetch_k = max(fetch_k, k)
+        self.lambda_mult = lambda_mult
+        self.reranker_model = reranker_model
+        self.rerank_top_n = max(rerank_top_n, k)
+        self.rerank_batch_size = rerank_batch_size
+        self.budget_ms = budget_ms
+        self.max_sub_queries = max_sub_queries
+        self.embed_missing = embed_missing
+        self.embedding_cache_size = embedding_cache_size
+        self._reranker = None
+        self._reranker_failed = False
+        # Chunk embeddings computed here because the match function did not return them
+        self._embedding_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._embedding_lock = threading.Lock()
+        self._warned_missing = False
+
+    def _get_reranker(self):
+        """Lazily loads the cross-encoder; sentence-transformers is optional."""
+        if not self.reranker_model or self._reranker_failed:
+            return None
+        if self._reranker is None:
+            try:
+                from sentence_transformers import CrossEncoder
+                self._reranker = CrossEncoder(self.reranker_model, device="cpu")
+            except Exception as e:
+                logger.warning(f"Cross-encoder re-ranking disabled: {e}")
+                self._reranker_failed = True
+                return None
+        return self._reranker
+
+    def _candidate_vectors(self, candidates: Sequence[Tuple[Any, float, np.ndarray]], dim: int) -> Optional[np.ndarray]:
+        """Embedding matrix for MMR, or None if it cannot be had.
+
+        `match_documents_compact` returns the stored embeddings; plain
+        `match_documents` does not. With `embed_missing`, missing ones are embedded
+        from the chunk text in one batched call and kept in a small LRU, since the
+        same chunks keep coming back; otherwise the similarity order is kept.
+        """
+        if all(len(c[2]) == dim for c in candidates):
+            return np.asarray([c[2] for c in candidates], dtype=np.float32)
+        if not self._warned_missing:
+            self._warned_missing = True
+            logger.warning(
+                f"Vector store returned candidates without embeddings; "
+                f"{'embedding them for MMR' if self.embed_missing else 'MMR is disabled'}. "
+                "Set SUPABASE_QUERY_NAME=match_documents_compact (migration 002) to get them from the database."
+            )
+        if not self.embed_missing or remaining_time(default=float("inf")) < _MIN_EMBED_BUDGET_SEC:
+            metrics.incr("retrieval_mmr_skipped", reason="no_embeddings")
+            return None
+
+        keys = [hashlib.sha1(getattr(c[0], "page_content", "").encode("utf-8")).hexdigest() for c in candidates]
+        with self._embedding_lock:
+            known = {k: self._embedding_cache[k] for k in keys if k in self._embedding_cache}
+        missing = [(k, c) for k, c in zip(keys, candidates) if len(c[2]) != dim and k not in known]
+        if missing:
+            try:
+                vectors = self.embeddings.embed_documents([getattr(c[0], "page_content", "") for _, c in missing])
+            except Exception as e:
+                logger.warning(f"Embedding candidates for MMR failed, keeping similarity order: {e}")
+                metrics.incr("retrieval_mmr_skipped", reason="embed_failed")
+                return None
+            with self._embedding_lock:
+                for (key, _), vector in zip(missing, vectors):
+                    known[key] = self._embedding_cache[key] = np.asarray(vector, dtype=np.float32)
+                while len(self._embedding_cache) > self.embedding_cache_size:
+                    self._embedding_cache.popitem(last=False)
+            metrics.incr("retrieval_candidates_embedded", len(missing))
+        return np.asarray([c[2] if len(c[2]) == dim else known[k] for k, c in zip(keys, candidates)], dtype=np.float32)
+
+    def fetch_candidates(self, query_vec: List[float], fetch_k: Optional[int] = None) -> List[Tuple[Any, float, np.ndarray]]:
+        """Returns (document, score, embedding) triples for the nearest chunks."""
+        return self.vector_store.similarity_search_by_vector_returning_embeddings(
+            query_vec, k=fetch_k or self.fetch_k
+        )
+
+    def search(self, query: str) -> List[Any]:
+        query_vec = self.embeddings.embed_query(query)
+        candidates = self.fetch_candidates(query_vec)
+        return self.rank(query, query_vec, candidates)
+
+    def multi_search(self, query: str) -> List[Any]:
+        """Splits a mixed-intent question and retrieves for every part without extra serial round trips.
+
+        All sub-queries are embedded in one batched call, their vector lookups run
+        concurrently, and the per-sub-query rankings are interleaved and deduped.
+        """
+        sub_queries = decompose_query(query, self.max_sub_queries)
+        if len(sub_queries) == 1:
+            return self.search(query)
+        logger.info(f"Multi-query retrieval with {len(sub_queries)} sub-queries: {sub_queries}")
+        vectors = self.embeddings.embed_documents(sub_queries)
+        candidate_lists = list(_lookup_executor.map(self.fetch_candidates, vectors))
+        # Candidates missing embeddings are embedded once for all sub-queries here, so
+        # the per-sub-query rankings below only hit the embedding cache
+        pooled = {}
+        for candidates in candidate_lists:
+            for cand in candidates:
+                pooled.setdefault(getattr(cand[0], "page_content", ""), cand)
+        if pooled:
+            self._candidate_vectors(list(pooled.values()), len(vectors[0]))
+        ranked = [self.rank(q, v, c) for q, v, c in zip(sub_queries, vectors, candidate_lists)]
+        return interleave_unique(ranked, self.k)
+
+    def rank(self, query: str, query_vec: List[float], candidates: Sequence[Tuple[Any, float, np.ndarray]]) -> List[Any]:
+        """Diversifies and re-ranks already fetched candidates within the latency budget."""
+        started = time.perf_counter()
+        unique = dedupe_candidates(candidates)
+        if len(unique) <= self.k:
+            return [c[0] for c in unique]
+
+        reranker = self._get_reranker()
+        pool_size = self.rerank_top_n if reranker else self.k
+        query_arr = np.asarray(query_vec, dtype=np.float32)
+        doc_vecs = self._candidate_vectors(unique, len(query_arr))
+        # Time spent embedding candidates is network time, not ranking time
+        started = time.perf_counter()
+        if doc_vecs is not None:
+            picked = mmr_select(query_arr, doc_vecs, pool_size, self.lambda_mult)
+            docs = [unique[i][0] for i in picked]
+        else:
+            docs = [c[0] for c in unique[:pool_size]]
+
+        if reranker:
+            remaining = self.budget_ms / 1000.0 - (time.perf_counter() - started)
+            remaining = min(remaining, remaining_time(default=remaining))
+            docs = self._rerank(reranker, query, docs, remaining)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        if elapsed_ms > self.budget_ms:
+            logger.warning(f"Retrieval ranking took {elapsed_ms:.1f}ms (budget {self.budget_ms:.0f}ms)")
+        return docs[:self.k]
+
+    def _rerank(self, reranker, query: str, docs: List[Any], timeout: float) -> List[Any]:
+        """Scores (query, chunk) pairs; keeps the MMR order if the budget runs out."""
+        if timeout <= 0:
+            return docs
+        pairs = [(query, getattr(doc, "page_content", "")) for doc in docs]
+        future = _rerank_executor.submit(reranker.predict, pairs, batch_size=self.rerank_batch_size)
+        try:
+            scores = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            logger.warning("Cross-encoder re-ranking exceeded the latency budget, using MMR order")
+            return docs
+        except Exception as e:
+            logger.warning(f"Cross-encoder re-ranking failed: {e}")
+            return docs
+        order = np.argsort(-np.asarray(scores))
+        return [docs[i] for i in order]
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Benchmark course page handling:
+
+1. decoding: full json.loads plus projection vs the streaming field selection
+   used by iter_courses(fields=...), as wall time per page and the tracemalloc
+   peak of one decode (what a worker pays per concurrently parsed page);
+2. caching: heap held by --cached-pages cached pages as raw dicts vs
+   CompactCoursePage, and the cost of reading `page["courses"]` from each.
+
+Runs on a synthetic page (seeded, so numbers are reproducible on one machine)
+or on a saved page body.
+
+    python bench_course_pages.py
+    python bench_course_pages.py --courses 50 --description-chars 8000 --cached-pages 400
+    python bench_course_pages.py --page saved_courses_page.json
+"""
+import argparse
+import io
+import json
+import random
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from oei_live import streaming
+from oei_live.compact import CompactCoursePage, ValuePool
+from oei_live.parsing import SUMMARY_FIELDS
+
+
+def synthetic_page(courses: int, description_chars: int, seed: int = 0) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    words = ["Deutsch", "lernen", "Grammatik", "Konversation", "Prüfung", "Kurs", "Abend", "Wortschatz"]
+
+    def html() -> str:
+        parts: List[str] = []
+        while sum(map(len, parts)) < description_chars:
+            parts.append(f"<p><b>{rng.choice(words)}</b> {' '.join(rng.choices(words, k=12))} &amp; mehr</p>")
+        return "".join(parts)
+
+    return {
+        "courses": [
+            {
+                "id": 1000 + i,
+                "title": f"Deutsch {rng.choice(['A1', 'A2', 'B1', 'B2'])} – Kurs {i}",
+                "levels": rng.choice(["A1", "A2", "B1", "B2"]),
+                "status": "open",
+                "status_text": "Anmeldung offen",
+                "free_places_count": rng.randint(0, 12),
+                "start_at": f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                "finish_at": "2027-02-28",
+                "price": round(rng.uniform(200, 900), 2),
+                "currency_symbol": "zł",
+                "format_text": rng.choice(["Präsenz", "Online", "Hybrid"]),
+                "target_group_text": "Erwachsene",
+                "description": html(),
+                "university": {"title": "ÖI Warschau", "location": "Warsaw", "country": {"country_name": "Poland"}},
+                "course_weekdays": [{"course_weekdays": {"week_day": 2, "start_time": "17:00", "finish_time": "20:00"}}],
+                "teachers": [{"teachers": {"id": 7, "first_name": "Anna", "last_name": "Nowak"}}],
+            }
+            for i in range(courses)
+        ],
+        "pagy": {"page": 1, "next": 2, "count": courses},
+    }
+
+
+def full_decode(body: bytes) -> Any:
+    page = json.loads(body)
+    wanted = set(SUMMARY_FIELDS)
+    return [{k: v for k, v in c.items() if k in wanted} for c in page["courses"]], page.get("pagy") or {}
+
+
+def streamed(body: bytes) -> Any:
+    return streaming.select_course_fields(io.BytesIO(body), SUMMARY_FIELDS)
+
+
+def measure(fn: Callable[[bytes], Any], body: bytes, repeat: int) -> Dict[str, float]:
+    fn(body)  # warm up
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(body)
+    elapsed = (time.perf_counter() - started) / repeat
+    tracemalloc.start()
+    result = fn(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {"ms": elapsed * 1000.0, "peak_kib": peak / 1024.0}
+
+
+def timed(fn: Callable[[], Any], repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000.0
+
+
+def bench_cache(body: bytes, pages: int, repeat: int) -> None:
+    for name, build in (("raw dicts", lambda pool: json.loads(body)),
+                        ("CompactCoursePage", lambda pool: CompactCoursePage(json.loads(body), pool))):
+        tracemalloc.start()
+        pool = ValuePool()
+        cached = [build(pool) for _ in range(pages)]
+        held, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{pages} cached pages as {name:<18} {held / 2**20:8.1f} MiB")
+        del cached
+
+    raw, compact = json.loads(body), CompactCoursePage(json.loads(body), ValuePool())
+    view = compact["courses"]
+    list(view)
+    reads = (
+        ("raw page, all rows", lambda: [c["title"] for c in raw["courses"]]),
+        ("compact, all rows", lambda: [c["title"] for c in compact["courses"]]),
+        ("compact, first row only", lambda: compact["courses"][0]["title"]),
+        ("compact, held view again", lambda: [c["title"] for c in view]),
+        ("compact, rows() + descriptions", lambda: [c["description"] for c in compact.rows()]),
+    )
+    for name, fn in reads:
+        print(f"{name:<32} {timed(fn, repeat):8.3f} ms/read")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page", help="saved /api/courses response body (JSON)")
+    parser.add_argument("--courses", type=int, default=25)
+    parser.add_argument("--description-chars", type=int, default=4000)
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--cached-pages", type=int, default=100)
+    args = parser.parse_args()
+
+    if args.page:
+        with open(args.page, "rb") as f:
+            body = f.read()
+    else:
+        body = json.dumps(synthetic_page(args.courses, args.description_chars), ensure_ascii=False).encode("utf-8")
+    print(f"page: {len(body) / 1024:.0f} KiB, fields: {len(SUMMARY_FIELDS)}, "
+          f"ijson backend: {getattr(streaming.ijson, 'backend', 'not installed')}")
+
+    assert [dict(c) for c in streamed(body)[0]] == full_decode(body)[0]
+    for name, fn in (("json.loads + projection", full_decode), ("select_course_fields", streamed)):
+        r = measure(fn, body, args.repeat)
+        print(f"{name:<26} {r['ms']:8.2f} ms/page   peak {r['peak_kib']:8.0f} KiB")
+    print()
+    bench_cache(body, args.cached_pages, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
@@ -13,8 +14,15 @@ load_dotenv()
 parent_dir = Path(__file__).parent.parent.parent
 sys.path.append(str(parent_dir))
 
-from app.api.chat import router as chat_router
+from app.api.chat import router as chat_router, chat_service
+from app.api.sync import router as sync_router
+from oei_live import text as live_text, tools as live_tools
+from oei_live.tools import detail_prefetcher
 from app.core.config import settings
+from app.core.capture import capture_active, capture_middleware
+from app.core.memory import memory_budget, memory_report, start_tracing
+from app.core.metrics import metrics
+from app.services.availability_sync import start_availability_poller
 
 # Create FastAPI app
 app = FastAPI(
@@ -39,8 +47,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in capture of /chat/message traffic (and tool-output stubs for replays)
+if capture_active() or settings.replay_capture_files:
+    app.middleware("http")(capture_middleware)
+
 # Include routers
 app.include_router(chat_router, prefix="/chat", tags=["chat"])
+app.include_router(sync_router, prefix="/sync", tags=["sync"])
+
+# Caches a worker drops, largest first, when together they go over MEMORY_BUDGET_MB
+memory_budget.register("course_api", live_tools._client.cache.store, live_tools._client.cache.store.clear)
+memory_budget.register("course_api_pool", live_tools._client.pool._values, live_tools._client.pool.clear)
+memory_budget.register("retrieval", chat_service._retrieval_cache.store, chat_service.invalidate_caches)
+memory_budget.register("prefetch", detail_prefetcher._ready, detail_prefetcher.clear)
+memory_budget.register("strip_html", live_text._strip_memo, live_text.clear_strip_memo)
+
+@app.on_event("startup")
+async def start_background_jobs():
+    start_tracing()
+    start_availability_poller(chat_service)
+    chat_service.digests.sync_missing_in_background()
+    if settings.memory_budget_mb:
+        asyncio.create_task(memory_budget.run(settings.memory_check_interval_sec))
 
 @app.get("/")
 async def root():
@@ -50,6 +78,30 @@ async def root():
 async def health_check():
     return {"status": "healthy", "message": "API is running"}
 
+@app.get("/metrics")
+async def get_metrics():
+    snapshot = metrics.snapshot()
+    snapshot["prefetch"] = detail_prefetcher.stats()
+    return snapshot
+
+@app.get("/debug/memory")
+async def get_memory_report(limit: int = 15):
+    """RSS, tracemalloc top modules and cache sizes of this worker (MEMORY_DEBUG_ENABLED only)."""
+    if not settings.memory_debug_enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    caches = {
+        "course_api": live_tools._client.cache.store,
+        "retrieval": chat_service._retrieval_cache.store,
+        "prefetch": detail_prefetcher._ready,
+        "schedule_index": live_tools._schedule_indexes,
+        "digests": chat_service.digests._current,
+        "strip_html": live_text._strip_memo,
+    }
+    report = await asyncio.to_thread(memory_report, caches, limit)
+    report["agents"] = len(chat_service.agent_pool._entries) if chat_service.agent_pool else 0
+    report["interned_values"] = len(live_tools._client.pool)
+    return report
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     return JSONResponse(
@@ -1,5 +1,4 @@
 from .client import CourseAPIClient
+from .schedule import ScheduleIndex
 
-__all__ = ["CourseAPIClient"]
-
-
+__all__ = ["CourseAPIClient", "ScheduleIndex"]
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .client import CourseAPIClient
+
+logger = logging.getLogger(__name__)
+
+# Summary fields that change during the day; everything else only moves with the daily sync
+AVAILABILITY_FIELDS = ("free_places_count", "status", "status_text")
+
+
+@dataclass(frozen=True)
+class AvailabilityChange:
+    location_id: int
+    course_id: int
+    changes: Dict[str, Tuple[Any, Any]]  # field -> (old, new)
+
+    def new_value(self, field: str, default: Any = None) -> Any:
+        return self.changes[field][1] if field in self.changes else default
+
+
+Listener = Callable[[List[AvailabilityChange]], None]
+
+
+class AvailabilityPoller:
+    """
+    Polls course summary pages and reports free-place/status deltas.
+
+    Pages are fetched through CourseAPIClient, so unchanged pages come back from
+    its cache via If-None-Match/304 and are not diffed at all. The first poll of
+    a location only records a baseline. Each location's interval halves after a
+    poll that saw changes and grows by half after a quiet one, within bounds.
+    """
+
+    def __init__(
+        self,
+        client: CourseAPIClient,
+        location_ids: Iterable[int],
+        min_interval: float = 60.0,
+        max_interval: float = 1800.0,
+        max_pages: int = 5,
+    ) -> None:
+        self.client = client
+        self.location_ids = [int(x) for x in location_ids]
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_pages = max_pages
+        self.snapshots: Dict[int, Dict[int, Dict[str, Any]]] = {}
+        self.intervals: Dict[int, float] = {loc: min_interval for loc in self.location_ids}
+        self.next_due: Dict[int, float] = {loc: 0.0 for loc in self.location_ids}
+        self._pages: Dict[Tuple[int, int], Any] = {}
+        self._listeners: List[Listener] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, listener: Listener) -> None:
+        self._listeners.append(listener)
+
+    def _emit(self, changes: List[AvailabilityChange]) -> None:
+        for listener in list(self._listeners):
+            try:
+                listener(changes)
+            except Exception:
+                logger.exception("Availability listener failed")
+
+    def _fetch_summaries(self, location_id: int) -> Optional[Dict[int, Dict[str, Any]]]:
+        """Returns {course_id: availability fields}, or None if no page changed since the last poll."""
+        current: Dict[int, Dict[str, Any]] = {}
+        changed = False
+        page = 1
+        while page <= self.max_pages:
+            data = self.client.get_courses_page(page, location_id=location_id, revalidate=True)
+            # A 304 hands back the very same cached object
+            if self._pages.get((location_id, page)) is not data:
+                changed = True
+                self._pages[(location_id, page)] = data
+            for c in data.get("courses", []):
+                if c.get("id") is None:
+                    continue
+                current[int(c["id"])] = {f: c.get(f) for f in AVAILABILITY_FIELDS}
+            nxt = (data.get("pagy") or {}).get("next")
+            if not nxt:
+                break
+            page = int(nxt)
+        return current if changed else None
+
+    def poll_location(self, location_id: int) -> List[AvailabilityChange]:
+        current = self._fetch_summaries(location_id)
+        with self._lock:
+            previous = self.snapshots.get(location_id)
+            if current is None:
+                changes: List[AvailabilityChange] = []
+            else:
+                self.snapshots[location_id] = current
+                changes = [] if previous is None else self._diff(location_id, previous, current)
+            interval = self.intervals.get(location_id, self.min_interval)
+            interval = interval / 2 if changes else interval * 1.5
+            self.intervals[location_id] = min(self.max_interval, max(self.min_interval, interval))
+            self.next_due[location_id] = time.monotonic() + self.intervals[location_id]
+        if changes:
+            logger.info(f"Location {location_id}: availability changed for {len(changes)} course(s)")
+            self._emit(changes)
+        return changes
+
+    @staticmethod
+    def _diff(location_id: int, previous: Dict[int, Dict[str, Any]], current: Dict[int, Dict[str, Any]]) -> List[AvailabilityChange]:
+        changes = []
+        for cid, fields in current.items():
+            old = previous.get(cid)
+            if old is None:
+                continue  # new courses arrive with the daily sync
+            delta = {f: (old.get(f), v) for f, v in fields.items() if old.get(f) != v}
+            if delta:
+                changes.append(AvailabilityChange(location_id, cid, delta))
+        return changes
+
+    def run_due(self) -> List[AvailabilityChange]:
+        now = time.monotonic()
+        changes: List[AvailabilityChange] = []
+        for loc in self.location_ids:
+            if self.next_due.get(loc, 0.0) <= now:
+                try:
+                    changes.extend(self.poll_location(loc))
+                except Exception as e:
+                    logger.warning(f"Availability poll failed for location {loc}: {e}")
+                    self.next_due[loc] = now + self.intervals.get(loc, self.min_interval)
+        return changes
+
+    def run_forever(self, stop: threading.Event, tick: float = 5.0) -> None:
+        while not stop.is_set():
+            self.run_due()
+            stop.wait(tick)
+
+    def start(self) -> Tuple[threading.Thread, threading.Event]:
+        stop = threading.Event()
+        thread = threading.Thread(target=self.run_forever, args=(stop,), daemon=True, name="availability-poller")
+        thread.start()
+        return thread, stop
@@ -1,20 +1,15 @@
 from __future__ import annotations
 
 import time
-import re
-from html import unescape
-from typing import Any, Dict, Generator, Optional, Tuple
+from typing import Any, Callable, Dict, Generator, Iterable, Mapping, Optional, Tuple
 from urllib.parse import urlencode
 
 import requests
 
-
-_TAG_RE = re.compile(r"<[^>]+>")
-
-
-def strip_html_to_text(html: str) -> str:
-    text = _TAG_RE.sub(" ", unescape(html or ""))
-    return re.sub(r"\s+", " ", text).strip()
+from .compact import ValuePool, compact_page
+from .deadline import DeadlineExceeded, current_deadline
+from .streaming import select_course_fields
+from .text import strip_html_cached, strip_html_to_text  # noqa: F401  (re-exported)
 
 
 class TTLCache:
@@ -23,19 +18,19 @@ class TTLCache:
         self.max_items = max_items
         self.store: Dict[str, Tuple[float, Any, Dict[str, str]]] = {}
 
-    def get(self, key: str) -> Optional[Tuple[Any, Dict[str, str]]]:
+    def get(self, key: str, allow_stale: bool = False) -> Optional[Tuple[Any, Dict[str, str]]]:
+        # Expired entries are kept until evicted so they can be revalidated or served stale
         now = time.time()
         entry = self.store.get(key)
         if not entry:
             return None
         ts, val, meta = entry
-        if now - ts < self.ttl:
+        if allow_stale or now - ts < self.ttl:
             return val, meta
-        self.store.pop(key, None)
         return None
 
     def set(self, key: str, value: Any, meta: Dict[str, str]) -> None:
-        if len(self.store) >= self.max_items:
+        if key not in self.store and len(self.store) >= self.max_items:
             self.store.pop(next(iter(self.store)))
         self.store[key] = (time.time(), value, meta)
 
@@ -43,17 +38,34 @@ class TTLCache:
 class CourseAPIClient:
     BASE = "https://servuswebshop.oesterreichinstitut.com"
 
-    def __init__(self, location_id: int = 8, rps: float = 2.0, timeout: float = 8.0, ttl: int = 60) -> None:
+    def __init__(self, location_id: int = 8, rps: float = 2.0, timeout: float = 8.0, ttl: int = 60,
+                 compact: bool = True) -> None:
         self.location_id = location_id
         self.session = requests.Session()
         self.session.headers.update({"User-Agent": "oei-live-agent/0.1"})
         self.timeout = timeout
         self.sleep = 1.0 / max(0.5, rps)
         self.cache = TTLCache(ttl_sec=ttl)
-
-    def _cached_get(self, path: str, params: Dict[str, Any]) -> Any:
-        key = f"{path}?{urlencode(sorted(params.items()), doseq=True)}"
-        cached = self.cache.get(key)
+        # Course pages are cached column-oriented (see compact.py) rather than as raw JSON dicts
+        self.compact = compact
+        self.pool = ValuePool()
+
+    def _cached_get(self, path: str, params: Dict[str, Any], decode: Optional[Callable[[requests.Response], Any]] = None,
+                    variant: str = "", revalidate: bool = False, compact: bool = True) -> Any:
+        """GET with TTL cache and conditional revalidation.
+
+        Entries younger than the TTL are served without a request unless
+        `revalidate` is set; older ones are revalidated with If-None-Match.
+        `decode` replaces resp.json() (the response is then streamed); `variant`
+        keeps differently decoded copies of the same URL apart in the cache.
+        `compact=False` caches the decoded value as is, even with `self.compact`.
+        """
+        key = f"{path}?{urlencode(sorted(params.items()), doseq=True)}{variant}"
+        if not revalidate:
+            fresh = self.cache.get(key)
+            if fresh:
+                return fresh[0]
+        cached = self.cache.get(key, allow_stale=True)
         headers: Dict[str, str] = {}
         if cached:
             _, meta = cached
@@ -61,30 +73,84 @@ class CourseAPIClient:
                 headers["If-None-Match"] = meta["etag"]
             if meta.get("last_modified"):
                 headers["If-Modified-Since"] = meta["last_modified"]
+
+        # Under a request deadline, fall back to stale data rather than blowing the budget
+        deadline = current_deadline()
+        timeout = self.timeout
+        if deadline is not None:
+            try:
+                timeout = deadline.timeout(cap=self.timeout, reserve=self.sleep)
+            except DeadlineExceeded:
+                if cached:
+                    return cached[0]
+                raise
         time.sleep(self.sleep)
-        resp = self.session.get(f"{self.BASE}{path}", params=params, headers=headers, timeout=self.timeout)
+        try:
+            resp = self.session.get(f"{self.BASE}{path}", params=params, headers=headers, timeout=timeout, stream=decode is not None)
+        except requests.Timeout as e:
+            if deadline is None:
+                raise
+            if cached:
+                return cached[0]
+            # Lets the request degrade like any other deadline overrun instead of failing outright
+            raise DeadlineExceeded(f"{path} timed out after {timeout:.1f}s under the request deadline") from e
         if resp.status_code == 304 and cached:
+            self.cache.set(key, cached[0], cached[1])
             return cached[0]
         resp.raise_for_status()
         meta = {
             "etag": resp.headers.get("ETag", ""),
             "last_modified": resp.headers.get("Last-Modified", ""),
         }
-        data = resp.json()
+        data = decode(resp) if decode is not None else resp.json()
+        if self.compact and compact:
+            data = compact_page(data, self.pool)
         self.cache.set(key, data, meta)
         return data
 
-    def get_courses_page(self, page: int = 1, location_id: Optional[int] = None) -> Dict[str, Any]:
+    def get_courses_page(self, page: int = 1, location_id: Optional[int] = None, revalidate: bool = False) -> Mapping[str, Any]:
+        """One `/api/courses` page.
+
+        With `compact=True` (the default) this is the cached CompactCoursePage, a
+        read-only Mapping rather than a dict; pass it through `compact.plain()`
+        before serializing or mutating it.
+        """
+        loc = self.location_id if location_id is None else int(location_id)
+        return self._cached_get("/api/courses", {"location_ids": loc, "page": page}, revalidate=revalidate)
+
+    def get_courses_page_fields(self, fields: Iterable[str], page: int = 1, location_id: Optional[int] = None) -> Mapping[str, Any]:
+        """Like get_courses_page, but streams the body and keeps only `fields` of each course.
+
+        The projected page is cached as decoded rather than compacted: its few
+        fields gain little from column storage, and its LazyCourse rows (shared
+        by every reader, so read-only) keep `description_plain` computed once.
+        """
         loc = self.location_id if location_id is None else int(location_id)
-        return self._cached_get("/api/courses", {"location_ids": loc, "page": page})
+        wanted = tuple(sorted(set(fields)))
+
+        def decode(resp: requests.Response) -> Dict[str, Any]:
+            resp.raw.decode_content = True  # let urllib3 undo gzip while we stream
+            courses, pagy = select_course_fields(resp.raw, wanted)
+            return {"courses": courses, "pagy": pagy}
+
+        return self._cached_get("/api/courses", {"location_ids": loc, "page": page}, decode=decode,
+                                variant=f"#fields={','.join(wanted)}", compact=False)
 
-    def iter_courses(self, max_pages: int = 1, location_id: Optional[int] = None) -> Generator[Dict[str, Any], None, None]:
+    def iter_courses(self, max_pages: int = 1, location_id: Optional[int] = None, fields: Optional[Iterable[str]] = None) -> Generator[Dict[str, Any], None, None]:
+        """Yields courses page by page.
+
+        With `fields`, pages are stream-parsed and only those fields are kept;
+        `description_plain` is then derived lazily on first access.
+        """
         page = 1
         while page <= max_pages:
-            data = self.get_courses_page(page, location_id=location_id)
+            if fields is not None:
+                data = self.get_courses_page_fields(fields, page, location_id=location_id)
+            else:
+                data = self.get_courses_page(page, location_id=location_id)
             for c in data.get("courses", []):
-                if "description" in c:
-                    c["description_plain"] = strip_html_to_text(c["description"])  # normalize
+                if fields is None and "description" in c:
+                    c["description_plain"] = strip_html_cached(c["description"])  # normalize
                 yield c
             pagy = data.get("pagy") or {}
             nxt = pagy.get("next")
@@ -96,9 +162,15 @@ class CourseAPIClient:
         loc = self.location_id if location_id is None else int(location_id)
         data = self._cached_get(f"/api/courses/{course_id}", {"location_ids[]": loc})
         if isinstance(data, dict) and "description" in data:
-            data["description_plain"] = strip_html_to_text(data["description"])  # normalize
+            data["description_plain"] = strip_html_cached(data["description"])  # normalize
         return data
 
+    def invalidate_course_detail(self, course_id: int, location_id: Optional[int] = None) -> None:
+        """Drops the cached detail of one course, so the next read fetches it again."""
+        loc = self.location_id if location_id is None else int(location_id)
+        key = f"/api/courses/{int(course_id)}?{urlencode([('location_ids[]', loc)], doseq=True)}"
+        self.cache.store.pop(key, None)
+
     def get_placement_tests(self, location_id: Optional[int] = None) -> Dict[str, Any]:
         loc = self.location_id if location_id is None else int(location_id)
         return self._cached_get("/api/courses/placement_tests", {"location_ids": loc})
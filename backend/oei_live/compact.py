@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import json
+import math
+import sys
+import zlib
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from .text import LazyCourse
+
+_MISSING = object()
+_INT_NONE = -(2 ** 63)
+
+# Strings up to SHORT_TEXT chars are interned (city, level, format, dates, prices
+# repeat across courses); strings over LONG_TEXT chars (HTML descriptions) are
+# kept zlib-compressed and only inflated when a row is read.
+SHORT_TEXT = 64
+LONG_TEXT = 256
+
+
+class ValuePool:
+    """Shares equal nested values (university, country, teachers) across all cached pages.
+
+    Shared values are handed out to every row that contained them, so rows read
+    from the cache must be treated as read-only below the top level.
+    """
+
+    def __init__(self, max_items: int = 4096) -> None:
+        self.max_items = max_items
+        self._values: Dict[str, Any] = {}
+
+    def share(self, value: Any) -> Any:
+        key = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+        shared = self._values.get(key)
+        if shared is not None:
+            return shared
+        if len(self._values) < self.max_items:
+            self._values[key] = value
+        return value
+
+    def clear(self) -> None:
+        self._values.clear()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+def _pack(value: Any, pool: ValuePool) -> Any:
+    if isinstance(value, str):
+        if len(value) <= SHORT_TEXT:
+            return sys.intern(value)
+        if len(value) > LONG_TEXT:
+            return zlib.compress(value.encode("utf-8"), 1)
+        return value
+    if isinstance(value, (dict, list)):
+        return pool.share(value)
+    return value
+
+
+def _unpack(value: Any) -> Any:
+    # JSON never yields bytes, so bytes in a column are always compressed text
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode("utf-8")
+    return value
+
+
+def _numeric_kind(values: List[Any]) -> Optional[str]:
+    """'q' if every present value is an int, 'd' if every one is a float, else None."""
+    present = [v for v in values if v is not None and v is not _MISSING]
+    if not present:
+        return None
+    if all(type(v) is int and v != _INT_NONE for v in present):
+        return "q"
+    if all(type(v) is float and not math.isnan(v) for v in present):
+        return "d"
+    return None
+
+
+class CompactCoursePage(Mapping):
+    """Column-oriented copy of one `/api/courses` page.
+
+    Numeric fields are kept in typed arrays, everything else in per-field lists
+    of interned/compressed/shared values. It behaves like the page dict it was
+    built from: `page["courses"]` is a `CourseRows` view of fresh course dicts in
+    the original key order and every other top-level key (`pagy`, ...) is
+    returned as is.
+    It is a read-only Mapping, not a dict: use `to_dict()` (or `plain()`) before
+    JSON-encoding it or handing it to code that mutates it.
+    """
+
+    def __init__(self, page: Dict[str, Any], pool: ValuePool) -> None:
+        courses = page.get("courses") or []
+        self._extra = {k: v for k, v in page.items() if k != "courses"}
+        self._size = len(courses)
+        self._fields: List[str] = []
+        for c in courses:
+            for key in c:
+                if key not in self._fields:
+                    self._fields.append(key)
+        self._columns: Dict[str, Any] = {}
+        self._absent: Dict[str, set] = {}
+        for field in self._fields:
+            values = [c.get(field, _MISSING) for c in courses]
+            absent = {i for i, v in enumerate(values) if v is _MISSING}
+            if absent:
+                self._absent[field] = absent
+            kind = _numeric_kind(values)
+            if kind == "q":
+                self._columns[field] = array("q", (_INT_NONE if v is None or v is _MISSING else v for v in values))
+            elif kind == "d":
+                self._columns[field] = array("d", (math.nan if v is None or v is _MISSING else v for v in values))
+            else:
+                self._columns[field] = [None if v is _MISSING else _pack(v, pool) for v in values]
+
+    def row(self, index: int) -> LazyCourse:
+        course = LazyCourse()
+        for field in self._fields:
+            if index in self._absent.get(field, ()):
+                continue
+            column = self._columns[field]
+            value = column[index]
+            if isinstance(column, array):
+                if (column.typecode == "q" and value == _INT_NONE) or (column.typecode == "d" and math.isnan(value)):
+                    value = None
+            else:
+                value = _unpack(value)
+            course[field] = value
+        return course
+
+    def rows(self) -> List[LazyCourse]:
+        """Every row at once; rebuilds all of them (and inflates their descriptions) on each call."""
+        return [self.row(i) for i in range(self._size)]
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "courses":
+            return CourseRows(self)
+        return self._extra[key]
+
+    def __iter__(self) -> Iterator[str]:
+        yield "courses"
+        yield from self._extra
+
+    def __len__(self) -> int:
+        return 1 + len(self._extra)
+
+    @property
+    def course_count(self) -> int:
+        return self._size
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain (JSON-serializable) page dict with the original key order."""
+        return {"courses": [dict(row) for row in self.rows()], **self._extra}
+
+
+class CourseRows(Sequence):
+    """`page["courses"]` of a CompactCoursePage.
+
+    A row is rebuilt (and its long strings decompressed) when it is first read
+    and then kept for the life of this view, so iterating it again or indexing
+    into it costs nothing extra, and a loop that stops early never builds the
+    rest. Each `page["courses"]` access is a new view with fresh rows; keep the
+    view, not the page, when reading the courses more than once.
+    """
+
+    def __init__(self, page: CompactCoursePage) -> None:
+        self._page = page
+        self._rows: List[Optional[LazyCourse]] = [None] * page.course_count
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self._rows)))]
+        i = range(len(self._rows))[index]  # normalizes negative indexes, raises IndexError
+        row = self._rows[i]
+        if row is None:
+            row = self._rows[i] = self._page.row(i)
+        return row
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (CourseRows, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"CourseRows({len(self._rows)} courses)"
+
+
+def plain(data: Any) -> Any:
+    """`data` as a plain dict if it is a CompactCoursePage, unchanged otherwise."""
+    return data.to_dict() if isinstance(data, CompactCoursePage) else data
+
+
+def compact_page(data: Any, pool: ValuePool) -> Any:
+    """CompactCoursePage for a courses page; any other payload is returned unchanged."""
+    if isinstance(data, dict) and isinstance(data.get("courses"), list) and all(isinstance(c, dict) for c in data["courses"]):
+        return CompactCoursePage(data, pool)
+    return data
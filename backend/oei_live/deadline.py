@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class Deadline:
+    """An absolute point in (monotonic) time that a request must finish by."""
+
+    def __init__(self, budget_sec: float) -> None:
+        self.budget = budget_sec
+        self.expires_at = time.monotonic() + budget_sec
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+    def timeout(self, cap: Optional[float] = None, reserve: float = 0.0) -> float:
+        """Remaining budget minus `reserve`, capped at `cap`. Raises once nothing is left."""
+        left = self.remaining() - reserve
+        if left <= 0:
+            raise DeadlineExceeded(f"deadline of {self.budget:.1f}s exceeded")
+        return min(cap, left) if cap is not None else left
+
+
+_current: ContextVar[Optional[Deadline]] = ContextVar("oei_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+def remaining_time(default: Optional[float] = None) -> Optional[float]:
+    deadline = _current.get()
+    return deadline.remaining() if deadline is not None else default
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    """Makes `deadline` visible to everything called from here, including asyncio.to_thread workers."""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+from collections import Counter
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .locations import ID_TO_CITY, ID_TO_COUNTRY_NAME, LOCATION_CURRENCY_MAPPING
+
+_CEFR_RE = re.compile(r"\b([ABC])([12])(?:\.(\d))?\b", re.IGNORECASE)
+
+# Recurring location questions, in order of how often they come up; answers for
+# the first N are rendered ahead of time from the digest.
+FAQ_INTENTS: Tuple[Tuple[str, re.Pattern], ...] = (
+    ("courses", re.compile(r"\b(what|which|list|all)\b.*\b(courses?|kurse?|kursy|corsi)\b", re.IGNORECASE)),
+    ("levels", re.compile(r"\b(levels?|niveau|poziom|a1|a2|b1|b2|c1|c2)\b", re.IGNORECASE)),
+    ("prices", re.compile(r"\b(price|prices|cost|costs|fee|fees|how much|preis|kosten|cena|ceny|prezzo|ár)\b", re.IGNORECASE)),
+    ("next_start", re.compile(r"\b(next|start|starts|starting|begin|beginn|when)\b", re.IGNORECASE)),
+    ("formats", re.compile(r"\b(online|onsite|on-site|in person|format|formats|hybrid)\b", re.IGNORECASE)),
+    ("free_places", re.compile(r"\b(free places?|places? left|available places?|spots?|seats?|full)\b", re.IGNORECASE)),
+)
+
+
+def level_key(level: str) -> Tuple[str, int, int]:
+    m = _CEFR_RE.search(level or "")
+    if not m:
+        return ("Z", 0, 0)
+    return (m.group(1).upper(), int(m.group(2)), int(m.group(3) or 0))
+
+
+def extract_levels(raw: Any) -> List[str]:
+    """CEFR levels mentioned in a course's `levels` field, e.g. "A1.1 - A1.2" -> ["A1.1", "A1.2"]."""
+    if isinstance(raw, (list, tuple)):
+        raw = " ".join(str(x) for x in raw)
+    levels = []
+    for letter, num, sub in _CEFR_RE.findall(str(raw or "")):
+        levels.append(f"{letter.upper()}{num}" + (f".{sub}" if sub else ""))
+    return levels
+
+
+def parse_price(raw: Any) -> Optional[float]:
+    """Price from text like "€ 450,00", "1.234,56", "1,234.56" or "120.000".
+
+    With both separators the last one is the decimal mark; a lone separator is a
+    thousands separator when it repeats or is followed by exactly three digits.
+    """
+    if isinstance(raw, (int, float)):
+        return float(raw)
+    if not raw:
+        return None
+    text = re.sub(r"[^\d,.]", "", str(raw)).strip(",.")
+    marks = [ch for ch in text if ch in ",."]
+    if marks:
+        last = marks[-1]
+        decimal = text.rsplit(last, 1)[1]
+        if len(set(marks)) == 1 and (len(marks) > 1 or len(decimal) == 3):
+            text = text.replace(last, "")
+        else:
+            text = re.sub(r"[,.]", "", text[:-len(decimal) - 1]) + "." + decimal
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def parse_date(raw: Any) -> Optional[date]:
+    try:
+        return date.fromisoformat(str(raw)[:10])
+    except (TypeError, ValueError):
+        return None
+
+
+def source_hash(courses: Iterable[Dict[str, Any]]) -> str:
+    """Order-independent hash of the raw course summaries a digest is built from."""
+    rows = sorted(json.dumps(c, sort_keys=True, default=str) for c in courses)
+    return hashlib.sha256("\n".join(rows).encode("utf-8")).hexdigest()
+
+
+def _format_price(value: float) -> str:
+    return f"{value:,.0f}" if value == int(value) else f"{value:,.2f}"
+
+
+def build_location_digest(location_id: int, courses: List[Dict[str, Any]], today: Optional[date] = None,
+                          next_starts: int = 5) -> Dict[str, Any]:
+    """Compact per-location catalog summary built from raw course summaries (SUMMARY_FIELDS).
+
+    Levels, formats and prices cover courses that have not finished yet; next
+    starts and free places cover courses that have not started yet.
+    """
+    today = today or date.today()
+    city = ID_TO_CITY.get(int(location_id))
+    country = ID_TO_COUNTRY_NAME.get(int(location_id))
+    currency = LOCATION_CURRENCY_MAPPING.get(country or "")
+
+    levels: set = set()
+    formats: Counter = Counter()
+    prices: List[float] = []
+    upcoming: List[Tuple[date, Dict[str, Any]]] = []
+    free_places = 0
+    for c in courses:
+        start = parse_date(c.get("start_at"))
+        end = parse_date(c.get("finish_at")) or start
+        if end is not None and end < today:
+            continue  # finished courses still listed by the webshop
+        levels.update(extract_levels(c.get("levels")))
+        if c.get("format_text"):
+            formats[c["format_text"]] += 1
+        price = parse_price(c.get("price"))
+        if price:
+            prices.append(price)
+        currency = currency or c.get("currency_symbol") or c.get("currency")
+        if start is not None and start >= today:
+            upcoming.append((start, c))
+            free_places += int(c.get("free_places_count") or 0)
+
+    upcoming.sort(key=lambda item: (item[0], str(item[1].get("title") or "")))
+    return {
+        "location_id": int(location_id),
+        "city": city.name if city else None,
+        "country": country,
+        "currency": currency or "€",
+        "course_count": len(courses),
+        "upcoming_count": len(upcoming),
+        "levels": sorted(levels, key=level_key),
+        "formats": dict(formats.most_common()),
+        "price_range": [min(prices), max(prices)] if prices else None,
+        "free_places_total": free_places,
+        "next_starts": [
+            {
+                "course_id": c.get("id"),
+                "title": c.get("title"),
+                "level": c.get("levels"),
+                "format": c.get("format_text"),
+                "start_date": start.isoformat(),
+                "free_places": c.get("free_places_count"),
+            }
+            for start, c in upcoming[:next_starts]
+        ],
+        "built_for": today.isoformat(),
+    }
+
+
+def materialize_faq_answers(digest: Dict[str, Any], top_n: int = len(FAQ_INTENTS)) -> Dict[str, str]:
+    """Short factual answers for the first `top_n` FAQ intents, rendered from a digest."""
+    where = digest.get("city") or f"location {digest['location_id']}"
+    currency = digest.get("currency") or ""
+    levels = digest.get("levels") or []
+    formats = list((digest.get("formats") or {}).keys())
+    answers: Dict[str, str] = {}
+    for intent, _ in FAQ_INTENTS[:top_n]:
+        if intent == "courses":
+            text = f"{where} currently lists {digest['upcoming_count']} upcoming German course(s)"
+            if levels:
+                text += f" from {levels[0]} to {levels[-1]}"
+            if formats:
+                text += f", offered as {', '.join(formats)}"
+            answers[intent] = text + "."
+        elif intent == "levels":
+            answers[intent] = (f"Levels offered in {where}: {', '.join(levels)}." if levels
+                               else f"No level information is published for {where} right now.")
+        elif intent == "prices":
+            price_range = digest.get("price_range")
+            if not price_range:
+                answers[intent] = f"No prices are published for {where} right now."
+            elif price_range[0] == price_range[1]:
+                answers[intent] = f"Courses in {where} cost {_format_price(price_range[0])} {currency}."
+            else:
+                answers[intent] = (f"Course prices in {where} range from {_format_price(price_range[0])} "
+                                   f"to {_format_price(price_range[1])} {currency}.")
+        elif intent == "next_start":
+            starts = digest.get("next_starts") or []
+            if starts:
+                listed = "; ".join(f"{s['title']} ({s['level']}) on {s['start_date']}" for s in starts)
+                answers[intent] = f"Next course starts in {where}: {listed}."
+            else:
+                answers[intent] = f"There are no upcoming course starts published for {where} right now."
+        elif intent == "formats":
+            answers[intent] = (f"Course formats in {where}: " + ", ".join(f"{f} ({n})" for f, n in digest["formats"].items()) + "."
+                               if formats else f"No format information is published for {where} right now.")
+        elif intent == "free_places":
+            answers[intent] = (f"There are {digest['free_places_total']} free places across "
+                               f"{digest['upcoming_count']} upcoming course(s) in {where}.")
+    return answers
+
+
+def match_faq_intents(text: str) -> List[str]:
+    return [intent for intent, pattern in FAQ_INTENTS if pattern.search(text or "")]
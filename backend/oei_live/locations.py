@@ -52,3 +52,13 @@ for cname, country in COUNTRIES.items():
         ID_TO_COUNTRY_NAME[c.id] = cname
 
 
+# Hardcoded currency mapping based on Supabase analysis
+LOCATION_CURRENCY_MAPPING: Dict[str, str] = {
+    "Bosnia and Herzegovina": "КМ",
+    "Czechia": "Kč",
+    "Hungary": "Ft",
+    "Italy": "€",
+    "Poland": "zł",
+    "Serbia": "RSD",
+    "Slovakia": "€",
+}
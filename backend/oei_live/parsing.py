@@ -22,6 +22,13 @@ CITY_TZ = {
 }
 
 
+# Raw course fields read by normalize_course_summary and the live search filters
+SUMMARY_FIELDS = (
+    "id", "title", "levels", "status", "status_text", "free_places_count", "start_at", "finish_at",
+    "price", "currency_symbol", "currency", "format_text", "target_group_text", "university",
+)
+
+
 def normalize_course_summary(c: Dict[str, Any]) -> Dict[str, Any]:
     return {
         "id": c.get("id"),
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .client import CourseAPIClient
+
+logger = logging.getLogger(__name__)
+
+# Conversation the current tool call belongs to; set by the chat service per request
+current_session: ContextVar[Optional[str]] = ContextVar("oei_session", default=None)
+
+Key = Tuple[int, int]  # (course_id, location_id)
+
+
+class DetailPrefetcher:
+    """
+    Warms course details for search results in the background.
+
+    Results are queued by rank across all sessions (every session's #1 before
+    anyone's #2). A new prefetch for a session cancels its still-queued items.
+    A single worker thread fetches through the shared client, so its
+    rate-limit sleep applies, and `max_per_minute` caps how much of that budget
+    prefetching may take. Fetched details are kept for `ttl` seconds for
+    `take()`.
+    """
+
+    def __init__(self, client: CourseAPIClient, top_n: int = 3, max_per_minute: int = 20,
+                 ttl: float = 300.0, max_items: int = 256) -> None:
+        self.client = client
+        self.top_n = top_n
+        self.max_per_minute = max_per_minute
+        self.ttl = ttl
+        self.max_items = max_items
+        self._queue: List[Tuple[int, int, str, int, Key]] = []
+        self._seq = itertools.count()
+        self._generation: "OrderedDict[str, int]" = OrderedDict()
+        self._ready: "OrderedDict[Key, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: set = set()
+        self._recent_fetches: List[float] = []
+        self._cond = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        self.stats_counts = {"queued": 0, "fetched": 0, "hits": 0, "misses": 0, "wasted": 0, "cancelled": 0, "throttled": 0}
+
+    def prefetch(self, session: Optional[str], items: Iterable[Key]) -> None:
+        session = session or ""
+        with self._cond:
+            generation = self._generation.pop(session, 0) + 1
+            self._generation[session] = generation
+            if len(self._generation) > 4096:
+                self._generation.popitem(last=False)
+            for rank, (course_id, location_id) in enumerate(list(items)[:self.top_n]):
+                key = (int(course_id), int(location_id))
+                if key in self._ready or key in self._inflight:
+                    continue
+                heapq.heappush(self._queue, (rank, next(self._seq), session, generation, key))
+                self.stats_counts["queued"] += 1
+            self._ensure_worker()
+            self._cond.notify()
+
+    def take(self, course_id: int, location_id: int) -> Optional[Dict[str, Any]]:
+        """Returns a prefetched detail (once) and records a hit or miss."""
+        key = (int(course_id), int(location_id))
+        with self._cond:
+            self._expire()
+            entry = self._ready.pop(key, None)
+            self.stats_counts["hits" if entry else "misses"] += 1
+        return entry[1] if entry else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            self._expire()
+            counts = dict(self.stats_counts)
+            counts["pending"] = len(self._queue)
+            counts["ready"] = len(self._ready)
+        lookups = counts["hits"] + counts["misses"]
+        counts["hit_ratio"] = counts["hits"] / lookups if lookups else 0.0
+        return counts
+
+    def discard(self, keys: Iterable[Key]) -> None:
+        """Drops prefetched details that went stale, e.g. after their free places changed."""
+        with self._cond:
+            for course_id, location_id in keys:
+                self._ready.pop((int(course_id), int(location_id)), None)
+
+    def clear(self) -> None:
+        """Drops prefetched details that were not taken yet."""
+        with self._cond:
+            self._ready.clear()
+
+    def _expire(self) -> None:
+        now = time.time()
+        while self._ready:
+            key, (ts, _) = next(iter(self._ready.items()))
+            if now - ts < self.ttl and len(self._ready) <= self.max_items:
+                break
+            self._ready.popitem(last=False)
+            self.stats_counts["wasted"] += 1
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, daemon=True, name="detail-prefetch")
+            self._worker.start()
+
+    def _has_budget(self) -> bool:
+        now = time.time()
+        self._recent_fetches = [t for t in self._recent_fetches if now - t < 60.0]
+        return len(self._recent_fetches) < self.max_per_minute
+
+    def _next_item(self) -> Key:
+        with self._cond:
+            while True:
+                while not self._queue:
+                    self._cond.wait()
+                _, _, session, generation, key = heapq.heappop(self._queue)
+                if self._generation.get(session) != generation:
+                    self.stats_counts["cancelled"] += 1
+                    continue
+                if key in self._ready:
+                    continue
+                if not self._has_budget():
+                    self.stats_counts["throttled"] += 1
+                    continue
+                self._inflight.add(key)
+                self._recent_fetches.append(time.time())
+                return key
+
+    def _run(self) -> None:
+        while True:
+            key = self._next_item()
+            try:
+                data = self.client.get_course_detail(key[0], location_id=key[1])
+            except Exception as e:
+                logger.debug(f"Prefetch of course {key} failed: {e}")
+                data = None
+            with self._cond:
+                self._inflight.discard(key)
+                if data is not None:
+                    self._ready[key] = (time.time(), data)
+                    self.stats_counts["fetched"] += 1
+                    self._expire()
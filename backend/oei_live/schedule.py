@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import re
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+# Monday == 0, matching date.weekday()
+WEEKDAY_NAMES = {
+    "monday": 0, "mon": 0, "montag": 0, "mo": 0,
+    "tuesday": 1, "tue": 1, "tues": 1, "dienstag": 1, "di": 1,
+    "wednesday": 2, "wed": 2, "mittwoch": 2, "mi": 2,
+    "thursday": 3, "thu": 3, "thurs": 3, "donnerstag": 3, "do": 3,
+    "friday": 4, "fri": 4, "freitag": 4, "fr": 4,
+    "saturday": 5, "sat": 5, "samstag": 5, "sa": 5,
+    "sunday": 6, "sun": 6, "sonntag": 6, "so": 6,
+}
+
+# Named parts of the day as [start, end) local minute-of-day
+TIME_WINDOWS = {
+    "morning": (6 * 60, 12 * 60),
+    "midday": (11 * 60, 14 * 60),
+    "afternoon": (12 * 60, 17 * 60),
+    "evening": (17 * 60, 23 * 60),
+}
+TIME_WINDOWS.update({
+    "after work": TIME_WINDOWS["evening"],
+    "night": TIME_WINDOWS["evening"],
+    "lunch": TIME_WINDOWS["midday"],
+    "vormittag": TIME_WINDOWS["morning"],
+    "nachmittag": TIME_WINDOWS["afternoon"],
+    "abend": TIME_WINDOWS["evening"],
+})
+
+_RANGE_RE = re.compile(r"^\s*(\d{1,2}(?::\d{2})?)\s*-\s*(\d{1,2}(?::\d{2})?)\s*$")
+
+
+def parse_weekday(value: Any) -> Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, int) or (isinstance(value, str) and value.strip().isdigit()):
+        # The webshop follows Ruby's wday convention: 0 == Sunday
+        return (int(value) - 1) % 7
+    return WEEKDAY_NAMES.get(str(value).strip().lower().rstrip("."))
+
+
+def _parse_hhmm(value: str) -> int:
+    hours, _, minutes = value.partition(":")
+    return int(hours) * 60 + int(minutes or 0)
+
+
+def parse_time_window(value: Optional[str]) -> Optional[Tuple[int, int]]:
+    """Accepts 'evening', '17:00-21:00' or '17-21'."""
+    if not value:
+        return None
+    key = value.strip().lower()
+    if key in TIME_WINDOWS:
+        return TIME_WINDOWS[key]
+    m = _RANGE_RE.match(key)
+    if not m:
+        raise ValueError(f"Unsupported time window: {value!r}")
+    return _parse_hhmm(m.group(1)), _parse_hhmm(m.group(2))
+
+
+def parse_date(value: Any) -> Optional[date]:
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def local_minute_of_day(value: Any, tz: Optional[str], on_date: Optional[date] = None) -> Optional[int]:
+    """Minute of day in the location's timezone.
+
+    Bare 'HH:MM' values are already local. Timestamps with an offset are
+    shifted into `tz` on the course's start date so DST is taken into account.
+    """
+    if not value:
+        return None
+    text = str(value).strip()
+    if "T" not in text:
+        try:
+            return _parse_hhmm(text[:5])
+        except ValueError:
+            return None
+    try:
+        dt = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is not None and tz:
+        if on_date is not None:
+            dt = datetime.combine(on_date, dt.timetz())
+        dt = dt.astimezone(ZoneInfo(tz))
+    return dt.hour * 60 + dt.minute
+
+
+class ScheduleIndex:
+    """In-memory index over a location's courses for weekday/time-of-day queries.
+
+    Sessions are kept per weekday sorted by local start minute, and courses are
+    kept sorted by start date, so lookups are a few bisects and set intersections.
+    """
+
+    def __init__(self, timezone: Optional[str] = None) -> None:
+        self.timezone = timezone
+        self.courses: Dict[int, Dict[str, Any]] = {}
+        self.sessions: Dict[int, List[Tuple[int, int, int]]] = {d: [] for d in range(7)}
+        self.start_dates: List[Tuple[date, int]] = []
+        # When the weekday/time data of each course was last read from its detail page
+        self.details_fetched_at: Dict[int, float] = {}
+
+    def __len__(self) -> int:
+        return len(self.courses)
+
+    def add(self, course: Dict[str, Any]) -> None:
+        """Adds a course normalized with `normalize_course_detail`."""
+        try:
+            cid = int(course.get("id"))
+        except (TypeError, ValueError):
+            return
+        if cid in self.courses:
+            self.remove(cid)
+        self.courses[cid] = course
+        start = parse_date(course.get("start_date"))
+        if start is not None:
+            insort(self.start_dates, (start, cid))
+        for w in course.get("weekdays") or []:
+            day = parse_weekday(w.get("week_day"))
+            begin = local_minute_of_day(w.get("start_time"), self.timezone, start)
+            if day is None or begin is None:
+                continue
+            end = local_minute_of_day(w.get("finish_time"), self.timezone, start)
+            insort(self.sessions[day], (begin, end if end is not None else begin, cid))
+
+    def remove(self, course_id: int) -> None:
+        if self.courses.pop(course_id, None) is None:
+            return
+        self.details_fetched_at.pop(course_id, None)
+        self.start_dates = [e for e in self.start_dates if e[1] != course_id]
+        for day, entries in self.sessions.items():
+            self.sessions[day] = [e for e in entries if e[2] != course_id]
+
+    def _ids_by_schedule(self, weekdays: Iterable[int], window: Optional[Tuple[int, int]]) -> Set[int]:
+        """Courses with a session on one of `weekdays` starting in [lo, hi)."""
+        lo, hi = window if window else (0, 24 * 60)
+        ids: Set[int] = set()
+        for day in weekdays:
+            entries = self.sessions[day]
+            left = bisect_left(entries, (lo, -1, -1))
+            right = bisect_left(entries, (hi, -1, -1))
+            ids.update(e[2] for e in entries[left:right])
+        return ids
+
+    def _ids_starting_after(self, start_after: date) -> Set[int]:
+        idx = bisect_right(self.start_dates, (start_after, float("inf")))
+        return {cid for _, cid in self.start_dates[idx:]}
+
+    def find(
+        self,
+        weekdays: Optional[Iterable[Any]] = None,
+        time_window: Optional[str] = None,
+        start_after: Optional[Any] = None,
+        level: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        days = {d for d in (parse_weekday(w) for w in (weekdays or [])) if d is not None}
+        window = parse_time_window(time_window)
+        if days or window:
+            ids = self._ids_by_schedule(days or range(7), window)
+        else:
+            ids = set(self.courses)
+        after = parse_date(start_after)
+        if after is not None:
+            ids &= self._ids_starting_after(after)
+        if level:
+            wanted = level.strip().lower()
+            ids = {cid for cid in ids if wanted in str(self.courses[cid].get("level") or "").lower()}
+        results = [self.courses[cid] for cid in ids]
+        return sorted(results, key=lambda c: (str(c.get("start_date") or ""), str(c.get("title") or "")))
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import json
+from typing import IO, Any, Dict, Iterable, List, Tuple
+
+from .text import LazyCourse
+
+try:
+    import ijson
+except ImportError:  # optional: fall back to decoding the whole page
+    ijson = None
+
+_SCALAR_EVENTS = {"null", "boolean", "integer", "double", "number", "string"}
+
+
+def _project(page: Dict[str, Any], fields: Iterable[str]) -> Tuple[List[LazyCourse], Dict[str, Any]]:
+    wanted = set(fields)
+    courses = [LazyCourse((k, v) for k, v in c.items() if k in wanted) for c in page.get("courses", [])]
+    return courses, page.get("pagy") or {}
+
+
+def select_course_fields(stream: IO[bytes], fields: Iterable[str]) -> Tuple[List[LazyCourse], Dict[str, Any]]:
+    """Decodes a courses page incrementally, materializing only `fields` of each course.
+
+    Returns (courses, pagy). ijson still decodes every scalar of the page into a
+    Python object as a parse event, but values of unwanted fields (notably the
+    HTML descriptions) are dropped right away instead of being collected into the
+    page's dicts and lists, so memory peaks at about one value rather than the
+    whole decoded page. Nested wanted values are built as a whole.
+    """
+    if ijson is None:
+        return _project(json.load(stream), fields)
+
+    wanted = set(fields)
+    courses: List[LazyCourse] = []
+    pagy: Dict[str, Any] = {}
+    current: LazyCourse = None
+    builder = None
+    target = ""  # prefix of the value being built
+    key = ""
+
+    for prefix, event, value in ijson.parse(stream, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == target and (event in _SCALAR_EVENTS or event in ("end_map", "end_array")):
+                if current is not None:
+                    current[key] = builder.value
+                else:
+                    pagy = builder.value or {}
+                builder = None
+            continue
+        if prefix == "courses.item":
+            if event == "start_map":
+                current = LazyCourse()
+            elif event == "end_map":
+                courses.append(current)
+                current = None
+            elif event == "map_key" and value in wanted:
+                key, target = value, f"courses.item.{value}"
+                builder = ijson.ObjectBuilder()
+        elif prefix == "" and event == "map_key" and value == "pagy":
+            target = "pagy"
+            builder = ijson.ObjectBuilder()
+    return courses, pagy
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import hashlib
+import re
+from collections import OrderedDict
+from html import unescape
+from threading import Lock
+from typing import Any
+
+_TAG_RE = re.compile(r"<[^>]+>")
+
+_STRIP_MEMO_MAX = 4096
+_strip_memo: "OrderedDict[bytes, str]" = OrderedDict()
+_strip_lock = Lock()
+
+
+def strip_html_to_text(html: str) -> str:
+    text = _TAG_RE.sub(" ", unescape(html or ""))
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def strip_html_cached(html: str) -> str:
+    """strip_html_to_text memoized by a digest of the input; descriptions repeat across pages and polls."""
+    if not html:
+        return ""
+    key = hashlib.blake2b(html.encode("utf-8"), digest_size=16).digest()
+    with _strip_lock:
+        text = _strip_memo.get(key)
+        if text is not None:
+            _strip_memo.move_to_end(key)
+            return text
+    text = strip_html_to_text(html)
+    with _strip_lock:
+        _strip_memo[key] = text
+        if len(_strip_memo) > _STRIP_MEMO_MAX:
+            _strip_memo.popitem(last=False)
+    return text
+
+
+def clear_strip_memo() -> None:
+    with _strip_lock:
+        _strip_memo.clear()
+
+
+class LazyCourse(dict):
+    """Course dict whose `description_plain` is only computed when first read."""
+
+    def __missing__(self, key: str) -> Any:
+        if key == "description_plain" and "description" in self:
+            value = strip_html_cached(self["description"])
+            self[key] = value
+            return value
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
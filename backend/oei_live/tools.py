@@ -1,14 +1,187 @@
 from __future__ import annotations
 
+import contextvars
+import time
 from typing import Any, Dict, List, Optional
 from langchain_core.tools import tool
 
+from .availability import AvailabilityChange
 from .client import CourseAPIClient
-from .parsing import normalize_course_summary, normalize_course_detail
+from .compact import plain
+from .prefetch import DetailPrefetcher, current_session
+from .parsing import SUMMARY_FIELDS, normalize_course_summary, normalize_course_detail
 from .locations import ID_TO_CITY, COUNTRIES, ID_TO_COUNTRY_NAME
+from .deadline import current_deadline, remaining_time
+from .schedule import ScheduleIndex, parse_time_window
+import logging
 import threading
 
+logger = logging.getLogger(__name__)
+
 _client = CourseAPIClient(location_id=8)
+# Warms details for the top search results so a follow-up course_detail_live is instant
+detail_prefetcher = DetailPrefetcher(_client, top_n=3)
+
+
+def prefetch_course_details(courses: List[Dict[str, Any]], location_id: Optional[int] = None) -> None:
+    """Queues detail prefetches for ranked search results (items need an id and a location)."""
+    keys = []
+    for item in courses:
+        cid = item.get("id", item.get("course_id"))
+        loc = item.get("location_id", location_id)
+        if cid is not None and loc is not None:
+            keys.append((cid, loc))
+    if keys:
+        detail_prefetcher.prefetch(current_session.get(), keys)
+
+LIVE_SEARCH_TIMEOUT_SEC = 30.0
+# Below this much remaining request budget the live fan-out is skipped entirely
+LIVE_SEARCH_MIN_BUDGET_SEC = 2.0
+
+SCHEDULE_INDEX_TTL_SEC = 15 * 60
+SCHEDULE_INDEX_MAX_PAGES = 20
+# Detail requests per build (the client is throttled to ~2 rps); courses beyond this are
+# indexed without weekday/time data and fetched by a later rebuild
+SCHEDULE_INDEX_MAX_DETAILS = 40
+# Weekday/time data copied from the previous index is re-read from the detail page after this long
+SCHEDULE_DETAIL_MAX_AGE_SEC = 6 * 3600
+# How long a tool call waits for a first-time index build before answering "not ready yet"
+SCHEDULE_INDEX_WAIT_SEC = 3.0
+_schedule_indexes: Dict[int, Any] = {}
+_schedule_builds: Dict[int, threading.Event] = {}
+_schedule_lock = threading.Lock()
+
+
+def build_schedule_index(
+    location_id: int,
+    max_pages: int = SCHEDULE_INDEX_MAX_PAGES,
+    previous: Optional[ScheduleIndex] = None,
+    max_details: int = SCHEDULE_INDEX_MAX_DETAILS,
+) -> ScheduleIndex:
+    """Builds a ScheduleIndex for one location from the live catalog.
+
+    List pages are used as they are when they carry `course_weekdays`. Otherwise the
+    weekday/time data comes from `previous` if the course's dates did not change and
+    it is younger than SCHEDULE_DETAIL_MAX_AGE_SEC, so a rebuild only requests details
+    of new or changed courses, at most `max_details` of them (soonest start first).
+    """
+    city = ID_TO_CITY.get(int(location_id))
+    index = ScheduleIndex(timezone=city.timezone if city else None)
+    now = time.time()
+    missing: List[Dict[str, Any]] = []
+    reused = 0
+
+    def add(raw: Dict[str, Any], fetched_at: Optional[float] = None, schedule_from: Optional[Dict[str, Any]] = None) -> None:
+        detail = normalize_course_detail(raw)
+        if schedule_from is not None:
+            for field in ("weekdays", "teachers", "description", "lesson_duration", "frequency", "times_of_day"):
+                detail[field] = schedule_from.get(field)
+        if city:
+            detail["timezone"] = city.timezone
+        detail["location_id"] = int(location_id)
+        index.add(detail)
+        if fetched_at is not None and detail.get("id") is not None:
+            index.details_fetched_at[int(detail["id"])] = fetched_at
+
+    for c in _client.iter_courses(max_pages=max_pages, location_id=location_id):
+        if "course_weekdays" in c or c.get("id") is None:
+            add(c)
+            continue
+        cid = int(c["id"])
+        known = previous.courses.get(cid) if previous is not None else None
+        fetched_at = previous.details_fetched_at.get(cid) if previous is not None else None
+        if (known is not None and fetched_at is not None and now - fetched_at < SCHEDULE_DETAIL_MAX_AGE_SEC
+                and (known.get("start_date"), known.get("end_date")) == (c.get("start_at"), c.get("finish_at"))):
+            add(c, fetched_at, schedule_from=known)
+            reused += 1
+        else:
+            missing.append(c)
+
+    missing.sort(key=lambda c: str(c.get("start_at") or "9999"))
+    for c in missing[:max_details]:
+        add(_client.get_course_detail(int(c["id"]), location_id=location_id), time.time())
+    for c in missing[max_details:]:
+        add(c)
+    logger.info(f"Schedule index for location {location_id}: {len(index)} courses, "
+                f"{min(len(missing), max_details)} details fetched, {reused} reused, "
+                f"{max(0, len(missing) - max_details)} deferred")
+    return index
+
+
+def apply_availability_changes(changes: List[AvailabilityChange]) -> None:
+    """Patches free places/status of already indexed courses in place (AvailabilityPoller listener)."""
+    with _schedule_lock:
+        indexes = {loc: entry[1] for loc, entry in _schedule_indexes.items()}
+    for change in changes:
+        index = indexes.get(change.location_id)
+        course = index.courses.get(change.course_id) if index else None
+        if course is None:
+            continue
+        if "free_places_count" in change.changes:
+            course["free_places"] = change.new_value("free_places_count")
+        if "status" in change.changes:
+            course["status"] = change.new_value("status")
+        if "status_text" in change.changes:
+            course["status_text"] = change.new_value("status_text")
+
+
+def evict_changed_details(changes: List[AvailabilityChange]) -> None:
+    """Drops cached and prefetched details of changed courses (AvailabilityPoller listener)."""
+    for change in changes:
+        _client.invalidate_course_detail(change.course_id, location_id=change.location_id)
+    detail_prefetcher.discard((change.course_id, change.location_id) for change in changes)
+
+
+def refresh_schedule_index(location_id: int) -> threading.Event:
+    """Starts a background (re)build of a location's index unless one is already running.
+
+    Detail requests run at the client's throttled rate, so a first build can take
+    a while; the returned event is set when the build finishes.
+    """
+    loc = int(location_id)
+    with _schedule_lock:
+        event = _schedule_builds.get(loc)
+        if event is not None:
+            return event
+        event = _schedule_builds[loc] = threading.Event()
+
+    def run() -> None:
+        try:
+            with _schedule_lock:
+                entry = _schedule_indexes.get(loc)
+            index = build_schedule_index(loc, previous=entry[1] if entry else None)
+            with _schedule_lock:
+                _schedule_indexes[loc] = (time.time(), index)
+        except Exception as e:
+            logger.warning(f"Building the schedule index for location {loc} failed: {e}")
+        finally:
+            with _schedule_lock:
+                _schedule_builds.pop(loc, None)
+            event.set()
+
+    threading.Thread(target=run, daemon=True, name=f"schedule-index-{loc}").start()
+    return event
+
+
+def get_schedule_index(location_id: int, wait: float = SCHEDULE_INDEX_WAIT_SEC) -> Optional[ScheduleIndex]:
+    """Returns the cached index for a location without ever building it on the caller's thread.
+
+    An expired index is still returned while a background rebuild runs; without
+    any index this waits up to `wait` seconds (capped by the request deadline) for
+    the first build and returns None if it is not done by then.
+    """
+    loc = int(location_id)
+    with _schedule_lock:
+        entry = _schedule_indexes.get(loc)
+    if entry and time.time() - entry[0] < SCHEDULE_INDEX_TTL_SEC:
+        return entry[1]
+    event = refresh_schedule_index(loc)
+    if entry:
+        return entry[1]
+    event.wait(max(0.0, min(wait, remaining_time(default=wait))))
+    with _schedule_lock:
+        entry = _schedule_indexes.get(loc)
+    return entry[1] if entry else None
 
 
 @tool("list_locations", return_direct=False)
@@ -30,7 +203,7 @@ def search_courses_live(query: Optional[str] = None, max_pages: int = 1, locatio
     q = (query or "").lower().strip()
     out: List[Dict[str, Any]] = []
     effective_loc = _client.location_id if location_id is None else int(location_id)
-    for c in _client.iter_courses(max_pages=max_pages, location_id=effective_loc):
+    for c in _client.iter_courses(max_pages=max_pages, location_id=effective_loc, fields=SUMMARY_FIELDS):
         hay = " ".join([
             str(c.get("title", "")), str(c.get("levels", "")), str(c.get("status", "")), str(c.get("status_text", ""))
         ]).lower()
@@ -46,6 +219,7 @@ def search_courses_live(query: Optional[str] = None, max_pages: int = 1, locatio
             item["web_url"] = web
             item["link_markdown"] = f"[{item.get('title', 'Course')}]({web})"
         out.append(item)
+    prefetch_course_details(out, effective_loc)
     return out
 
 
@@ -53,7 +227,9 @@ def search_courses_live(query: Optional[str] = None, max_pages: int = 1, locatio
 def course_detail_live(course_id: int, location_id: Optional[int] = None) -> Dict[str, Any]:
     """Fetch a live course detail for a given course_id and location_id."""
     effective_loc = _client.location_id if location_id is None else int(location_id)
-    raw = _client.get_course_detail(int(course_id), location_id=effective_loc)
+    raw = detail_prefetcher.take(int(course_id), effective_loc)
+    if raw is None:
+        raw = _client.get_course_detail(int(course_id), location_id=effective_loc)
     detail = normalize_course_detail(raw)
     try:
         cid = int(detail.get("id")) if detail.get("id") is not None else None
@@ -69,7 +245,8 @@ def course_detail_live(course_id: int, location_id: Optional[int] = None) -> Dic
 @tool("placement_tests_live", return_direct=False)
 def placement_tests_live(location_id: Optional[int] = None) -> Dict[str, Any]:
     """Fetch live placement tests for a given location_id."""
-    return _client.get_placement_tests(location_id=location_id)
+    # Tool output is JSON-encoded for the agent, so no cached Mapping types here
+    return plain(_client.get_placement_tests(location_id=location_id))
 
 
 @tool("parallel_search_courses_live", return_direct=False)
@@ -80,12 +257,19 @@ def parallel_search_courses_live(query: Optional[str] = None, location_ids: Opti
     """
     q = (query or "").lower().strip()
     ids = location_ids or sorted(ID_TO_CITY.keys())
+    deadline = current_deadline()
+    timeout = LIVE_SEARCH_TIMEOUT_SEC
+    if deadline is not None:
+        timeout = min(timeout, deadline.remaining())
+        if timeout < LIVE_SEARCH_MIN_BUDGET_SEC:
+            return {"query": q, "results_by_country": {}, "partial": True, "skipped_location_ids": list(ids)}
     results_lock = threading.Lock()
     grouped: Dict[str, List[Dict[str, Any]]] = {}
+    done: List[int] = []
 
     def work(loc_id: int) -> None:
         items: List[Dict[str, Any]] = []
-        for c in _client.iter_courses(max_pages=max_pages, location_id=loc_id):
+        for c in _client.iter_courses(max_pages=max_pages, location_id=loc_id, fields=SUMMARY_FIELDS):
             hay = " ".join([
                 str(c.get("title", "")), str(c.get("levels", "")), str(c.get("status", "")), str(c.get("status_text", ""))
             ]).lower()
@@ -101,16 +285,69 @@ def parallel_search_courses_live(query: Optional[str] = None, location_ids: Opti
                 item["web_url"] = web
                 item["link_markdown"] = f"[{item.get('title', 'Course')}]({web})"
             items.append(item)
+        for item in items:
+            item["location_id"] = loc_id
         country = ID_TO_COUNTRY_NAME.get(loc_id, "Unknown")
         with results_lock:
             grouped.setdefault(country, []).extend(items)
+            done.append(loc_id)
 
-    threads = [threading.Thread(target=work, args=(loc_id,), daemon=True) for loc_id in ids]
+    # Each thread gets its own copy of the context so the request deadline reaches the client
+    threads = [
+        threading.Thread(target=contextvars.copy_context().run, args=(work, loc_id), daemon=True)
+        for loc_id in ids
+    ]
     for t in threads: t.start()
-    for t in threads: t.join()
+    join_until = time.monotonic() + timeout
+    for t in threads: t.join(max(0.0, join_until - time.monotonic()))
+    # Return whatever finished in time; stragglers keep running and are dropped
+    with results_lock:
+        snapshot = {country: list(items) for country, items in grouped.items()}
+        pending = [loc_id for loc_id in ids if loc_id not in done]
     # Optionally sort by country and title
-    for country, items in grouped.items():
-        grouped[country] = sorted(items, key=lambda x: f"{x.get('location_city','')} {x.get('title','')}")
-    return {"query": q, "results_by_country": grouped}
+    for country, items in snapshot.items():
+        snapshot[country] = sorted(items, key=lambda x: f"{x.get('location_city','')} {x.get('title','')}")
+    # Rank-interleave across locations so every location's best match is warmed first
+    ranked = [items[i] for i in range(max((len(v) for v in snapshot.values()), default=0))
+              for items in snapshot.values() if i < len(items)]
+    prefetch_course_details(ranked)
+    result: Dict[str, Any] = {"query": q, "results_by_country": snapshot}
+    if pending:
+        result["partial"] = True
+        result["skipped_location_ids"] = pending
+    return result
 
 
+
+
+@tool("find_courses_by_schedule", return_direct=False)
+def find_courses_by_schedule(
+    location_id: int,
+    weekdays: Optional[List[str]] = None,
+    time_window: Optional[str] = None,
+    start_after: Optional[str] = None,
+    level: Optional[str] = None,
+) -> Any:
+    """Find courses at a location by weekday (e.g. ["tuesday"]), local time window
+    ("morning", "afternoon", "evening" or "17:00-21:00"), start date after YYYY-MM-DD and level (e.g. "A2").
+    """
+    try:
+        window = parse_time_window(time_window)
+    except ValueError:
+        return (f"Unsupported time_window {time_window!r}. Use morning, midday, afternoon, evening "
+                "or a range like 17:00-21:00.")
+    index = get_schedule_index(location_id)
+    if index is None:
+        return ("The schedule for this location is still being loaded. "
+                "Use retrieve_course_information for now, or try again in a minute.")
+    out: List[Dict[str, Any]] = []
+    for course in index.find(weekdays=weekdays, time_window=time_window if window else None,
+                             start_after=start_after, level=level):
+        item = dict(course)
+        if item.get("id") is not None:
+            web = f"https://servuswebshop.oesterreichinstitut.com/en/courses/{int(location_id)}/{item['id']}"
+            item["web_url"] = web
+            item["link_markdown"] = f"[{item.get('title', 'Course')}]({web})"
+        out.append(item)
+    prefetch_course_details(out, int(location_id))
+    return out
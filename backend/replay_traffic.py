@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Replay captured /chat/message traffic against a backend.
+
+Reads the JSONL files written with CAPTURE_ENABLED=true and re-sends every
+request, keeping the original inter-arrival times (scaled by --speed) and the
+order of turns within each conversation. Run the target backend with
+REPLAY_CAPTURE_FILES pointing at the same files so tools answer with the
+recorded outputs instead of calling Supabase or the webshop.
+
+The agent's model is still called unless the backend also runs with
+REPLAY_STUB_LLM=true, which replays the recorded tool calls with a stub model
+(optionally REPLAY_STUB_LLM_LATENCY_MS per call). Without it every replayed
+turn is a billed OpenAI request and its latency is part of the measurement.
+
+Requests are grouped into conversations by their captured session id (for
+clients that sent none, the backend's stand-in built from the address and the
+first user turn, so separate anonymous conversations stay apart).
+
+    python replay_traffic.py "captures/chat_capture.*.jsonl*" --speed 10
+    python replay_traffic.py "captures/*.jsonl*" --speed max --url http://localhost:8000
+"""
+import argparse
+import glob
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List
+
+import requests
+
+
+def load_records(pattern: str) -> List[Dict[str, Any]]:
+    records = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    if "message" in record:  # requests rejected before the handler carry no payload
+                        records.append(record)
+    return sorted(records, key=lambda r: r["ts"])
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def summarize(name: str, values: List[float]) -> str:
+    return (f"{name:<10} n={len(values):<6} p50={percentile(values, 0.50):8.0f}ms "
+            f"p90={percentile(values, 0.90):8.0f}ms p99={percentile(values, 0.99):8.0f}ms "
+            f"max={max(values, default=0):8.0f}ms")
+
+
+def replay(records: List[Dict[str, Any]], url: str, speed: float, timeout: float) -> None:
+    sessions: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for record in records:
+        sessions[record.get("session") or record["id"]].append(record)
+
+    t0 = records[0]["ts"]
+    started = time.monotonic()
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    lock = threading.Lock()
+
+    def run_session(session: str, turns: List[Dict[str, Any]]) -> None:
+        http = requests.Session()
+        for record in sorted(turns, key=lambda r: (r.get("turn", 0), r["ts"])):
+            # A turn never starts before the previous one in its conversation has finished
+            if speed > 0:
+                delay = started + (record["ts"] - t0) / speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            body = {"message": record["message"], "chat_history": record.get("chat_history", []),
+                    "session_id": record.get("session")}
+            sent = time.perf_counter()
+            try:
+                resp = http.post(f"{url}/chat/message", json=body, headers={"X-Replay-Record": record["id"]}, timeout=timeout)
+                status = str(resp.status_code)
+            except requests.RequestException as e:
+                status = type(e).__name__
+            elapsed = (time.perf_counter() - sent) * 1000.0
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] += 1
+
+    threads = [threading.Thread(target=run_session, args=item, daemon=True) for item in sessions.items()]
+    for t in threads: t.start()
+    for t in threads: t.join()
+
+    wall = time.monotonic() - started
+    print(f"Replayed {len(records)} requests from {len(sessions)} sessions in {wall:.1f}s "
+          f"(recorded span {records[-1]['ts'] - t0:.1f}s)")
+    print(summarize("recorded", [r["duration_ms"] for r in records if "duration_ms" in r]))
+    print(summarize("replayed", latencies))
+    print("status:", dict(statuses))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("captures", help="glob of capture JSONL files")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--speed", default="1", help="time compression factor (1, 10, ...) or 'max'")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    records = load_records(args.captures)
+    if not records:
+        raise SystemExit(f"No captured requests found in {args.captures}")
+    speed = 0.0 if args.speed == "max" else float(args.speed)
+    replay(records, args.url.rstrip("/"), speed, args.timeout)
+
+
+if __name__ == "__main__":
+    main()
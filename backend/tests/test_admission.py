@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.api import chat as chat_api
+from app.core.admission import PRIORITY_BATCH, PRIORITY_HIGH, PRIORITY_NORMAL, AdmissionController, AdmissionRejected, hold_slot_until
+from app.core.config import settings
+from app.models.schemas import ChatRequest
+
+
+def _http_request(peer: str, forwarded: str = "") -> Request:
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "method": "POST", "path": "/chat/message", "headers": headers, "client": (peer, 1234)})
+
+
+def test_forwarded_for_is_ignored_without_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(settings, "trusted_proxy_hops", 0)
+    assert chat_api._client_ip(_http_request("10.0.0.5", "1.2.3.4")) == "10.0.0.5"
+
+
+def test_rightmost_trusted_hop_is_used(monkeypatch):
+    monkeypatch.setattr(settings, "trusted_proxy_hops", 1)
+    # The client prepended a forged entry; the proxy appended the real address
+    assert chat_api._client_ip(_http_request("10.0.0.1", "6.6.6.6, 203.0.113.9")) == "203.0.113.9"
+    assert chat_api._client_ip(_http_request("10.0.0.1")) == "10.0.0.1"
+
+
+def test_session_bucket_applies_on_top_of_ip_bucket(monkeypatch):
+    monkeypatch.setattr(settings, "trusted_proxy_hops", 0)
+    request = ChatRequest(message="hi", session_id="abc")
+    assert chat_api._client_keys(request, _http_request("10.0.0.5")) == ["ip:10.0.0.5", "session:abc"]
+
+
+def test_rotating_session_ids_do_not_escape_the_ip_limit():
+    async def run():
+        admission = AdmissionController(client_rate=0.001, client_burst=2)
+        for i in range(2):
+            async with admission.admit(["ip:1.2.3.4", f"session:{i}"]):
+                pass
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire(["ip:1.2.3.4", "session:fresh"])
+        assert rejected.value.status_code == 429
+        # The rejected request did not use up the fresh session's allowance
+        assert admission._buckets["session:fresh"].tokens == 2
+        assert admission.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_waiters_are_granted_by_priority_then_arrival():
+    async def run():
+        admission = AdmissionController(max_in_flight=1, max_queue=10, client_rate=100, client_burst=100)
+        await admission.acquire("holder")
+        granted = []
+
+        async def wait(name, priority):
+            await admission.acquire(name, priority)
+            granted.append(name)
+
+        tasks = []
+        for name, priority in (("normal-1", PRIORITY_NORMAL), ("batch", PRIORITY_BATCH),
+                               ("faq", PRIORITY_HIGH), ("normal-2", PRIORITY_NORMAL)):
+            tasks.append(asyncio.create_task(wait(name, priority)))
+            await asyncio.sleep(0)
+        assert admission.queue_depth == 4
+
+        for _ in range(4):
+            admission.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        assert granted == ["faq", "normal-1", "normal-2", "batch"]
+        assert admission.in_flight == 1  # the last waiter still holds its slot
+
+    asyncio.run(run())
+
+
+def test_full_queue_is_a_503_with_retry_after(monkeypatch):
+    async def run():
+        admission = AdmissionController(max_in_flight=1, max_queue=0)
+        monkeypatch.setattr(chat_api, "admission", admission)
+        await admission.acquire("someone-else")
+        with pytest.raises(HTTPException) as rejected:
+            await chat_api.send_message(ChatRequest(message="hi"), _http_request("10.0.0.5"))
+        assert rejected.value.status_code == 503
+        assert int(rejected.value.headers["Retry-After"]) >= 1
+        assert admission.in_flight == 1
+
+    monkeypatch.setattr(settings, "trusted_proxy_hops", 0)
+    asyncio.run(run())
+
+
+def test_queue_wait_times_out_and_leaves_no_waiter():
+    async def run():
+        admission = AdmissionController(max_in_flight=1, max_queue=5)
+        await admission.acquire("holder")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire("late", queue_timeout=0.05)
+        assert rejected.value.status_code == 503 and rejected.value.retry_after >= 1
+        assert admission.queue_depth == 0
+
+        # Releasing skips the abandoned waiter and frees the slot
+        admission.release()
+        assert admission.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_held_slot_is_released_when_the_work_finishes():
+    async def run():
+        admission = AdmissionController(max_in_flight=1, max_queue=5)
+        work = asyncio.get_running_loop().create_future()
+        async with admission.admit("first"):
+            hold_slot_until(work)
+        # The request returned, but its work is still running, so the slot stays taken
+        assert admission.in_flight == 1
+
+        second = asyncio.create_task(admission.acquire("second"))
+        await asyncio.sleep(0.01)
+        assert not second.done()
+
+        work.set_result(None)
+        await asyncio.wait_for(second, 1)
+        assert admission.in_flight == 1  # handed over to the waiter, not freed and re-taken
+        admission.release()
+        assert admission.in_flight == 0
+
+    asyncio.run(run())
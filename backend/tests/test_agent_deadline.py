@@ -0,0 +1,159 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional
+
+import requests
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import tool
+
+from app.core.admission import AdmissionController
+from app.services.agent_pool import AgentPool
+from app.services.chat_service import ChatService
+from oei_live import tools as live_tools
+from oei_live.client import CourseAPIClient
+from oei_live.deadline import Deadline
+
+tool_calls: List[float] = []
+finished = threading.Event()
+
+
+@tool("slow_lookup")
+def slow_lookup(query: str) -> str:
+    """Looks something up, slowly."""
+    tool_calls.append(time.monotonic())
+    time.sleep(0.2)
+    return "nothing found"
+
+
+class SlowChat(BaseChatModel):
+    """Stub model with injected latency: asks for slow_lookup once, then answers."""
+
+    latency: float = 0.3
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-stub"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "SlowChat":
+        return self
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                  **kwargs: Any) -> ChatResult:
+        try:
+            time.sleep(self.latency)
+            if any(isinstance(m, ToolMessage) for m in messages):
+                message = AIMessage(content="done")
+            else:
+                message = AIMessage(content="", tool_calls=[{"name": "slow_lookup", "args": {"query": "x"}, "id": "1"}])
+            return ChatResult(generations=[ChatGeneration(message=message)])
+        finally:
+            finished.set()
+
+
+def _service(latency: float) -> ChatService:
+    service = ChatService()
+    service.agent_pool = AgentPool(SlowChat(latency=latency), [slow_lookup])
+    return service
+
+
+def test_timed_out_agent_winds_down_and_holds_its_slot():
+    tool_calls.clear()
+    finished.clear()
+    service = _service(latency=0.4)
+
+    async def run():
+        admission = AdmissionController(max_in_flight=1)
+        started = time.monotonic()
+        async with admission.admit("ip:test"):
+            response = await service.get_response("hi", [], deadline=Deadline(0.2))
+        returned = time.monotonic() - started
+        # The request gave up on time, but the thread still counts against capacity
+        assert response["degraded"] and returned < 0.35
+        assert admission.in_flight == 1
+        await asyncio.wait_for(asyncio.to_thread(finished.wait), 2)
+        await asyncio.sleep(0.1)
+        assert admission.in_flight == 0
+
+    asyncio.run(run())
+    # The run stopped at its next tool call instead of carrying on after the deadline
+    assert tool_calls == []
+
+
+def test_agent_finishes_within_budget():
+    tool_calls.clear()
+    service = _service(latency=0.01)
+    response = asyncio.run(service.get_response("hi", [], deadline=Deadline(2.0)))
+    assert response["message"] == "done"
+    assert len(tool_calls) == 1
+
+
+class RecordingExecutor:
+    def __init__(self):
+        self.calls = []
+
+    def model_copy(self, update=None):
+        return self
+
+    def invoke(self, inputs, config=None):
+        self.calls.append(inputs)
+        return {"output": "late"}
+
+
+def test_run_queued_past_its_deadline_never_starts():
+    service = ChatService()
+    service._agent_threads = ThreadPoolExecutor(max_workers=1)
+    busy = service._agent_threads.submit(time.sleep, 0.3)
+    executor = RecordingExecutor()
+
+    async def run():
+        try:
+            await service._run_agent(executor, {"input": "hi"}, [], Deadline(0.1))
+        except asyncio.TimeoutError:
+            return "timeout"
+
+    assert asyncio.run(run()) == "timeout"
+    busy.result()
+    service._agent_threads.shutdown(wait=True)
+    assert executor.calls == []
+
+
+class DetailChat(BaseChatModel):
+    """Stub model that looks up one course detail and then answers."""
+
+    @property
+    def _llm_type(self) -> str:
+        return "detail-stub"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "DetailChat":
+        return self
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                  **kwargs: Any) -> ChatResult:
+        if any(isinstance(m, ToolMessage) for m in messages):
+            message = AIMessage(content="done")
+        else:
+            message = AIMessage(content="", tool_calls=[
+                {"name": "course_detail_live", "args": {"course_id": 4242, "location_id": 8}, "id": "1"}])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class TimingOutSession:
+    def get(self, url, params=None, headers=None, timeout=None, stream=False):
+        time.sleep(min(timeout or 0, 0.05))
+        raise requests.Timeout("read timed out")
+
+
+def test_cold_cache_upstream_timeout_degrades(monkeypatch):
+    client = CourseAPIClient(rps=1000)
+    client.session = TimingOutSession()
+    monkeypatch.setattr(live_tools, "_client", client)
+    service = ChatService()
+    service.agent_pool = AgentPool(DetailChat(), service._create_tools())
+
+    response = asyncio.run(service.get_response("Tell me about course 4242", [], deadline=Deadline(2.0)))
+
+    assert response["degraded"]
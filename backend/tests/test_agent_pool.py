@@ -0,0 +1,73 @@
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from app.core.metrics import metrics
+from app.services.agent_pool import AgentPool
+from app.services.prompts import conversation_key, pool_size
+
+
+class PrefixCachingChat(BaseChatModel):
+    """Stub model that reports a provider-style prompt cache hit for any system prompt it has seen before."""
+
+    seen: set = set()
+
+    @property
+    def _llm_type(self) -> str:
+        return "prefix-caching-stub"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "PrefixCachingChat":
+        return self
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        system = str(messages[0].content)
+        prefix_tokens = len(system) // 4
+        prompt_tokens = prefix_tokens + sum(len(str(m.content)) // 4 + 1 for m in messages[1:])
+        cached = prefix_tokens if system in self.seen else 0
+        self.seen.add(system)
+        message = AIMessage(content="ok", usage_metadata={
+            "input_tokens": prompt_tokens, "output_tokens": 1, "total_tokens": prompt_tokens + 1,
+            "input_token_details": {"cache_read": cached},
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def _chat(pool: AgentPool, turns: List[str]) -> None:
+    history = []
+    for turn in turns:
+        executor, stats = pool.get(*conversation_key(turn, history))
+        executor.invoke({"input": turn, "chat_history": []}, config={"callbacks": [stats]})
+        history += [{"role": "user", "content": turn}, {"role": "assistant", "content": "ok"}]
+
+
+def test_pooled_prompts_are_served_from_the_prompt_cache():
+    pool = AgentPool(PrefixCachingChat(seen=set()), tools=[])
+    conversations = [
+        ["Hi!", "I want to learn German in Vienna", "Evening A2 course please"],
+        ["Hello, I live in Brno and want to learn German", "Something in the morning"],
+        ["I'd like a B1 course", "online would be fine"],
+        ["Hi!", "What does the placement test cost?"],
+    ] * 5
+    for turns in conversations:
+        _chat(pool, turns)
+
+    labels = {"language": "en", "use_case": "course_finder"}
+    prompt = metrics.counter("llm_prompt_tokens", **labels)
+    cached = metrics.counter("llm_cached_prompt_tokens", **labels)
+    assert prompt and cached / prompt > 0.8
+    assert metrics.snapshot()["gauges"]["llm_prompt_cache_ratio{language=en,use_case=course_finder}"] == cached / prompt
+    # Only the handful of keys actually used were built, and all of them fit in the pool
+    assert len(pool.keys()) <= 4 <= pool.max_size == pool_size()
+
+
+def test_use_case_locks_on_first_clear_signal():
+    history = [{"role": "user", "content": "Hi!"}, {"role": "assistant", "content": "Hello!"}]
+    assert conversation_key("Hi!") == ("default", "general")
+    assert conversation_key("Hallo, ich möchte Deutsch lernen")[1] == "course_finder"
+    assert conversation_key("I want to learn German", history)[1] == "course_finder"
+    locked = history + [{"role": "user", "content": "Is there an evening course?"}]
+    assert conversation_key("How do I get a refund?", locked)[1] == "course_finder"
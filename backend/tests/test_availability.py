@@ -0,0 +1,143 @@
+import time
+
+from app.services.availability_sync import DocumentsPatcher
+from oei_live import tools as live_tools
+from oei_live.availability import AvailabilityChange, AvailabilityPoller
+from oei_live.client import CourseAPIClient
+from oei_live.prefetch import DetailPrefetcher
+
+
+class PagedClient:
+    """Serves one page per location; `pages[loc]` is handed back as is, like a 304 does."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = []
+
+    def get_courses_page(self, page, location_id=None, revalidate=False):
+        self.calls.append((location_id, page, revalidate))
+        return self.pages[location_id]
+
+
+def _page(*courses):
+    return {"courses": [dict(c) for c in courses], "pagy": {"next": None}}
+
+
+def _course(cid, free, status="open"):
+    return {"id": cid, "free_places_count": free, "status": status, "status_text": "Open", "title": "German"}
+
+
+def test_diff_reports_changed_fields_only_for_known_courses():
+    previous = {1: {"free_places_count": 3, "status": "open"}, 2: {"free_places_count": 1, "status": "open"}}
+    current = {1: {"free_places_count": 2, "status": "open"}, 2: {"free_places_count": 1, "status": "open"},
+               3: {"free_places_count": 9, "status": "open"}}
+    changes = AvailabilityPoller._diff(8, previous, current)
+    assert changes == [AvailabilityChange(8, 1, {"free_places_count": (3, 2)})]
+
+
+def test_first_poll_is_a_baseline_then_changes_are_emitted():
+    client = PagedClient({8: _page(_course(1, 3))})
+    poller = AvailabilityPoller(client, [8])
+    seen = []
+    poller.subscribe(seen.append)
+
+    assert poller.poll_location(8) == []
+    client.pages[8] = _page(_course(1, 2, status="full"))
+    changes = poller.poll_location(8)
+
+    assert changes[0].changes == {"free_places_count": (3, 2), "status": ("open", "full")}
+    assert seen == [changes]
+    assert all(revalidate for _, _, revalidate in client.calls)
+
+
+def test_unchanged_page_object_is_not_diffed():
+    page = _page(_course(1, 3))
+    client = PagedClient({8: page})
+    poller = AvailabilityPoller(client, [8])
+    poller.poll_location(8)
+    # Same object as last time (a 304 from the client cache), even if mutated behind our back
+    page["courses"][0]["free_places_count"] = 0
+    assert poller._fetch_summaries(8) is None
+    assert poller.poll_location(8) == []
+
+
+def test_interval_halves_after_changes_and_grows_when_quiet():
+    client = PagedClient({8: _page(_course(1, 3))})
+    poller = AvailabilityPoller(client, [8], min_interval=10.0, max_interval=100.0)
+    poller.intervals[8] = 40.0
+    poller.poll_location(8)  # baseline, quiet
+    assert poller.intervals[8] == 60.0
+    client.pages[8] = _page(_course(1, 2))
+    poller.poll_location(8)
+    assert poller.intervals[8] == 30.0
+    for _ in range(10):
+        client.pages[8] = _page(_course(1, client.pages[8]["courses"][0]["free_places_count"] - 1))
+        poller.poll_location(8)
+    assert poller.intervals[8] == 10.0
+    for _ in range(10):
+        poller.poll_location(8)
+    assert poller.intervals[8] == 100.0
+    assert poller.next_due[8] > time.monotonic() + 90
+
+
+class FakeTable:
+    def __init__(self, db):
+        self.db, self.filters, self.update_values = db, {}, None
+
+    def select(self, *_):
+        return self
+
+    def eq(self, field, value):
+        self.filters[field] = value
+        return self
+
+    def update(self, values):
+        self.update_values = values
+        return self
+
+    def execute(self):
+        rows = [r for r in self.db.rows if all(r.get(k) == v for k, v in self.filters.items())]
+        if self.update_values is not None:
+            for row in rows:
+                row.update(self.update_values)
+                self.db.updates.append(row["id"])
+        return type("Result", (), {"data": [dict(r) for r in rows]})
+
+
+class FakeSupabase:
+    def __init__(self, rows):
+        self.rows, self.updates = rows, []
+
+    def table(self, name):
+        return FakeTable(self)
+
+
+def test_documents_patcher_updates_live_rows_in_place():
+    db = FakeSupabase([
+        {"id": 1, "source_type": "live", "course_id": 5, "location_id": 8, "course_status": "open",
+         "metadata": {"free_places": 3, "title": "German A1"}},
+        {"id": 2, "source_type": "static", "course_id": 5, "location_id": 8, "metadata": {}},
+        {"id": 3, "source_type": "live", "course_id": 5, "location_id": 6, "metadata": {"free_places": 3}},
+    ])
+    DocumentsPatcher(db)([AvailabilityChange(8, 5, {"free_places_count": (3, 0), "status": ("open", "full")})])
+
+    assert db.updates == [1]
+    assert db.rows[0]["metadata"] == {"free_places": 0, "status": "full", "title": "German A1"}
+    assert db.rows[0]["course_status"] == "full"
+    assert db.rows[2]["metadata"] == {"free_places": 3}
+
+
+def test_changed_courses_are_evicted_from_detail_caches(monkeypatch):
+    client = CourseAPIClient()
+    client.cache.set("/api/courses/5?location_ids%5B%5D=8", {"id": 5, "free_places_count": 3}, {})
+    client.cache.set("/api/courses/6?location_ids%5B%5D=8", {"id": 6}, {})
+    prefetcher = DetailPrefetcher(client)
+    prefetcher._ready[(5, 8)] = (time.time(), {"id": 5})
+    prefetcher._ready[(6, 8)] = (time.time(), {"id": 6})
+    monkeypatch.setattr(live_tools, "_client", client)
+    monkeypatch.setattr(live_tools, "detail_prefetcher", prefetcher)
+
+    live_tools.evict_changed_details([AvailabilityChange(8, 5, {"free_places_count": (3, 2)})])
+
+    assert list(client.cache.store) == ["/api/courses/6?location_ids%5B%5D=8"]
+    assert list(prefetcher._ready) == [(6, 8)]
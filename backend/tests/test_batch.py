@@ -0,0 +1,149 @@
+import asyncio
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from app.core.admission import AdmissionController, PRIORITY_BATCH
+from app.services.agent_pool import AgentPool
+from app.services.chat_service import ChatService
+
+EMBED_LATENCY = 0.05  # one round trip, whatever the batch size
+SEARCH_LATENCY = 0.005
+LLM_LATENCY = 0.002
+
+
+class StubEmbeddings:
+    def __init__(self):
+        self.calls = 0
+
+    def embed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        time.sleep(EMBED_LATENCY)
+        return [1.0, 0.0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        time.sleep(EMBED_LATENCY)
+        return [[1.0, 0.0] for _ in texts]
+
+
+class StubRetrieval:
+    def __init__(self):
+        self.embeddings = StubEmbeddings()
+        self.ranked: List[str] = []
+        self.searched: List[str] = []
+
+    def fetch_candidates(self, vector: List[float]) -> list:
+        time.sleep(SEARCH_LATENCY)
+        return []
+
+    def rank(self, query: str, vector: List[float], candidates: list) -> list:
+        self.ranked.append(query)
+        return []
+
+    def search(self, query: str) -> list:
+        self.searched.append(query)
+        return self.rank(query, self.embeddings.embed_query(query), self.fetch_candidates([]))
+
+    multi_search = search
+
+
+class RetrievingChat(BaseChatModel):
+    """Searches once (for the message, or a rewrite of it) and then answers."""
+
+    rewrite: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "retrieving-stub"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "RetrievingChat":
+        return self
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                  **kwargs: Any) -> ChatResult:
+        time.sleep(LLM_LATENCY)
+        if any(isinstance(m, ToolMessage) for m in messages):
+            message = AIMessage(content="done")
+        else:
+            question = [m for m in messages if isinstance(m, HumanMessage)][-1].content
+            query = f"courses for: {question}" if self.rewrite else question
+            message = AIMessage(content="", tool_calls=[
+                {"name": "retrieve_course_information", "args": {"query": query}, "id": "1"}])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def _service(rewrite: bool = False) -> ChatService:
+    service = ChatService()
+    service.retrieval = StubRetrieval()
+    service.agent_pool = AgentPool(RetrievingChat(rewrite=rewrite), service._create_tools())
+    return service
+
+
+def _items(n: int) -> List[dict]:
+    return [{"id": str(i), "message": f"Is there an evening A{i % 2 + 1} course in city {i}?"} for i in range(n)]
+
+
+async def _collect(service: ChatService, items: List[dict], **kwargs) -> List[dict]:
+    return [result async for result in service.get_responses_batch(items, max_workers=8, **kwargs)]
+
+
+def test_batch_throughput_for_500_questions():
+    items = _items(500)
+
+    # Baseline: the same 500 questions as independent requests, 8 at a time
+    baseline = _service()
+
+    async def one_by_one():
+        semaphore = asyncio.Semaphore(8)
+
+        async def one(item):
+            async with semaphore:
+                return await baseline.get_response(item["message"], [])
+
+        return await asyncio.gather(*(one(item) for item in items))
+
+    started = time.perf_counter()
+    asyncio.run(one_by_one())
+    baseline_sec = time.perf_counter() - started
+
+    service = _service()
+    started = time.perf_counter()
+    results = asyncio.run(_collect(service, items))
+    batch_sec = time.perf_counter() - started
+
+    print(f"500 questions: {500 / baseline_sec:.0f} q/s one by one ({baseline.retrieval.embeddings.calls} embedding "
+          f"calls), {500 / batch_sec:.0f} q/s batched ({service.retrieval.embeddings.calls} embedding call)")
+    assert sorted(r["index"] for r in results) == list(range(500))
+    assert all(r["success"] for r in results)
+    assert service.retrieval.embeddings.calls == 1 and service.retrieval.searched == []
+    assert baseline.retrieval.embeddings.calls == 500
+    assert batch_sec < baseline_sec
+
+
+def test_rewritten_query_does_not_use_prefetched_candidates():
+    service = _service(rewrite=True)
+    results = asyncio.run(_collect(service, _items(3)))
+    assert all(r["success"] for r in results)
+    assert sorted(service.retrieval.searched) == sorted(f"courses for: {item['message']}" for item in _items(3))
+
+
+def test_batch_items_take_admission_slots():
+    service = _service()
+    admission = AdmissionController(max_in_flight=2, client_rate=0.0, client_burst=0.0)
+    peak = []
+
+    async def run():
+        def slot():
+            peak.append(admission.in_flight)
+            return admission.admit((), PRIORITY_BATCH, 5.0)
+        results = await _collect(service, _items(10), slot=slot)
+        return results
+
+    results = asyncio.run(run())
+    # No token bucket applies (rate 0 would reject every keyed request), only the concurrency limit
+    assert all(r["success"] for r in results)
+    assert max(peak) <= 2 and admission.in_flight == 0
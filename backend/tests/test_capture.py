@@ -0,0 +1,102 @@
+import json
+import logging.handlers
+import os
+
+import pytest
+from langchain_core.messages import HumanMessage
+from langchain_core.tools import tool
+from starlette.requests import Request
+
+from app.api import chat as chat_api
+from app.core import capture
+from app.core.config import settings
+from app.models.schemas import ChatRequest
+from app.services.agent_pool import AgentPool
+from app.services.chat_service import _replayable
+from app.services.prompts import USE_CASE_GENERAL
+from app.services.replay_llm import REPLAYED_ANSWER, ReplayChatModel
+
+
+def _http_request() -> Request:
+    return Request({"type": "http", "method": "POST", "path": "/chat/message", "headers": [], "client": ("10.0.0.5", 1)})
+
+
+def test_capture_stays_off_without_salt(monkeypatch):
+    monkeypatch.setattr(settings, "capture_enabled", True)
+    monkeypatch.setattr(settings, "capture_salt", "")
+    assert not capture.capture_active()
+    with pytest.raises(RuntimeError):
+        capture.pseudonym("10.0.0.5")
+
+    monkeypatch.setattr(settings, "capture_salt", "s3cret")
+    assert capture.capture_active()
+    assert capture.pseudonym("10.0.0.5") != capture.pseudonym("10.0.0.6")
+
+
+def test_replayed_requests_skip_the_client_rate_limit(monkeypatch):
+    monkeypatch.setattr(settings, "trusted_proxy_hops", 0)
+    request = ChatRequest(message="hi", session_id="abc")
+    assert chat_api._rate_limit_keys(request, _http_request()) == ["ip:10.0.0.5", "session:abc"]
+
+    token = capture._replay_steps.set([])
+    try:
+        assert chat_api._rate_limit_keys(request, _http_request()) == []
+    finally:
+        capture._replay_steps.reset(token)
+
+
+def test_anonymous_conversations_from_one_address_stay_apart(monkeypatch):
+    monkeypatch.setattr(settings, "capture_salt", "s3cret")
+    monkeypatch.setattr(settings, "trusted_proxy_hops", 0)
+
+    def captured_session(message, history=()):
+        request = ChatRequest(message=message, chat_history=list(history))
+        token = capture._current_record.set({"id": "r", "client": capture.pseudonym("10.0.0.5"), "tool_calls": []})
+        try:
+            capture.record_request(message, [], chat_api._session_id(request, _http_request()))
+            return capture._current_record.get()["session"]
+        finally:
+            capture._current_record.reset(token)
+
+    first = captured_session("Do you have B1 courses?")
+    follow_up = captured_session("And in the evening?", [{"role": "user", "content": "Do you have B1 courses?", "timestamp": "t0"},
+                                                         {"role": "assistant", "content": "Yes.", "timestamp": "t1"}])
+    other = captured_session("How much is A1?")
+    assert first == follow_up != other
+    assert first != capture.pseudonym("10.0.0.5")
+
+
+def test_capture_files_are_per_process_and_written_off_thread(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "capture_dir", str(tmp_path))
+    logger = capture._get_capture_logger()
+    try:
+        assert all(isinstance(h, logging.handlers.QueueHandler) for h in logger.handlers)
+        logger.info(json.dumps({"id": "r1"}))
+    finally:
+        capture.stop_capture()  # flushes the queue
+    assert (tmp_path / f"chat_capture.{os.getpid()}.jsonl").read_text().strip() == '{"id": "r1"}'
+
+
+@tool("course_detail_live")
+def course_detail_live(course_id: int) -> str:
+    """Live course details."""
+    raise AssertionError("replays must not call the webshop")
+
+
+def test_replay_model_reissues_the_recorded_tool_calls():
+    recorded = [
+        {"tool": "course_detail_live", "tool_input": {"course_id": 7}, "output": "B1 evening, 3 places"},
+        {"tool": "course_detail_live", "tool_input": {"course_id": 9}, "output": "A2 morning, full"},
+    ]
+    pool = AgentPool(ReplayChatModel(), [_replayable(course_detail_live)])
+    executor, _ = pool.get("en", USE_CASE_GENERAL)
+    steps_token = capture._replay_steps.set(list(recorded))
+    calls_token = capture._replay_calls.set(recorded)
+    try:
+        result = executor.invoke({"input": "Any B1 courses?", "chat_history": [HumanMessage(content="hello")]})
+    finally:
+        capture._replay_steps.reset(steps_token)
+        capture._replay_calls.reset(calls_token)
+    assert result["output"] == REPLAYED_ANSWER
+    assert [(a.tool_input, obs) for a, obs in result["intermediate_steps"]] == [
+        ({"course_id": 7}, "B1 evening, 3 places"), ({"course_id": 9}, "A2 morning, full")]
@@ -0,0 +1,117 @@
+import pytest
+
+from app.core.config import settings
+from app.services.digest_service import DigestService
+from oei_live.digest import parse_price
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("1.234,56", 1234.56),
+    ("120.000", 120000.0),
+    ("1,234.56", 1234.56),
+    ("€ 450,00", 450.0),
+    ("450.5", 450.5),
+    ("1.234.567", 1234567.0),
+    (390, 390.0),
+    ("", None),
+    ("on request", None),
+])
+def test_parse_price(raw, expected):
+    assert parse_price(raw) == expected
+
+
+class FakeQuery:
+    def __init__(self, db, table):
+        self.db, self.table, self.op, self.filters = db, table, "select", []
+
+    def select(self, *_):
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def insert(self, row):
+        self.op, self.row = "insert", row
+        return self
+
+    def eq(self, field, value):
+        self.filters.append(lambda r: r[field] == value)
+        return self
+
+    def lt(self, field, value):
+        self.filters.append(lambda r: r[field] < value)
+        return self
+
+    def execute(self):
+        self.db.queries.append((self.op, self.table))
+        rows = self.db.rows
+        if self.op == "insert":
+            rows.append(self.row)
+        elif self.op == "delete":
+            self.db.rows = [r for r in rows if not all(f(r) for f in self.filters)]
+        elif self.table.endswith("_latest"):
+            latest = {}
+            for r in rows:
+                if r["location_id"] not in latest or r["version"] > latest[r["location_id"]]["version"]:
+                    latest[r["location_id"]] = r
+            return type("Result", (), {"data": list(latest.values())})
+        return type("Result", (), {"data": []})
+
+
+class FakeSupabase:
+    def __init__(self, rows):
+        self.rows, self.queries = rows, []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+def _row(loc, version):
+    return {"location_id": loc, "version": version, "source_hash": "h", "digest": {}, "faq_answers": {}}
+
+
+def test_load_reads_only_the_latest_view():
+    db = FakeSupabase([_row(8, 1), _row(8, 2), _row(6, 1)])
+    service = DigestService(client=None, supabase_client=db)
+    assert service.get(8)["version"] == 2
+    assert db.queries == [("select", "location_digests_latest")]
+    assert not {6, 8} & set(service.missing())
+
+
+def test_store_prunes_old_versions(monkeypatch):
+    monkeypatch.setattr(settings, "digest_keep_versions", 3)
+    db = FakeSupabase([_row(8, v) for v in range(1, 5)] + [_row(6, 1)])
+    service = DigestService(client=None, supabase_client=db)
+    assert service._store(_row(8, 5))
+    assert sorted(r["version"] for r in db.rows if r["location_id"] == 8) == [3, 4, 5]
+    assert [r["version"] for r in db.rows if r["location_id"] == 6] == [1]
+
+
+class FailingSupabase(FakeSupabase):
+    def __init__(self, rows):
+        super().__init__(rows)
+        self.failing = True
+
+    def table(self, name):
+        self.queries.append(("select", name))
+        if self.failing:
+            raise ConnectionError("supabase down")
+        return FakeQuery(self, name)
+
+
+def test_failed_load_backs_off(monkeypatch):
+    monkeypatch.setattr(settings, "digest_load_retry_sec", 60)
+    now = [1000.0]
+    monkeypatch.setattr("app.services.digest_service.time.monotonic", lambda: now[0])
+    db = FailingSupabase([_row(8, 1)])
+    service = DigestService(client=None, supabase_client=db)
+
+    assert service.get(8) is None
+    assert service.context_for("Warsaw", "prices") is None
+    assert service.missing()
+    assert len(db.queries) == 1  # one failed attempt, not one per call
+
+    db.failing = False
+    now[0] += 61
+    assert service.get(8)["version"] == 1
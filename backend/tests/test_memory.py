@@ -0,0 +1,91 @@
+import json
+
+from app.core import memory
+from app.core.memory import MemoryBudget
+from oei_live.compact import CompactCoursePage, ValuePool, plain
+
+PAGE = {
+    "courses": [
+        {"id": 1, "title": "German A1", "price": 450.0, "description": "<p>" + "x" * 400 + "</p>", "university": {"name": "OEI"}},
+        {"id": 2, "title": "German A2", "price": None, "university": {"name": "OEI"}},
+    ],
+    "pagy": {"next": None},
+}
+
+
+def test_compact_page_converts_to_a_json_serializable_dict():
+    page = CompactCoursePage(PAGE, ValuePool())
+    assert not isinstance(page, dict)
+    assert page.to_dict() == PAGE
+    assert json.loads(json.dumps(plain(page))) == PAGE
+    assert plain(PAGE) is PAGE
+
+
+def test_budget_ignores_rss_and_drops_largest_caches_first(monkeypatch):
+    monkeypatch.setattr(memory, "rss_bytes", lambda: 10 * 2**30)  # RSS never comes back down
+    big = {i: "x" * 1000 for i in range(200)}
+    small = {i: "y" * 100 for i in range(10)}
+    budget = MemoryBudget(budget_bytes=memory.deep_sizeof(small) + memory.deep_sizeof(big) // 2)
+    budget.register("big", big, big.clear)
+    budget.register("small", small, small.clear)
+
+    assert budget.check()
+    assert not big and small
+    # Caches are back under budget, so high RSS alone does not clear them again
+    small.update({i: "y" * 100 for i in range(10)})
+    assert not budget.check()
+    assert small
+
+
+def test_budget_stops_once_under_low_water():
+    caches = {name: {i: name * 500 for i in range(50)} for name in ("a", "b", "c")}
+    size = memory.deep_sizeof(caches["a"])
+    budget = MemoryBudget(budget_bytes=int(size * 2.2), low_water=0.8)
+    for name, cache in caches.items():
+        budget.register(name, cache, cache.clear)
+    assert budget.check()
+    assert sum(1 for cache in caches.values() if cache) == 1
+
+
+def test_course_rows_build_each_row_once_per_access(monkeypatch):
+    page = CompactCoursePage(PAGE, ValuePool())
+    built = []
+    original_row = CompactCoursePage.row
+    monkeypatch.setattr(CompactCoursePage, "row", lambda self, i: built.append(i) or original_row(self, i))
+
+    courses = page["courses"]
+    for course in courses:
+        break
+    assert built == [0]  # an early exit never builds (or inflates) the rest
+
+    assert courses[0] is courses[-2] is next(iter(courses))
+    assert [c["id"] for c in courses] == [1, 2]
+    assert built == [0, 1]
+    assert courses == PAGE["courses"] and courses[:1] == PAGE["courses"][:1]
+
+    # A new access hands out fresh rows, so mutating one never leaks into the cache
+    courses[0]["title"] = "changed"
+    assert page["courses"][0]["title"] == "German A1"
+
+
+class MutatedWhileWalked(dict):
+    """A cache another thread changes during the first size walk."""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.walks = 0
+
+    def keys(self):
+        self.walks += 1
+        if self.walks == 1:
+            raise RuntimeError("dictionary changed size during iteration")
+        return super().keys()
+
+
+def test_memory_report_retries_caches_mutated_mid_walk():
+    values = {i: "z" * 200 for i in range(50)}
+    cache = MutatedWhileWalked(values)
+    report = memory.memory_report({"courses": cache})
+    assert cache.walks == 2
+    # The failed walk left nothing behind in `seen`, so the retry counts everything
+    assert report["caches"]["courses"]["bytes"] == memory.deep_sizeof(cache)
@@ -0,0 +1,97 @@
+import threading
+import time
+
+from oei_live import tools as live_tools
+from oei_live.client import CourseAPIClient
+from oei_live.prefetch import DetailPrefetcher, current_session
+from oei_live.schedule import ScheduleIndex
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+        self.headers = {"ETag": '"v1"'}
+
+    def json(self):
+        return self.payload
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self):
+        self.calls = []
+
+    def get(self, url, params=None, headers=None, timeout=None, stream=False):
+        self.calls.append((url, dict(params or {}), dict(headers or {})))
+        if headers and headers.get("If-None-Match"):
+            return FakeResponse(None, status_code=304)
+        return FakeResponse({"id": 1, "title": "German A1"})
+
+
+def _client():
+    client = CourseAPIClient(rps=1000)
+    client.session = FakeSession()
+    return client
+
+
+def test_fresh_cache_entries_skip_the_network():
+    client = _client()
+    first = client.get_course_detail(1)
+    second = client.get_course_detail(1)
+    assert second is first
+    assert len(client.session.calls) == 1
+
+
+def test_revalidate_sends_a_conditional_request():
+    client = _client()
+    page = client.get_courses_page(1)
+    assert client.get_courses_page(1, revalidate=True) is page
+    assert len(client.session.calls) == 2
+    assert client.session.calls[1][2]["If-None-Match"] == '"v1"'
+
+
+def test_schedule_tool_queues_prefetch_for_its_results(monkeypatch):
+    index = ScheduleIndex()
+    index.add({"id": 42, "title": "German A2", "level": "A2", "course_weekdays": ["Tuesday"]})
+    monkeypatch.setattr(live_tools, "_schedule_indexes", {8: (time.time(), index)})
+    queued = []
+    monkeypatch.setattr(live_tools.detail_prefetcher, "prefetch", lambda session, keys: queued.append((session, list(keys))))
+
+    token = current_session.set("s1")
+    try:
+        out = live_tools.find_courses_by_schedule.invoke({"location_id": 8})
+    finally:
+        current_session.reset(token)
+
+    assert [c["id"] for c in out] == [42]
+    assert out[0]["web_url"].endswith("/courses/8/42")
+    assert queued == [("s1", [(42, 8)])]
+
+
+def test_prefetched_detail_is_served_to_course_detail_live(monkeypatch):
+    client = _client()
+    fetched = threading.Event()
+    original = client.get_course_detail
+
+    def get_course_detail(course_id, location_id=None):
+        try:
+            return original(course_id, location_id=location_id)
+        finally:
+            fetched.set()
+
+    client.get_course_detail = get_course_detail
+    prefetcher = DetailPrefetcher(client, top_n=3)
+    monkeypatch.setattr(live_tools, "detail_prefetcher", prefetcher)
+    monkeypatch.setattr(live_tools, "_client", _client())
+
+    prefetcher.prefetch("s1", [(1, 8)])
+    assert fetched.wait(2)
+    time.sleep(0.05)
+    detail = live_tools.course_detail_live.invoke({"course_id": 1, "location_id": 8})
+
+    assert detail["title"] == "German A1"
+    assert live_tools._client.session.calls == []
+    assert prefetcher.stats()["hits"] == 1
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from app.services.quantized_store import QuantizedEmbeddingStore, quantize_int8
+
+N, DIM, K = 2000, 64, 10
+
+
+def _corpus(seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(N, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = rng.normal(size=(20, DIM)).astype(np.float32)
+    return vectors, queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def _exact(vectors, query, k=K):
+    return list(np.argsort(-(vectors @ query))[:k])
+
+
+def _recall(store, vectors, queries, **kwargs):
+    hits = [len({i for i, _ in store.search(q, k=K, **kwargs)} & set(_exact(vectors, q))) for q in queries]
+    return sum(hits) / (K * len(queries))
+
+
+def test_int8_round_trip_is_within_half_a_step():
+    vectors, _ = _corpus()
+    vectors[3] = 0.0  # an all-zero row must not divide by zero
+    codes, scales = quantize_int8(vectors)
+    assert codes.dtype == np.int8 and scales.dtype == np.float32
+    restored = codes.astype(np.float32) * scales[:, None]
+    assert np.all(np.abs(restored - vectors) <= scales[:, None] / 2 + 1e-7)
+    assert not restored[3].any()
+
+
+def test_float16_round_trip():
+    vectors, _ = _corpus()
+    store = QuantizedEmbeddingStore.from_float(vectors, range(N), dtype="float16")
+    assert store.dtype == "float16" and store.scales is None
+    np.testing.assert_allclose(store.vectors.astype(np.float32), vectors, atol=1e-3)
+    assert store.nbytes == N * DIM * 2
+
+
+def test_unsupported_dtype_is_rejected():
+    with pytest.raises(ValueError):
+        QuantizedEmbeddingStore.from_float(np.ones((2, 2)), [0, 1], dtype="int4")
+
+
+@pytest.mark.parametrize("dtype, min_recall", [("float16", 0.99), ("int8", 0.9)])
+def test_recall_at_k_against_exact_search(dtype, min_recall):
+    vectors, queries = _corpus()
+    store = QuantizedEmbeddingStore.from_float(vectors, list(range(N)), dtype=dtype)
+    assert _recall(store, vectors, queries) >= min_recall
+    if dtype == "int8":
+        assert store.nbytes == N * DIM + N * 4
+
+
+def test_full_precision_rescore_matches_exact_search():
+    vectors, queries = _corpus()
+    store = QuantizedEmbeddingStore.from_float(vectors, list(range(N)), dtype="int8", keep_full_precision=True)
+    assert _recall(store, vectors, queries, rescore_candidates=5 * K) == 1.0
+    for q in queries[:3]:
+        results = store.search(q, k=K, rescore_candidates=5 * K)
+        assert [i for i, _ in results] == _exact(vectors, q)
+        np.testing.assert_allclose([s for _, s in results], np.sort(vectors @ q)[::-1][:K], rtol=1e-5)
+
+
+def test_block_scan_matches_a_single_block():
+    vectors, queries = _corpus()
+    store = QuantizedEmbeddingStore.from_float(vectors, list(range(N)))
+    np.testing.assert_allclose(store._scores(queries[0], block_rows=97), store._scores(queries[0]), rtol=1e-6)
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_mmap_loaded_store_returns_identical_results(tmp_path, dtype):
+    vectors, queries = _corpus()
+    ids = [f"chunk-{i}" for i in range(N)]
+    store = QuantizedEmbeddingStore.from_float(vectors, ids, dtype=dtype, keep_full_precision=True)
+    store.save(tmp_path)
+
+    loaded = QuantizedEmbeddingStore.load(tmp_path)
+    assert isinstance(loaded.vectors, np.memmap) and isinstance(loaded.full_precision, np.memmap)
+    assert loaded.ids == ids and loaded.dtype == dtype and loaded.nbytes == store.nbytes
+    in_memory = QuantizedEmbeddingStore.load(tmp_path, mmap=False)
+    assert not isinstance(in_memory.vectors, np.memmap)
+    for q in queries:
+        for kwargs in ({}, {"rescore_candidates": 5 * K}):
+            expected = store.search(q, k=K, **kwargs)
+            assert loaded.search(q, k=K, **kwargs) == expected
+            assert in_memory.search(q, k=K, **kwargs) == expected
+
+
+def test_empty_store_and_zero_k():
+    store = QuantizedEmbeddingStore.from_float(np.zeros((0, DIM), dtype=np.float32), [])
+    assert len(store) == 0 and store.search(np.ones(DIM)) == []
+    vectors, queries = _corpus()
+    assert QuantizedEmbeddingStore.from_float(vectors, range(N)).search(queries[0], k=0) == []
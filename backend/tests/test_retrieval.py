@@ -0,0 +1,238 @@
+import time
+
+import httpx
+import numpy as np
+from langchain_community.vectorstores import SupabaseVectorStore
+from langchain_core.documents import Document
+
+from app.core.config import settings
+from app.services.retrieval import RetrievalPipeline, decompose_query, interleave_unique, mmr_select
+
+DIM = 8
+
+
+def _doc(i, course_id=None):
+    metadata = {"course_id": course_id} if course_id is not None else {}
+    return Document(page_content=f"chunk {i}", metadata=metadata)
+
+
+def _candidates(n, with_embeddings=True):
+    rng = np.random.default_rng(0)
+    out = []
+    for i in range(n):
+        vec = rng.normal(size=DIM).astype(np.float32) if with_embeddings else np.array([], dtype=np.float32)
+        out.append((_doc(i, course_id=i), 1.0 - i / 100, vec))
+    return out
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        rng = np.random.default_rng(len(texts))
+        return [rng.normal(size=DIM).tolist() for _ in texts]
+
+
+class SlowReranker:
+    def __init__(self, delay):
+        self.delay = delay
+
+    def predict(self, pairs, batch_size=16):
+        time.sleep(self.delay)
+        return list(range(len(pairs)))  # reverses the order if it ever finishes in time
+
+
+def _pipeline(**kwargs):
+    return RetrievalPipeline(vector_store=None, embeddings=kwargs.pop("embeddings", FakeEmbeddings()), k=3, fetch_k=20, **kwargs)
+
+
+def test_mmr_prefers_diverse_results():
+    query = np.array([1.0, 0.0])
+    docs = np.array([[1.0, 0.0], [0.99, 0.01], [0.7, 0.7]])
+    assert mmr_select(query, docs, 2, lambda_mult=0.3) == [0, 2]
+
+
+def test_rank_embeds_candidates_missing_embeddings():
+    embeddings = FakeEmbeddings()
+    pipeline = _pipeline(embeddings=embeddings, embed_missing=True)
+    candidates = _candidates(10, with_embeddings=False)
+
+    docs = pipeline.rank("query", np.ones(DIM).tolist(), candidates)
+    assert len(docs) == 3
+    assert embeddings.calls == 1
+
+    # Same chunks again come from the cache
+    pipeline.rank("query", np.ones(DIM).tolist(), candidates)
+    assert embeddings.calls == 1
+
+
+def test_rank_keeps_similarity_order_without_stored_embeddings():
+    embeddings = FakeEmbeddings()
+    pipeline = _pipeline(embeddings=embeddings)
+    docs = pipeline.rank("query", np.ones(DIM).tolist(), _candidates(10, with_embeddings=False))
+    assert [d.metadata["course_id"] for d in docs] == [0, 1, 2]
+    assert embeddings.calls == 0  # no network re-embedding unless opted in
+
+
+class RecordingRpc:
+    """Stands in for the supabase client; records the RPC name, arguments and PostgREST params."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def rpc(self, name, params):
+        call = self
+
+        class Builder:
+            def __init__(self):
+                self.params = httpx.QueryParams()
+
+            def execute(self):
+                call.calls.append((name, params, dict(self.params)))
+                limit = int(self.params["limit"])
+                return type("Response", (), {"data": call.rows[:limit]})()
+
+        return Builder()
+
+
+def test_fetch_k_above_40_reaches_match_documents_compact():
+    rows = [{"content": f"chunk {i}", "metadata": {}, "similarity": 1.0 - i / 1000,
+             "embedding": "[" + ",".join(["0.1"] * DIM) + "]"} for i in range(150)]
+    client = RecordingRpc(rows)
+    store = SupabaseVectorStore(client=client, embedding=None, table_name="documents",
+                                query_name=settings.supabase_query_name)
+    pipeline = RetrievalPipeline(store, FakeEmbeddings(), k=5, fetch_k=120)
+
+    candidates = pipeline.fetch_candidates(np.ones(DIM).tolist())
+    (name, args, params), = client.calls
+    assert name == "match_documents_compact"
+    # k travels as the PostgREST limit; match_count is never sent, so the function must not cap it
+    assert "match_count" not in args and params["limit"] == "120"
+    assert len(candidates) == 120 and all(len(c[2]) == DIM for c in candidates)
+
+
+def test_rank_respects_latency_budget_with_slow_reranker():
+    pipeline = _pipeline(budget_ms=50, reranker_model="stub", rerank_top_n=6)
+    pipeline._reranker = SlowReranker(delay=0.5)
+    candidates = _candidates(10)
+
+    started = time.perf_counter()
+    docs = pipeline.rank("query", np.ones(DIM).tolist(), candidates)
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.25
+    # Budget ran out, so the MMR order is kept
+    expected = mmr_select(np.ones(DIM, dtype=np.float32), np.asarray([c[2] for c in candidates]), 6, 0.5)[:3]
+    assert [d.metadata["course_id"] for d in docs] == expected
+    time.sleep(0.5)  # let the reranker worker drain before other tests use it
+
+
+def test_rank_uses_reranker_within_budget():
+    pipeline = _pipeline(budget_ms=500, reranker_model="stub", rerank_top_n=6)
+    pipeline._reranker = SlowReranker(delay=0.0)
+    candidates = _candidates(10)
+    mmr_order = mmr_select(np.ones(DIM, dtype=np.float32), np.asarray([c[2] for c in candidates]), 6, 0.5)
+
+    docs = pipeline.rank("query", np.ones(DIM).tolist(), candidates)
+    assert [d.metadata["course_id"] for d in docs] == list(reversed(mmr_order))[:3]
+
+
+def test_decompose_query_splits_mixed_intents():
+    assert decompose_query("Do you have a B1 course in the evening and also what does it cost") == [
+        "Do you have a B1 course in the evening and also what does it cost",
+        "Do you have a B1 course in the evening",
+        "what does it cost",
+    ]
+    assert decompose_query("Is there an A2 course? How much is it?")[1:] == ["Is there an A2 course", "How much is it"]
+    # "and" inside a single question is not a boundary, and one-word fragments are dropped
+    assert decompose_query("I need reading and writing practice") == ["I need reading and writing practice"]
+    assert decompose_query("Prices? Thanks!") == ["Prices? Thanks!"]
+    assert len(decompose_query("A1 course? B1 course? C1 course? Online course? Evening course?", max_parts=3)) == 3
+
+
+def test_interleave_unique_round_robins_and_dedupes():
+    a = [_doc(1, course_id=1), _doc(2, course_id=2), _doc(3, course_id=3)]
+    b = [_doc(10, course_id=1), _doc(4, course_id=4)]
+    picked = interleave_unique([a, b], k=3)
+    assert [d.metadata["course_id"] for d in picked] == [1, 2, 4]
+    assert interleave_unique([], k=3) == []
+
+
+# Small bag-of-words corpus: course chunks and FAQ chunks on different topics
+CORPUS = [
+    ("evening B1 course weekday evenings German", {"course_id": 1}),
+    ("B1 evening course Tuesday Thursday evening", {"course_id": 2}),
+    ("B1 course morning intensive", {"course_id": 3}),
+    ("A1 course evening beginners", {"course_id": 4}),
+    ("B1 evening course online evening", {"course_id": 5}),
+    ("evening B1 course Monday evening", {"course_id": 6}),
+    ("B1 course evening conversation", {"course_id": 7}),
+    ("price cost fee payment instalments", {}),
+    ("cost per term price list fees", {}),
+    ("placement test online free", {}),
+    ("holidays school closed summer", {}),
+    ("exam certificate ÖSD registration", {}),
+    ("teachers native speakers qualified", {}),
+]
+VOCAB = sorted({w for text, _ in CORPUS for w in text.lower().split()} | {"do", "you", "have", "an", "at", "it", "and", "also"})
+
+
+def _bow(text):
+    vec = np.zeros(len(VOCAB), dtype=np.float32)
+    for word in text.lower().replace("?", "").split():
+        if word in VOCAB:
+            vec[VOCAB.index(word)] += 1.0
+    return vec / max(float(np.linalg.norm(vec)), 1e-6)
+
+
+class BowEmbeddings:
+    """Bag-of-words embeddings with a fixed per-call latency, like one OpenAI round trip."""
+
+    def __init__(self, latency=0.03):
+        self.latency = latency
+        self.calls = 0
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        time.sleep(self.latency)
+        return [_bow(t).tolist() for t in texts]
+
+
+class BowStore:
+    """In-memory match function; like `match_documents`, it returns no embeddings."""
+
+    def similarity_search_by_vector_returning_embeddings(self, vector, k):
+        query = np.asarray(vector, dtype=np.float32)
+        scored = sorted(((float(_bow(text) @ query), Document(page_content=text, metadata=dict(meta)))
+                         for text, meta in CORPUS), key=lambda item: -item[0])[:k]
+        return [(doc, score, np.array([], dtype=np.float32)) for score, doc in scored]
+
+
+def test_multi_query_recall_and_round_trips_against_single_query():
+    question = "Do you have an evening course at B1 and also what does it cost"
+    # One intent is a B1 evening course, the other is the price FAQ
+    intents = [{text for text, meta in CORPUS if "B1" in text and "evening" in text},
+               {text for text, meta in CORPUS if "price" in text}]
+
+    results = {}
+    for name in ("single", "multi"):
+        embeddings = BowEmbeddings()
+        pipeline = RetrievalPipeline(BowStore(), embeddings, k=4, fetch_k=6, lambda_mult=0.7, embed_missing=True)
+        started = time.perf_counter()
+        docs = pipeline.search(question) if name == "single" else pipeline.multi_search(question)
+        elapsed = time.perf_counter() - started
+        found = {d.page_content for d in docs}
+        recall = sum(bool(intent & found) for intent in intents) / len(intents)
+        results[name] = (recall, elapsed, embeddings.calls)
+
+    print("intent recall@4 / latency / embedding calls:", results)
+    assert results["multi"][0] > results["single"][0]
+    # Query embeddings plus one call for all candidate chunks, whatever the number of sub-queries
+    assert results["multi"][2] == 2
+    assert results["multi"][1] < 4 * 0.03
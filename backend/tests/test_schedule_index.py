@@ -0,0 +1,118 @@
+import threading
+import time
+
+from oei_live import tools as live_tools
+from oei_live.schedule import ScheduleIndex
+from oei_live.tools import build_schedule_index
+
+
+def _reset(monkeypatch, build):
+    monkeypatch.setattr(live_tools, "_schedule_indexes", {})
+    monkeypatch.setattr(live_tools, "_schedule_builds", {})
+    monkeypatch.setattr(live_tools, "build_schedule_index", build)
+
+
+def test_first_build_runs_once_in_background(monkeypatch):
+    calls = []
+    release = threading.Event()
+
+    def slow_build(location_id, previous=None):
+        calls.append(location_id)
+        release.wait(5)
+        return ScheduleIndex()
+
+    _reset(monkeypatch, slow_build)
+    started = time.perf_counter()
+    results = []
+    callers = [threading.Thread(target=lambda: results.append(live_tools.get_schedule_index(8, wait=0.2))) for _ in range(4)]
+    for t in callers: t.start()
+    for t in callers: t.join()
+
+    # Nobody blocks on the build beyond `wait`, and concurrent callers share one build
+    assert time.perf_counter() - started < 1.0
+    assert results == [None] * 4
+    assert calls == [8]
+
+    release.set()
+    live_tools._schedule_builds.get(8, threading.Event()).wait(2)
+    time.sleep(0.05)
+    assert isinstance(live_tools.get_schedule_index(8, wait=0), ScheduleIndex)
+
+
+def test_expired_index_is_served_while_rebuilding(monkeypatch):
+    release = threading.Event()
+    fresh = ScheduleIndex()
+
+    def slow_build(location_id, previous=None):
+        release.wait(5)
+        return fresh
+
+    _reset(monkeypatch, slow_build)
+    stale = ScheduleIndex()
+    live_tools._schedule_indexes[8] = (time.time() - live_tools.SCHEDULE_INDEX_TTL_SEC - 1, stale)
+
+    assert live_tools.get_schedule_index(8) is stale
+    release.set()
+
+
+def _course(cid, start="2026-11-02", weekday=None):
+    course = {"id": cid, "title": f"Course {cid}", "levels": "B1", "start_at": start, "finish_at": "2027-01-31"}
+    if weekday is not None:
+        course["course_weekdays"] = [{"course_weekdays": {"week_day": weekday[0], "start_time": weekday[1],
+                                                          "finish_time": weekday[2]}}]
+    return course
+
+
+class ListClient:
+    """List pages without weekday data; details carry a Tuesday (wday 2) 17:00 session."""
+
+    def __init__(self, courses):
+        self.courses = courses
+        self.detail_calls = []
+
+    def iter_courses(self, max_pages=1, location_id=None):
+        yield from (dict(c) for c in self.courses)
+
+    def get_course_detail(self, course_id, location_id=None):
+        self.detail_calls.append(course_id)
+        return _course(course_id, start=next(c["start_at"] for c in self.courses if c["id"] == course_id),
+                       weekday=(2, "17:00", "20:00"))
+
+
+def test_rebuild_fetches_details_only_for_new_or_changed_courses(monkeypatch):
+    client = ListClient([_course(i, start=f"2026-11-{i + 1:02d}") for i in range(1, 6)])
+    monkeypatch.setattr(live_tools, "_client", client)
+
+    first = build_schedule_index(8, max_details=3)
+    # Soonest starts first; the rest are indexed without sessions until a later build
+    assert client.detail_calls == [1, 2, 3]
+    assert len(first) == 5
+    assert {c["id"] for c in first.find(weekdays=["tuesday"])} == {1, 2, 3}
+
+    client.detail_calls.clear()
+    client.courses[0] = _course(1, start="2026-12-01")  # rescheduled
+    second = build_schedule_index(8, previous=first, max_details=3)
+    assert sorted(client.detail_calls) == [1, 4, 5]
+    assert {c["id"] for c in second.find(weekdays=["tuesday"], time_window="evening")} == {1, 2, 3, 4, 5}
+
+    client.detail_calls.clear()
+    build_schedule_index(8, previous=second, max_details=3)
+    assert client.detail_calls == []
+
+
+def test_list_pages_with_weekdays_need_no_details(monkeypatch):
+    client = ListClient([_course(1, weekday=(2, "09:00", "12:00"))])
+    monkeypatch.setattr(live_tools, "_client", client)
+    index = build_schedule_index(8)
+    assert client.detail_calls == []
+    assert [c["id"] for c in index.find(weekdays=["tuesday"], time_window="morning")] == [1]
+
+
+def test_time_windows_are_half_open():
+    index = ScheduleIndex()
+    index.add({"id": 1, "start_date": "2026-11-03", "weekdays": [{"week_day": 2, "start_time": "17:00", "finish_time": "20:00"}]})
+    index.add({"id": 2, "start_date": "2026-11-03", "weekdays": [{"week_day": 2, "start_time": "12:00", "finish_time": "13:30"}]})
+    assert [c["id"] for c in index.find(weekdays=["tuesday"], time_window="evening")] == [1]
+    # 17:00 is where the afternoon ends, not part of it
+    assert [c["id"] for c in index.find(weekdays=["tuesday"], time_window="afternoon")] == [2]
+    assert [c["id"] for c in index.find(weekdays=["tuesday"], time_window="12:00-17:00")] == [2]
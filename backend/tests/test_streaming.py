@@ -0,0 +1,106 @@
+import io
+import json
+
+import pytest
+
+from oei_live import streaming
+from oei_live.client import CourseAPIClient
+from oei_live.compact import CompactCoursePage
+from oei_live.parsing import SUMMARY_FIELDS
+from oei_live.streaming import select_course_fields
+from oei_live.text import LazyCourse
+
+PAGE = {
+    "courses": [
+        {
+            "id": 1, "title": "Deutsch B1 – Abendkurs", "levels": "B1", "price": 450.5, "free_places_count": 3,
+            "status": "open", "start_at": "2026-11-03", "description": "<p>Lernen &amp; <b>sprechen</b></p>",
+            "university": {"title": "ÖI Warschau", "location": "Warsaw", "country": {"country_name": "Poland"}},
+            "course_weekdays": [{"course_weekdays": {"week_day": 2, "start_time": "17:00", "finish_time": None}}],
+            "teachers": [],
+            "online": False,
+        },
+        # Missing and null fields, an empty nested object
+        {"id": 2, "title": "A1", "price": None, "university": {}, "online": True},
+        {"id": 3},
+    ],
+    "pagy": {"page": 1, "next": 2, "count": 3},
+}
+FIELDS = ("id", "title", "price", "university", "course_weekdays", "free_places_count", "online", "not_there")
+
+
+def _old_projection(page, fields):
+    """What the callers used to do: decode the whole page, then keep the wanted keys."""
+    return [{k: v for k, v in c.items() if k in fields} for c in page["courses"]], page.get("pagy") or {}
+
+
+def _stream(page=PAGE):
+    return io.BytesIO(json.dumps(page, ensure_ascii=False).encode("utf-8"))
+
+
+@pytest.mark.parametrize("backend", ["ijson", "json"])
+def test_select_course_fields_matches_the_old_projection(monkeypatch, backend):
+    if backend == "json":
+        monkeypatch.setattr(streaming, "ijson", None)
+    elif streaming.ijson is None:
+        pytest.skip("ijson not installed")
+
+    courses, pagy = select_course_fields(_stream(), FIELDS)
+    expected_courses, expected_pagy = _old_projection(PAGE, FIELDS)
+
+    assert [dict(c) for c in courses] == expected_courses
+    assert all(isinstance(c, LazyCourse) for c in courses)
+    assert pagy == expected_pagy
+    # Same key order and value types as json.loads gives
+    assert list(courses[0]) == list(expected_courses[0])
+    assert type(courses[0]["price"]) is float and type(courses[0]["id"]) is int
+
+
+def test_select_course_fields_without_pagy():
+    courses, pagy = select_course_fields(_stream({"courses": [{"id": 7, "title": "x"}]}), ["id"])
+    assert [dict(c) for c in courses] == [{"id": 7}] and pagy == {}
+
+
+def test_lazy_course_strips_html_on_first_read_only():
+    course = LazyCourse(id=1, description="<p>Lernen &amp; <b>sprechen</b></p>")
+    assert "description_plain" not in course
+    assert course["description_plain"] == "Lernen & sprechen"
+    assert course.get("description_plain") == "Lernen & sprechen"
+    assert dict(course)["description_plain"] == "Lernen & sprechen"  # memoized into the dict
+
+    bare = LazyCourse(id=2)
+    assert bare.get("description_plain") is None
+    assert bare.get("title", "n/a") == "n/a"
+    with pytest.raises(KeyError):
+        bare["description_plain"]
+
+
+class StreamingSession:
+    def __init__(self, page):
+        self.body = json.dumps(page).encode("utf-8")
+        self.calls = 0
+
+    def get(self, url, params=None, headers=None, timeout=None, stream=False):
+        self.calls += 1
+        resp = type("Response", (), {})()
+        resp.status_code, resp.headers = 200, {"ETag": '"v1"'}
+        resp.raw = io.BytesIO(self.body)
+        resp.json = lambda: json.loads(self.body)
+        resp.raise_for_status = lambda: None
+        return resp
+
+
+def test_field_pages_stay_lazy_in_the_compacting_cache():
+    client = CourseAPIClient(rps=1000)
+    client.sleep = 0
+    client.session = StreamingSession(PAGE)
+
+    first = client.get_courses_page_fields(SUMMARY_FIELDS)
+    assert not isinstance(first, CompactCoursePage)
+    assert all(isinstance(c, LazyCourse) for c in first["courses"])
+    # Cached as decoded: the same rows come back without another request
+    assert client.get_courses_page_fields(SUMMARY_FIELDS)["courses"][0] is first["courses"][0]
+    assert client.session.calls == 1
+
+    # Full pages are still stored column-oriented
+    assert isinstance(client.get_courses_page(), CompactCoursePage)
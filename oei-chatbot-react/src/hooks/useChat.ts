@@ -31,6 +31,8 @@ export const useChat = (): UseChatReturn => {
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const lastMessageRef = useRef<string | null>(null);
+  // One id per conversation so the backend can tie follow-up questions to it
+  const sessionIdRef = useRef<string>(generateId());
 
   const sendMessage = useCallback(
     async (content: string) => {
@@ -52,7 +54,11 @@ export const useChat = (): UseChatReturn => {
       setError(null);
 
       try {
-        const response = await apiService.sendMessage(content.trim(), messages);
+        const response = await apiService.sendMessage(
+          content.trim(),
+          messages,
+          sessionIdRef.current
+        );
 
         if (response.success && response.data) {
           const assistantMessage: ChatMessage = {
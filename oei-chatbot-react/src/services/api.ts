@@ -54,7 +54,8 @@ class ApiService {
   // Chat endpoints
   async sendMessage(
     message: string,
-    chatHistory: Message[] = []
+    chatHistory: Message[] = [],
+    sessionId?: string
   ): Promise<
     ApiResponse<{ message: string; courses?: Course[]; ai_content?: string }>
   > {
@@ -67,6 +68,7 @@ class ApiService {
         }>
       > = await this.api.post("/chat/message", {
         message,
+        session_id: sessionId,
         chat_history: chatHistory.map((msg) => ({
           role: msg.role,
           content: msg.content,
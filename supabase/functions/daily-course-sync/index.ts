@@ -22,30 +22,43 @@ serve(async (req) => {
     // Get your backend URL from environment or use default
     const backendUrl = Deno.env.get("BACKEND_URL") || "http://localhost:8000";
 
-    // Call the Python sync function
-    const response = await fetch(`${backendUrl}/sync/daily`, {
-      method: "POST",
-      headers: {
-        "Content-Type": "application/json",
-        Authorization: `Bearer ${supabaseKey}`,
-      },
-    });
+    const callBackend = async (path: string, body?: unknown) => {
+      const response = await fetch(`${backendUrl}${path}`, {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+          Authorization: `Bearer ${supabaseKey}`,
+        },
+        body: body === undefined ? undefined : JSON.stringify(body),
+      });
+      if (!response.ok) {
+        throw new Error(`${path} failed: ${response.status} ${response.statusText}`);
+      }
+      return await response.json();
+    };
 
-    if (!response.ok) {
-      throw new Error(`Sync failed: ${response.statusText}`);
+    // The backend only exposes the digest sync; course documents are re-ingested
+    // separately with ingest_in_db.py, so there is no /sync/daily to call
+    const digests = await callBackend("/sync/digests", {});
+    const failed: number[] = digests?.data?.failed ?? [];
+    const success = digests?.success !== false && failed.length === 0;
+    if (!success) {
+      console.error("Digest sync failed for locations:", failed);
     }
 
-    const result = await response.json();
-
+    // A partial failure is reported as such (502 with the failed locations), so
+    // the scheduler's logs and alerts see it instead of a blanket success
     return new Response(
       JSON.stringify({
-        success: true,
-        message: "Daily sync completed",
-        result,
+        success,
+        message: success
+          ? "Digest sync completed"
+          : `Digest sync failed for ${failed.length} location(s): ${failed.join(", ")}`,
+        digests,
       }),
       {
         headers: { ...corsHeaders, "Content-Type": "application/json" },
-        status: 200,
+        status: success ? 200 : 502,
       }
     );
   } catch (error) {
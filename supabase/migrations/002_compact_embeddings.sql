@@ -0,0 +1,66 @@
+-- supabase/migrations/002_compact_embeddings.sql
+-- Half-precision copy of the document embeddings for a smaller, faster ANN index.
+-- Requires pgvector >= 0.7 (halfvec type).
+CREATE EXTENSION IF NOT EXISTS vector;
+
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS embedding_half halfvec(1536);
+
+-- Backfill existing rows
+UPDATE documents
+SET embedding_half = embedding::halfvec(1536)
+WHERE embedding IS NOT NULL AND embedding_half IS NULL;
+
+-- Keep the compact column in sync for every insert/update (ingest_in_db.py, daily sync)
+CREATE OR REPLACE FUNCTION sync_embedding_half()
+RETURNS trigger AS $$
+BEGIN
+    NEW.embedding_half := CASE WHEN NEW.embedding IS NULL THEN NULL ELSE NEW.embedding::halfvec(1536) END;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_documents_embedding_half ON documents;
+CREATE TRIGGER trg_documents_embedding_half
+BEFORE INSERT OR UPDATE OF embedding ON documents
+FOR EACH ROW EXECUTE FUNCTION sync_embedding_half();
+
+-- HNSW index over the half-precision column (half the size of a vector(1536) index)
+CREATE INDEX IF NOT EXISTS idx_documents_embedding_half_hnsw
+ON documents USING hnsw (embedding_half halfvec_cosine_ops);
+
+-- Same call signature as match_documents, so SupabaseVectorStore can use it via
+-- query_name="match_documents_compact". Candidates come from the halfvec index and
+-- are re-scored at full precision; the full embedding is returned for MMR.
+-- SupabaseVectorStore never passes match_count: it sends k as the PostgREST `limit`,
+-- so match_count defaults to NULL (no limit inside the function) and the number of
+-- rows is decided by the caller's RETRIEVAL_FETCH_K. candidate_count bounds the
+-- halfvec pre-selection, so fetch_k above 200 needs a larger candidate_count.
+DROP FUNCTION IF EXISTS match_documents_compact(vector, jsonb, int, int);
+CREATE FUNCTION match_documents_compact(
+    query_embedding vector(1536),
+    filter jsonb DEFAULT '{}',
+    match_count int DEFAULT NULL,
+    candidate_count int DEFAULT 200
+)
+RETURNS TABLE (
+    id documents.id%TYPE,
+    content text,
+    metadata jsonb,
+    embedding vector(1536),
+    similarity float
+)
+LANGUAGE sql STABLE AS $$
+    WITH candidates AS (
+        SELECT d.id
+        FROM documents d
+        WHERE d.metadata @> filter
+        ORDER BY d.embedding_half <=> query_embedding::halfvec(1536)
+        LIMIT GREATEST(candidate_count, match_count)
+    )
+    SELECT d.id, d.content, d.metadata, d.embedding,
+           1 - (d.embedding <=> query_embedding) AS similarity
+    FROM documents d
+    JOIN candidates c ON c.id = d.id
+    ORDER BY d.embedding <=> query_embedding
+    LIMIT match_count;
+$$;
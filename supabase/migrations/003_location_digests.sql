@@ -0,0 +1,23 @@
+-- supabase/migrations/003_location_digests.sql
+-- Versioned per-location catalog digests and materialized FAQ answers,
+-- written by POST /sync/digests (backend/app/services/digest_service.py).
+CREATE TABLE IF NOT EXISTS location_digests (
+    id BIGSERIAL PRIMARY KEY,
+    location_id INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    source_hash TEXT NOT NULL,          -- hash of the course summaries the digest was built from
+    digest JSONB NOT NULL,
+    faq_answers JSONB NOT NULL DEFAULT '{}'::jsonb,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    UNIQUE (location_id, version)
+);
+
+-- Latest version per location
+CREATE INDEX IF NOT EXISTS idx_location_digests_latest
+ON location_digests (location_id, version DESC);
+
+-- One row per location, read by the chat service at startup instead of every stored version
+CREATE OR REPLACE VIEW location_digests_latest AS
+SELECT DISTINCT ON (location_id) *
+FROM location_digests
+ORDER BY location_id, version DESC;